@@ -0,0 +1,44 @@
+import argparse
+from .log_callback import (MssbAssetLog, NullSink, LOG_EVENTS)
+from .search import populate_outputs
+from .scheduler import schedule_dumps
+from .helper_filesystem import (VERSION_PATHS, DUMP_MANIFEST, use_dump_manifest)
+from .search_report import SearchReport
+
+SIZE_SUFFIXES = {"K": 2**10, "M": 2**20, "G": 2**30}
+
+def parse_size(text:str) -> int:
+    # 512M, 2G, or a plain byte count
+    text = text.strip().upper().removesuffix("B")
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract assets from every version in the data folder, without the GUI")
+    parser.add_argument("--only-new", action="store_true", help="skip versions that have already been extracted")
+    parser.add_argument("--profile", choices=SearchReport.PROFILERS, default=None, help="profile each search phase into the version's output folder")
+    parser.add_argument("--max-memory", type=parse_size, default=None, help="map the sources and stream outputs to disk to stay near this budget, e.g. 512M")
+    parser.add_argument("--index-parts", action="store_true", help="record the sub-files in each extracted file's offset table, and which are shared")
+    parser.add_argument("--quiet", action="store_true", help="don't print the log")
+    parser.add_argument("--manifest", default=None, help=f"json file listing the dumps to search, {DUMP_MANIFEST} is used if it exists")
+    parser.add_argument("--workers", type=int, default=1, help="how many dumps to search at once")
+    args = parser.parse_args()
+
+    if args.quiet:
+        LOG_EVENTS.sink = NullSink()
+    if args.manifest:
+        use_dump_manifest(args.manifest)
+
+    if args.workers != 1:
+        log_callback = MssbAssetLog()
+        version_paths = [x for x in VERSION_PATHS.values() if x.valid() and not (args.only_new and x.extracted())]
+        for x in VERSION_PATHS.values():
+            if not x.valid():
+                log_callback(x.version, "couldn't find relevant files, skipping")
+        schedule_dumps(version_paths, log_callback, lambda: False, args.profile, args.max_memory, args.index_parts, args.workers)
+        return
+    populate_outputs(MssbAssetLog(), not args.only_new, lambda: False, args.profile, args.max_memory, args.index_parts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import threading
+from .helper_filesystem import (FilePaths, VERSION_PATHS)
+from .index_db import (AssetDatabase, index_db_path)
+
+class AssetIndex:
+    """Search over every extracted version, backed by the sqlite index so only the versions whose files changed get read again"""
+    MODES = ("substring", "prefix")
+
+    def __init__(self, version_paths:dict[str, FilePaths]=VERSION_PATHS) -> None:
+        self.version_paths = version_paths
+        self.db:AssetDatabase = None
+        # the gui uses it from its callbacks and from the extraction thread, one connection between them
+        self.lock = threading.RLock()
+
+    def refresh(self) -> list[str]:
+        with self.lock:
+            # the manifest can change which output folder the index is in
+            path = index_db_path(self.version_paths)
+            if self.db is None or self.db.path != path:
+                if self.db is not None:
+                    self.db.close()
+                self.db = AssetDatabase(path, check_same_thread=False)
+                self.db.sync(self.version_paths)
+                return self.versions()
+            return self.db.sync(self.version_paths)
+
+    def versions(self) -> list[str]:
+        # in VERSION_PATHS order, only the ones in the index
+        with self.lock:
+            signatures = self.db.signatures()
+        return [v for v in self.version_paths if v in signatures]
+
+    def signature(self, version:str) -> str:
+        with self.lock:
+            return self.db.signatures().get(version)
+
+    def categories(self, version:str=None) -> list[str]:
+        with self.lock:
+            return [row["category"] for row in self.db.categories(version)]
+
+    def category_signatures(self, version:str) -> dict[str, str]:
+        with self.lock:
+            return {row["category"]: row["signature"] for row in self.db.categories(version)}
+
+    def entries(self, version:str, category:str) -> list[dict]:
+        with self.lock:
+            return self.db.entries(version, category)
+
+    def search(self, text:str="", mode:str="substring", version:str=None, category:str=None, min_size:int=None, max_size:int=None, compression:tuple[int, int]=None, limit:int=200) -> list[dict]:
+        text = text.strip()
+        offset = None
+        # 0x1a3800 looks up an offset, anything else is a name
+        if text.lower().startswith("0x"):
+            try:
+                offset = int(text, 16)
+                text = ""
+            except ValueError:
+                pass
+
+        versions = [version] if version is not None else self.versions()
+        with self.lock:
+            return self.db.query(text, mode, versions, category, offset, min_size=min_size, max_size=max_size, compression=compression, limit=limit)
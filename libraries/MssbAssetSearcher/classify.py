@@ -0,0 +1,150 @@
+import json
+import struct
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from .helper_filesystem import (FilePaths, VERSION_PATHS, exists, join, get_parts_of_file, REL_OUTPUT, ADGC_OUTPUT)
+from .log_callback import MssbAssetLog
+from ..MssbConstructs.mssb_construct_geo import GEO_VERSION_NUMBER
+
+ASSET_GEO = "geo"
+ASSET_COLLISION = "collision"
+# an offset table whose parts include a geo or collision section
+ASSET_ARCHIVE = "archive"
+ASSET_ADGC = "adgc"
+ASSET_REL = "rel"
+ASSET_UNKNOWN = "unknown"
+
+# more than this is much more likely to be something else
+MAX_COLLISION_BOXES = 0x400
+MAX_GEO_DESCRIPTORS = 0x400
+
+ADGC_MAGIC = b"AdGCForm"
+
+def read_u32(b:bytes, offset:int) -> int:
+    return int.from_bytes(b[offset:offset + 4], "big")
+
+def pointer_in_file(b:bytes, base:int, pointer:int, size:int=4) -> bool:
+    return pointer % 4 == 0 and base + pointer + size <= len(b)
+
+def looks_like_geo(b:bytes, offset:int) -> bool:
+    # version number, then the descriptor table and every display object/name it points at have to be in the file
+    if offset + 20 > len(b) or read_u32(b, offset) != GEO_VERSION_NUMBER:
+        return False
+    _, _, _, descriptor_count, pGeomDescriptors = struct.unpack_from(">IIIII", b, offset)
+    if not (0 < descriptor_count <= MAX_GEO_DESCRIPTORS) or not pointer_in_file(b, offset, pGeomDescriptors, 8 * descriptor_count):
+        return False
+
+    for i in range(descriptor_count):
+        pDisplayObject, pName = struct.unpack_from(">II", b, offset + pGeomDescriptors + 8 * i)
+        # a display object is 5 pointers and a bounding box
+        if not pointer_in_file(b, offset, pDisplayObject, 0x34) or offset + pName >= len(b):
+            return False
+    return True
+
+def looks_like_collision(b:bytes, offset:int) -> bool:
+    # boxCount, pad, pBoundingBoxes, then a pointer per box, all pointers inside the file and the boxes the right way round
+    if offset + 8 > len(b):
+        return False
+    box_count, pad, pBoundingBoxes = struct.unpack_from(">HHI", b, offset)
+    if not (0 < box_count <= MAX_COLLISION_BOXES) or pad != 0:
+        return False
+    if offset + 8 + 4 * box_count > len(b):
+        return False
+
+    pointers = [read_u32(b, offset + 8 + 4 * i) for i in range(box_count)]
+    if not all(pointer_in_file(b, offset, p) for p in pointers):
+        return False
+    if not pointer_in_file(b, offset, pBoundingBoxes, box_count * 24):
+        return False
+
+    boxes = np.frombuffer(b, ">f4", box_count * 6, offset + pBoundingBoxes).reshape(box_count, 2, 3)
+    return bool(np.isfinite(boxes).all() and (boxes[:, 0] <= boxes[:, 1]).all())
+
+def find_sections(b:bytes) -> list[tuple[str, int]]:
+    # (type, offset) of every geo or collision section, either the whole file or one of the parts in its offset table
+    if looks_like_geo(b, 0):
+        return [(ASSET_GEO, 0)]
+    if looks_like_collision(b, 0):
+        return [(ASSET_COLLISION, 0)]
+
+    out = []
+    for offset in get_parts_of_file(b):
+        if offset + 4 > len(b):
+            break
+        if looks_like_geo(b, offset):
+            out.append((ASSET_GEO, offset))
+        elif looks_like_collision(b, offset):
+            out.append((ASSET_COLLISION, offset))
+    return out
+
+def classify_bytes(b:bytes, category:str=None) -> tuple[str, list[tuple[str, int]]]:
+    # only byte level checks, nothing here runs a full parse
+    if category == REL_OUTPUT:
+        return ASSET_REL, []
+    if category == ADGC_OUTPUT or b.find(ADGC_MAGIC, 0, 0x20) != -1:
+        return ASSET_ADGC, []
+
+    sections = find_sections(b)
+    if len(sections) == 0:
+        return ASSET_UNKNOWN, []
+    if len(sections) == 1 and sections[0][1] == 0:
+        return sections[0][0], sections
+    return ASSET_ARCHIVE, sections
+
+def classify_file(path:str, category:str=None) -> tuple[str, list[tuple[str, int]]]:
+    # runs in a worker, anything unreadable is unknown rather than an error
+    try:
+        with open(path, "rb") as f:
+            return classify_bytes(f.read(), category)
+    except (OSError, struct.error, ValueError):
+        return ASSET_UNKNOWN, []
+
+def classify_files(jobs:list[tuple[str, str]], max_workers=None) -> list[tuple[str, list[tuple[str, int]]]]:
+    # (path, category) of each file, results come back in the same order
+    if len(jobs) <= 1:
+        return [classify_file(*job) for job in jobs]
+
+    # lots of small files, so hand them to the workers in batches
+    with ProcessPoolExecutor(max_workers) as pool:
+        return list(pool.map(classify_file, *zip(*jobs), chunksize=32))
+
+def classify_version(version_path:FilePaths, log_callback:MssbAssetLog, max_workers=None) -> dict[str, int]:
+    # tags every asset in an already extracted version's found files
+    with open(version_path.found_files_path, "r") as f:
+        found_files:dict[str, list[dict]] = json.load(f)
+
+    assets = []
+    jobs = []
+    for category, category_assets in found_files.items():
+        for asset in category_assets:
+            path = join(version_path.output_folder, category, asset["Output"], asset["Output"])
+            if exists(path):
+                assets.append(asset)
+                jobs.append((path, category))
+
+    log_callback(f"Classifying {len(jobs)} files for {version_path.version}")
+    counts = {}
+    for asset, (asset_type, sections) in zip(assets, classify_files(jobs, max_workers)):
+        asset["AssetType"] = asset_type
+        asset["Sections"] = [{"type": t, "offset": offset} for t, offset in sections]
+        counts[asset_type] = counts.get(asset_type, 0) + 1
+
+    with open(version_path.found_files_path, "w") as f:
+        json.dump(found_files, f)
+
+    log_callback(", ".join(f"{count} {asset_type}" for asset_type, count in sorted(counts.items())))
+    return counts
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Tag every extracted asset with its type in the found files")
+    parser.add_argument("--version", dest="versions", action="append", choices=list(VERSION_PATHS.keys()), help="can be given more than once, defaults to every extracted version")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    versions = args.versions or [v for v, paths in VERSION_PATHS.items() if paths.extracted()]
+    for version in versions:
+        classify_version(VERSION_PATHS[version], MssbAssetLog(), args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import json
+import numpy as np
+from os.path import getsize
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .helper_filesystem import (FilePaths, VERSION_PATHS, FILE_CACHE, exists, ensure_dir, join)
+from .log_callback import MssbAssetLog
+from .classify import (find_sections, ASSET_GEO, ASSET_COLLISION, ASSET_ARCHIVE)
+from ..MssbConstructs.mssb_geo_model import (LazyGeo, write_geo)
+from ..MssbConstructs.mssb_construct_collision import (read_collision_arrays, write_collision_mesh)
+
+CONVERT_FORMATS = (".glb", ".obj")
+
+# assets the classifier already ruled out don't need to be opened
+CONVERTIBLE_TYPES = (ASSET_GEO, ASSET_COLLISION, ASSET_ARCHIVE)
+
+def bounds_of(positions:np.ndarray) -> list[list[float]]:
+    if positions is None or len(positions) == 0:
+        return None
+    return [positions.min(axis=0).tolist(), positions.max(axis=0).tolist()]
+
+def convert_geo(b:bytes, offset:int, out_name:str, formats:tuple[str]) -> dict:
+    geo = LazyGeo(b, offset)
+    meshes = []
+    for descriptor in geo.descriptors:
+        mesh = descriptor.display_object.mesh
+        meshes.append({
+            "name": descriptor.name,
+            "vertices": 0 if mesh.positions is None else len(mesh.positions),
+            "triangles": len(mesh.triangles),
+            "bounds": [list(x) for x in descriptor.bounds],
+        })
+
+    outputs = []
+    for extension in formats:
+        write_geo(geo, out_name + extension)
+        outputs.append(out_name + extension)
+    return {"meshes": meshes, "outputs": outputs}
+
+def convert_collision(b:bytes, offset:int, out_name:str, formats:tuple[str]) -> dict:
+    mesh = read_collision_arrays(b, offset)
+    outputs = []
+    for extension in formats:
+        write_collision_mesh(mesh, out_name + extension)
+        outputs.append(out_name + extension)
+    return {
+        "meshes": [{
+            "name": "collision",
+            "vertices": len(mesh.positions),
+            "triangles": len(mesh.triangles),
+            "boxes": len(mesh.bounding_boxes),
+            "bounds": bounds_of(mesh.positions),
+        }],
+        "outputs": outputs,
+    }
+
+SECTION_CONVERTERS = {
+    ASSET_GEO: convert_geo,
+    ASSET_COLLISION: convert_collision,
+}
+
+def convert_file(path:str, out_folder:str, formats:tuple[str]=CONVERT_FORMATS, sections:list[tuple[str, int]]=None, part:dict=None) -> dict:
+    # runs in a worker, so never raises, errors are kept with the file or section they came from
+    # with a "Parts" entry only that part is looked at, and section offsets are from the start of the part
+    result = {"path": path, "part": None if part is None else part["offset"], "sections": [], "error": None}
+    try:
+        # an empty output was never written, there's nothing to convert or to map
+        if getsize(path) == 0:
+            return result
+        # mapped, so converting one part of a big archive only reads that part
+        b = FILE_CACHE.get_file_mapping(path)
+        start = 0
+        if part is not None:
+            start = part["offset"]
+            if start + part["size"] > len(b):
+                raise ValueError(f"part {start:#x} runs past the end of the file")
+        if sections is None:
+            # a view of just the part, so its offset table is read from the start of the part
+            view = b if part is None else memoryview(b)[start : start + part["size"]]
+            sections = find_sections(view)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    if sections:
+        ensure_dir(out_folder)
+
+    for kind, offset in sections:
+        section = {"kind": kind, "offset": offset, "meshes": [], "outputs": [], "error": None}
+        try:
+            out_name = join(out_folder, f"{kind}_{offset:x}")
+            section |= SECTION_CONVERTERS[kind](b, start + offset, out_name, formats)
+        except Exception as e:
+            section["error"] = f"{type(e).__name__}: {e}"
+        result["sections"].append(section)
+    return result
+
+def part_jobs(path:str, out_folder:str, parts:list[dict], sections:list[tuple[str, int]]) -> list[tuple]:
+    # one job per part, the classifier's sections are moved into the part they're in
+    jobs = []
+    for part in parts:
+        part_sections = None
+        if sections is not None:
+            end = part["offset"] + part["size"]
+            part_sections = [(kind, offset - part["offset"]) for kind, offset in sections if part["offset"] <= offset < end]
+            if len(part_sections) == 0:
+                continue
+        jobs.append((path, join(out_folder, f"part_{part['offset']:x}"), part_sections, part))
+    return jobs
+
+def convert_version(version_path:FilePaths, log_callback:MssbAssetLog, formats:tuple[str]=CONVERT_FORMATS, max_workers=None, by_part=False) -> dict:
+    # by_part converts each of an asset's "Parts" on its own, for assets that were extracted with --index-parts
+    with open(version_path.found_files_path, "r") as f:
+        found_files:dict[str, list[dict]] = json.load(f)
+
+    jobs = []
+    for category, assets in found_files.items():
+        for asset in assets:
+            path = join(version_path.output_folder, category, asset["Output"], asset["Output"])
+            if not exists(path):
+                continue
+
+            # use the classifier's sections if it has been run, otherwise each worker looks for them
+            sections = None
+            if "AssetType" in asset:
+                if asset["AssetType"] not in CONVERTIBLE_TYPES:
+                    continue
+                sections = [(x["type"], x["offset"]) for x in asset["Sections"]]
+            out_folder = join(version_path.output_converted, category, asset["Output"])
+            if by_part and asset.get("Parts"):
+                jobs += part_jobs(path, out_folder, asset["Parts"], sections)
+            else:
+                jobs.append((path, out_folder, sections, None))
+
+    log_callback(f"Looking for models in {len(jobs)} files for {version_path.version}")
+    log_callback.set_max_iters(len(jobs))
+
+    # decoding is mostly python, so spread the files over processes instead of threads
+    results = []
+    with ProcessPoolExecutor(max_workers) as pool:
+        futures = [pool.submit(convert_file, path, out_folder, formats, sections, part) for path, out_folder, sections, part in jobs]
+        for i, future in enumerate(as_completed(futures)):
+            result = future.result()
+            if result["sections"] or result["error"]:
+                results.append(result)
+            log_callback.update_iters(i + 1)
+    results.sort(key=lambda x: (x["path"], x["part"] or 0))
+
+    sections = [s for r in results for s in r["sections"]]
+    converted = [s for s in sections if s["error"] is None]
+    index = {
+        "version": version_path.version,
+        "formats": list(formats),
+        "totals": {
+            "files": sum(1 for r in results if r["sections"]),
+            "geo": sum(1 for s in converted if s["kind"] == "geo"),
+            "collision": sum(1 for s in converted if s["kind"] == "collision"),
+            "meshes": sum(len(s["meshes"]) for s in converted),
+            "vertices": sum(m["vertices"] for s in converted for m in s["meshes"]),
+            "triangles": sum(m["triangles"] for s in converted for m in s["meshes"]),
+            "errors": sum(1 for r in results if r["error"]) + sum(1 for s in sections if s["error"]),
+        },
+        "files": results,
+    }
+
+    ensure_dir(version_path.output_converted)
+    with open(version_path.converted_index_path, "w") as f:
+        json.dump(index, f, indent=2)
+
+    totals = index["totals"]
+    log_callback(f"Converted {totals['geo']} geo and {totals['collision']} collision sections for {version_path.version}, {totals['errors']} errors")
+    log_callback.finish()
+    return index
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert every geo and collision file in a version's outputs to glTF/OBJ")
+    parser.add_argument("--version", dest="versions", action="append", choices=list(VERSION_PATHS.keys()), help="can be given more than once, defaults to every extracted version")
+    parser.add_argument("--formats", nargs="+", choices=CONVERT_FORMATS, default=list(CONVERT_FORMATS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--by-part", action="store_true", help="convert each entry of an asset's Parts on its own")
+    args = parser.parse_args()
+
+    versions = args.versions or [v for v, paths in VERSION_PATHS.items() if paths.extracted()]
+    for version in versions:
+        convert_version(VERSION_PATHS[version], MssbAssetLog(), tuple(args.formats), args.workers, args.by_part)
+
+if __name__ == "__main__":
+    main()
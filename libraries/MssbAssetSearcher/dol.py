@@ -0,0 +1,100 @@
+import struct
+
+# main.dol header, offsets/addresses/sizes of every section, then bss and the entry point
+DOL_TEXT_SECTION_COUNT = 7
+DOL_DATA_SECTION_COUNT = 11
+DOL_SECTION_COUNT = DOL_TEXT_SECTION_COUNT + DOL_DATA_SECTION_COUNT
+DOL_HEADER_SIZE = 0x100
+
+DOL_TEXT = "text"
+DOL_DATA = "data"
+
+class DolSection:
+    def __init__(self, name:str, kind:str, offset:int, address:int, size:int) -> None:
+        self.name = name
+        self.kind = kind
+        # where it is in main.dol, and where it gets loaded in game memory
+        self.offset = offset
+        self.address = address
+        self.size = size
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    def __contains__(self, file_offset:int) -> bool:
+        return self.offset <= file_offset < self.end
+
+    def address_of(self, file_offset:int) -> int:
+        return self.address + file_offset - self.offset
+
+    def __repr__(self) -> str:
+        return f"{self.name} {self.offset:08x}-{self.end:08x} @ {self.address:08x}"
+
+class DolHeader:
+    def __init__(self, b:bytes) -> None:
+        if len(b) < DOL_HEADER_SIZE:
+            raise ValueError("too small to be a dol")
+
+        values = struct.unpack_from(f">{DOL_SECTION_COUNT * 3 + 3}I", b, 0)
+        offsets = values[0:DOL_SECTION_COUNT]
+        addresses = values[DOL_SECTION_COUNT:DOL_SECTION_COUNT * 2]
+        sizes = values[DOL_SECTION_COUNT * 2:DOL_SECTION_COUNT * 3]
+        self.bss_address, self.bss_size, self.entry_point = values[DOL_SECTION_COUNT * 3:]
+
+        self.sections:list[DolSection] = []
+        for i, (offset, address, size) in enumerate(zip(offsets, addresses, sizes)):
+            # unused sections are all 0
+            if size == 0:
+                continue
+            if i < DOL_TEXT_SECTION_COUNT:
+                section = DolSection(f"text{i}", DOL_TEXT, offset, address, size)
+            else:
+                section = DolSection(f"data{i - DOL_TEXT_SECTION_COUNT}", DOL_DATA, offset, address, size)
+            if offset < DOL_HEADER_SIZE or section.end > len(b):
+                raise ValueError(f"{section.name} isn't inside the file")
+            self.sections.append(section)
+
+        if len(self.text_sections) == 0 or len(self.data_sections) == 0:
+            raise ValueError("no text or data sections")
+
+    @property
+    def text_sections(self) -> list[DolSection]:
+        return [x for x in self.sections if x.kind == DOL_TEXT]
+
+    @property
+    def data_sections(self) -> list[DolSection]:
+        return [x for x in self.sections if x.kind == DOL_DATA]
+
+    def section_of(self, file_offset:int) -> DolSection:
+        for section in self.sections:
+            if file_offset in section:
+                return section
+        return None
+
+    def address_of(self, file_offset:int) -> int:
+        # None for anything that isn't loaded, e.g. the header or padding between sections
+        section = self.section_of(file_offset)
+        return None if section is None else section.address_of(file_offset)
+
+def read_dol_header(b:bytes) -> DolHeader:
+    # None if it doesn't look like a dol, so callers can fall back to treating it as plain bytes
+    try:
+        return DolHeader(b)
+    except (ValueError, struct.error):
+        return None
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Print the sections of a main.dol")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        header = DolHeader(f.read())
+    for section in header.sections:
+        print(section)
+    print(f"bss {header.bss_address:08x} size {header.bss_size:x}, entry {header.entry_point:08x}")
+
+if __name__ == "__main__":
+    main()
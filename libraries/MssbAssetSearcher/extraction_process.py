@@ -0,0 +1,141 @@
+import json
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from os.path import (getmtime, getsize, relpath)
+from .helper_filesystem import (VERSION_PATHS, exists, join)
+from .log_callback import (MssbAssetLog, WorkerEvents, FRAME_RATE)
+from .search import populate_outputs
+
+EXTRACTION_DONE = "done"
+EXTRACTION_FAILED = "failed"
+# how long a cancelled extraction gets to stop its worker pools itself before it's killed
+EXTRACTION_CANCEL_TIMEOUT = 10
+
+def run_extraction(conn, stop_event, skip_if_extracted, profiler:str=None, max_memory:int=None, index_parts:bool=False):
+    # runs in the extraction process, everything it logs goes back over conn, and it stops at its next check once stop_event is set
+    if hasattr(os, "setpgid"):
+        # its own process group, so cancelling can take any worker pools it started down with it
+        os.setpgid(0, 0)
+
+    log_callback = MssbAssetLog(events=WorkerEvents(conn.send))
+    try:
+        populate_outputs(log_callback, skip_if_extracted, stop_event.is_set, profiler, max_memory, index_parts)
+        conn.send((EXTRACTION_DONE, None))
+    except Exception:
+        conn.send((EXTRACTION_FAILED, traceback.format_exc()))
+    finally:
+        conn.close()
+
+def files_written_since(folder:str, start_time:float) -> list[dict]:
+    out = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = join(root, name)
+            if getmtime(path) >= start_time:
+                out.append({"path": relpath(path, folder), "size": getsize(path)})
+    return sorted(out, key=lambda x: x["path"])
+
+def record_partial_outputs(start_time:float, reason:str) -> list[str]:
+    # a stopped run leaves outputs without a found files manifest, or with an old one, so write down what it got to
+    recorded = []
+    for version_path in VERSION_PATHS.values():
+        if not exists(version_path.output_folder):
+            continue
+        written = files_written_since(version_path.output_folder, start_time)
+        if len(written) == 0:
+            continue
+        with open(version_path.partial_outputs_path, "w") as f:
+            json.dump({"reason": reason, "started": start_time, "stopped": time.time(), "files": written}, f, indent=2)
+        recorded.append(version_path.version)
+    return recorded
+
+def clear_partial_outputs(start_time:float):
+    # anything this run finished doesn't need the record of an earlier stopped one
+    for version_path in VERSION_PATHS.values():
+        if exists(version_path.partial_outputs_path) and version_path.extracted() and getmtime(version_path.found_files_path) >= start_time:
+            os.remove(version_path.partial_outputs_path)
+
+class ExtractionProcess:
+    """populate_outputs in its own process, so the decode loops don't hold the gui's GIL, and cancelling doesn't have to wait for them"""
+    def __init__(self, skip_if_extracted, profiler:str=None, max_memory:int=None, index_parts:bool=False) -> None:
+        self.args = (skip_if_extracted, profiler, max_memory, index_parts)
+        self.process:multiprocessing.Process = None
+        self.conn = None
+        self.stop_event = None
+        self.cancelled = False
+        self.cancel_time:float = None
+        self.start_time:float = None
+
+    def start(self):
+        # spawn, not fork, the gui process has threads and a gpu context that shouldn't be copied
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe(duplex=False)
+        self.stop_event = context.Event()
+        self.start_time = time.time()
+        self.process = context.Process(target=run_extraction, args=(child_conn, self.stop_event, *self.args), name="extraction")
+        self.process.start()
+        # only the child writes to this end
+        child_conn.close()
+
+    def cancel(self):
+        # asks it to stop, so it shuts its own worker pools down, supervise kills it if that takes too long
+        self.cancelled = True
+        self.cancel_time = time.monotonic()
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def kill(self):
+        if self.process is None or not self.process.is_alive():
+            return
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                return
+            except OSError:
+                pass
+        self.process.terminate()
+
+    def supervise(self, log_callback:MssbAssetLog) -> bool:
+        # blocks until the process is done, passing its events on to log_callback's bus, True if it finished
+        finished = False
+        error = None
+        while True:
+            try:
+                # waiting on the pipe releases the GIL, so the gui keeps drawing
+                if not self.conn.poll(1 / FRAME_RATE):
+                    if not self.process.is_alive():
+                        break
+                    if self.cancelled and time.monotonic() - self.cancel_time > EXTRACTION_CANCEL_TIMEOUT:
+                        # without killpg this only gets the extraction process, but the pools have had their chance to stop
+                        self.kill()
+                    continue
+                kind, value = self.conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if kind == EXTRACTION_DONE:
+                finished = True
+                break
+            if kind == EXTRACTION_FAILED:
+                error = value
+                break
+            log_callback.events.put_event(kind, value)
+
+        self.process.join()
+        self.conn.close()
+
+        # a cancelled run still finishes normally once it stops, but it didn't get through everything
+        if finished and not self.cancelled:
+            clear_partial_outputs(self.start_time)
+            return True
+
+        if error is not None:
+            log_callback(error)
+        reason = "cancelled" if self.cancelled else "failed" if error is not None else f"exited with {self.process.exitcode}"
+        recorded = record_partial_outputs(self.start_time, reason)
+        log_callback(f"Extraction {reason}", f"partial outputs recorded for {', '.join(recorded)}" if recorded else "")
+        log_callback.update_label(f"Extraction {reason}")
+        return False
@@ -1,10 +1,13 @@
 from os.path import (join, exists)
 from os import (makedirs)
+import json
+import mmap
 
 INPUT_FOLDER = "data"
 OUTPUT_FOLDER = "outputs"
 KNOWN_FILES = "FileNames.json"
 FOUND_FILES = "FoundFiles.json"
+SEARCH_REPORT = "SearchReport.json"
 
 ADGC_OUTPUT = "AdGCForms"
 RAW_OUTPUT = "Raw files"
@@ -13,6 +16,19 @@ UNREFERENCED_CMPR_OUTPUT = "Unreferenced files"
 
 REL_OUTPUT = "Rels"
 
+REPACK_OUTPUT = "Repacked"
+PROFILE_OUTPUT = "Profiles"
+CONVERT_OUTPUT = "Converted"
+CONVERT_INDEX = "ConvertedIndex.json"
+PARTS_INDEX = "PartsIndex.json"
+PARTIAL_OUTPUTS = "PartialOutputs.json"
+JOURNAL = "Journal.jsonl"
+# one for the whole output folder, so queries can go across versions
+INDEX_DB = "AssetIndex.sqlite"
+
+# optional, lists the dumps to use instead of VERSIONS below
+DUMP_MANIFEST = "Dumps.json"
+
 MSSB_CODE_FILE = "aaaa.dat"
 MSSB_DATA_FILE = "ZZZZ.dat"
 
@@ -30,12 +46,12 @@ VERSIONS = [
 ]
 
 class FilePaths:
-    def __init__(self, version:str) -> None:
+    def __init__(self, version:str, input_folder:str=INPUT_FOLDER, output_folder:str=OUTPUT_FOLDER) -> None:
         self.version = version
 
-        self.version_input_folder = join(INPUT_FOLDER, version)
+        self.version_input_folder = join(input_folder, version)
 
-        self.output_folder = join(OUTPUT_FOLDER, version)
+        self.output_folder = join(output_folder, version)
 
         self.set_code_file_name(MSSB_CODE_FILE)
         self.set_data_file_name(MSSB_DATA_FILE)
@@ -43,12 +59,29 @@ class FilePaths:
 
         self.known_files_path = join(self.version_input_folder, KNOWN_FILES)
         self.found_files_path = join(self.output_folder, FOUND_FILES)
+        self.search_report_path = join(self.output_folder, SEARCH_REPORT)
+        self.parts_index_path = join(self.output_folder, PARTS_INDEX)
+        self.partial_outputs_path = join(self.output_folder, PARTIAL_OUTPUTS)
+        self.journal_path = join(self.output_folder, JOURNAL)
+        self.index_db_path = join(output_folder, INDEX_DB)
 
         self.output_adgc = join(self.output_folder, ADGC_OUTPUT)
         self.output_raw = join(self.output_folder, RAW_OUTPUT)
         self.output_compressed_referenced = join(self.output_folder, REFERENCED_OUTPUT)
         self.output_compressed_unreferenced = join(self.output_folder, UNREFERENCED_CMPR_OUTPUT)
         self.output_rels = join(self.output_folder, REL_OUTPUT)
+        self.output_repacked = join(self.output_folder, REPACK_OUTPUT)
+        self.output_profiles = join(self.output_folder, PROFILE_OUTPUT)
+        self.output_converted = join(self.output_folder, CONVERT_OUTPUT)
+        self.converted_index_path = join(self.output_converted, CONVERT_INDEX)
+
+    def set_input_folder(self, input_folder:str):
+        # for dumps that aren't in the input folder under their own name
+        self.version_input_folder = input_folder
+        self.known_files_path = join(self.version_input_folder, KNOWN_FILES)
+        self.set_code_file_name(self._code_file_name)
+        self.set_data_file_name(self._data_file_name)
+        self.set_main_file_name(self._main_file_name)
 
     def set_code_file_name(self, code_file_name:str):
         self._code_file_name = code_file_name
@@ -72,13 +105,49 @@ class FilePaths:
     def extracted(self):
         return exists(self.found_files_path)
 
-VERSION_PATHS = {
-    v: FilePaths(v) for v in VERSIONS
-}
-
-# fs03 is the only game that uses different file naming conventions
-VERSION_PATHS["FS03"].set_data_file_name(FS03_DATA_FILE)
-VERSION_PATHS["FS03"].set_code_file_name(FS03_CODE_FILE)
+def default_version_paths() -> dict[str, FilePaths]:
+    version_paths = {
+        v: FilePaths(v) for v in VERSIONS
+    }
+
+    # fs03 is the only game that uses different file naming conventions
+    version_paths["FS03"].set_data_file_name(FS03_DATA_FILE)
+    version_paths["FS03"].set_code_file_name(FS03_CODE_FILE)
+    return version_paths
+
+def load_dump_manifest(path:str=DUMP_MANIFEST) -> dict[str, FilePaths]:
+    # {"input_folder": ..., "output_folder": ..., "dumps": [{"name", and optionally "input", "code", "data", "main"}]}
+    # a dump without "input" is read from input_folder/name, anything not given uses the mssb names
+    with open(path, "r") as f:
+        manifest = json.load(f)
+
+    input_folder = manifest.get("input_folder", INPUT_FOLDER)
+    output_folder = manifest.get("output_folder", OUTPUT_FOLDER)
+    version_paths = {}
+    for dump in manifest["dumps"]:
+        name = dump["name"]
+        if name in version_paths:
+            raise ValueError(f"{name} is in {path} more than once")
+
+        paths = FilePaths(name, input_folder, output_folder)
+        if "input" in dump:
+            paths.set_input_folder(dump["input"])
+        if "code" in dump:
+            paths.set_code_file_name(dump["code"])
+        if "data" in dump:
+            paths.set_data_file_name(dump["data"])
+        if "main" in dump:
+            paths.set_main_file_name(dump["main"])
+        version_paths[name] = paths
+    return version_paths
+
+def use_dump_manifest(path:str):
+    # in place, everything that imported VERSION_PATHS sees the new dumps
+    version_paths = load_dump_manifest(path)
+    VERSION_PATHS.clear()
+    VERSION_PATHS.update(version_paths)
+
+VERSION_PATHS = load_dump_manifest() if exists(DUMP_MANIFEST) else default_version_paths()
 
 def ensure_dir(path:str):
     makedirs(path, exist_ok=True)
@@ -101,6 +170,18 @@ def get_parts_of_file(file_bytes:bytes):
 
     return found_inds
 
+def get_part_ranges(file_bytes:bytes) -> list[tuple[int, int]]:
+    # (offset, size) of every part in the offset table at the start of a file, each part runs up to the next one,
+    # the last to the end of the file. Empty if the table doesn't make sense for this file
+    offsets = get_parts_of_file(file_bytes)
+    if len(offsets) == 0:
+        return []
+    # the table and its 0 terminator come before the first part, and every part starts inside the file
+    if offsets[0] < 4 * (len(offsets) + 1) or offsets[-1] >= len(file_bytes):
+        return []
+    ends = offsets[1:] + [len(file_bytes)]
+    return [(offset, end - offset) for offset, end in zip(offsets, ends)]
+
 class FileCache:
     def __init__(self) -> None:
         self.__byte_cache__: dict[str, bytes] = {}
@@ -117,4 +198,9 @@ class FileCache:
         # self.__cache_file(file_name)
         # return self.__byte_cache__[file_name]
 
+    def get_file_mapping(self, file_name:str) -> mmap.mmap:
+        # reads like bytes, but only the pages that are touched get loaded, and the os can drop them again
+        with open(file_name, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
 FILE_CACHE = FileCache()
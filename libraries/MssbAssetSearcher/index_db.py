@@ -0,0 +1,301 @@
+import hashlib
+import json
+import mmap
+import sqlite3
+from os.path import dirname
+from .helper_filesystem import (FilePaths, VERSION_PATHS, OUTPUT_FOLDER, INDEX_DB, exists, ensure_dir, join)
+from .journal import input_signature
+
+# bump when the tables change, an index in an older format is thrown away and rebuilt from the found files
+INDEX_DB_FORMAT = 2
+# parallel searches of several dumps all write to the one index
+INDEX_DB_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version TEXT PRIMARY KEY,
+    signature TEXT
+);
+CREATE TABLE IF NOT EXISTS categories (
+    version TEXT,
+    category TEXT,
+    count INTEGER,
+    signature TEXT,
+    PRIMARY KEY (version, category)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    version TEXT,
+    category TEXT,
+    input TEXT,
+    offset INTEGER,
+    original_size INTEGER,
+    compressed_size INTEGER,
+    lookback_bit INTEGER,
+    repetition_bit INTEGER,
+    compression_flag INTEGER,
+    output TEXT,
+    known_name TEXT,
+    extracted INTEGER,
+    asset_type TEXT,
+    content_hash TEXT,
+    reference INTEGER,
+    referenced_by TEXT,
+    path TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT,
+    version TEXT,
+    entry INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_version ON entries (version, category, offset);
+CREATE INDEX IF NOT EXISTS entries_offset ON entries (offset);
+CREATE INDEX IF NOT EXISTS entries_input ON entries (input, offset);
+CREATE INDEX IF NOT EXISTS entries_size ON entries (original_size);
+CREATE INDEX IF NOT EXISTS entries_compression ON entries (lookback_bit, repetition_bit);
+CREATE INDEX IF NOT EXISTS entries_output ON entries (output);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries (content_hash);
+CREATE INDEX IF NOT EXISTS entries_type ON entries (asset_type);
+CREATE INDEX IF NOT EXISTS entries_reference ON entries (reference);
+CREATE INDEX IF NOT EXISTS names_name ON names (name);
+CREATE INDEX IF NOT EXISTS names_version ON names (version);
+"""
+
+ENTRY_COLUMNS = ("version", "category", "input", "offset", "original_size", "compressed_size", "lookback_bit", "repetition_bit", "compression_flag",
+    "output", "known_name", "extracted", "asset_type", "content_hash", "reference", "referenced_by", "path", "data")
+
+def file_hash(path:str) -> str:
+    # mapped, like the part hashes, so big outputs aren't read into memory
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return hashlib.sha1().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return hashlib.sha1(data).hexdigest()
+
+def version_signature(version_path:FilePaths) -> str:
+    # the index for a version is only rebuilt when one of these changes
+    return json.dumps([input_signature(version_path.found_files_path), input_signature(version_path.known_files_path)])
+
+def index_db_path(version_paths:dict[str, FilePaths]) -> str:
+    # every dump in a manifest shares an output folder, so it's one index for all of them
+    for version_path in version_paths.values():
+        return version_path.index_db_path
+    return join(OUTPUT_FOLDER, INDEX_DB)
+
+class AssetDatabase:
+    """SQLite index over the found files of every extracted version, so lookups don't have to load and walk all the json.
+    The found files are still what the search writes and what everything else reads, this is built from them"""
+    def __init__(self, path:str, check_same_thread:bool=True) -> None:
+        self.path = path
+        if dirname(path):
+            ensure_dir(dirname(path))
+        self.connection = sqlite3.connect(path, timeout=INDEX_DB_TIMEOUT, check_same_thread=check_same_thread)
+        self.connection.row_factory = sqlite3.Row
+        # readers, like the viewer, aren't blocked while a search writes its results
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != INDEX_DB_FORMAT:
+            with self.connection:
+                for table in ("versions", "categories", "entries", "names"):
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self.connection.execute(f"PRAGMA user_version = {INDEX_DB_FORMAT}")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def signatures(self) -> dict[str, str]:
+        return {row["version"]: row["signature"] for row in self.connection.execute("SELECT version, signature FROM versions")}
+
+    def remove_version(self, version:str):
+        with self.connection:
+            self.__delete_version(version)
+
+    def __delete_version(self, version:str):
+        for table in ("names", "entries", "categories", "versions"):
+            self.connection.execute(f"DELETE FROM {table} WHERE version = ?", (version,))
+
+    def import_version(self, version_path:FilePaths) -> int:
+        # replaces everything indexed for the version with what's in its found files now, returns how many entries there are
+        signature = version_signature(version_path)
+        known_files = {}
+        if exists(version_path.known_files_path):
+            with open(version_path.known_files_path, "r") as f:
+                known_files = {int(d["Location"], 16): d["Name"] for d in json.load(f)}
+
+        with open(version_path.found_files_path, "r") as f:
+            found_files:dict[str, list[dict]] = json.load(f)
+
+        # hashing reads every output, so it's done before the write lock is taken
+        rows = []
+        categories = []
+        for category, assets in found_files.items():
+            categories.append((version_path.version, category, len(assets), hashlib.sha1(json.dumps(assets).encode()).hexdigest()))
+            for asset in assets:
+                path = join(version_path.output_folder, category, asset["Output"], asset["Output"])
+                # the known names are by data file offset, rels and anything else in the code file don't have one
+                known_name = known_files.get(asset["offset"]) if asset["Input"] == version_path.data_path else None
+                rows.append((asset, known_name, (
+                    version_path.version,
+                    category,
+                    asset["Input"],
+                    asset["offset"],
+                    asset["original_size"],
+                    asset["compressed_size"],
+                    asset["lookback_bit"],
+                    asset["repetition_bit"],
+                    asset["compression_flag"],
+                    asset["Output"],
+                    known_name,
+                    # older manifests don't say what was written, but only entries with a size ever are
+                    asset.get("Extracted", asset["original_size"] > 0),
+                    asset.get("AssetType"),
+                    file_hash(path) if exists(path) else None,
+                    asset.get("Reference"),
+                    asset.get("ReferencedBy"),
+                    path,
+                    json.dumps(asset),
+                )))
+
+        with self.connection:
+            self.__delete_version(version_path.version)
+            self.connection.executemany("INSERT INTO categories VALUES (?, ?, ?, ?)", categories)
+            insert = f"INSERT INTO entries ({', '.join(ENTRY_COLUMNS)}) VALUES ({', '.join('?' * len(ENTRY_COLUMNS))})"
+            for asset, known_name, row in rows:
+                entry_id = self.connection.execute(insert, row).lastrowid
+                # every name an entry can be found by, output name first
+                names = {asset["Output"].lower()}
+                if known_name:
+                    names.add(known_name.lower())
+                self.connection.executemany("INSERT INTO names VALUES (?, ?, ?)", [(name, version_path.version, entry_id) for name in names])
+            self.connection.execute("INSERT INTO versions VALUES (?, ?)", (version_path.version, signature))
+        return len(rows)
+
+    def sync(self, version_paths:dict[str, FilePaths]=VERSION_PATHS) -> list[str]:
+        # brings the index up to date with the found files on disk, returns the versions that changed
+        signatures = self.signatures()
+        changed = []
+        for version_path in version_paths.values():
+            if not version_path.extracted():
+                if version_path.version in signatures:
+                    self.remove_version(version_path.version)
+                    changed.append(version_path.version)
+                continue
+            if signatures.get(version_path.version) == version_signature(version_path):
+                continue
+            self.import_version(version_path)
+            changed.append(version_path.version)
+        return changed
+
+    def record(row:sqlite3.Row) -> dict:
+        # the found files entry, plus where it's from
+        return json.loads(row["data"]) | {
+            "version": row["version"],
+            "category": row["category"],
+            "known_name": row["known_name"],
+            "path": row["path"],
+            "content_hash": row["content_hash"],
+        }
+
+    def categories(self, version:str=None) -> list[sqlite3.Row]:
+        if version is None:
+            return self.connection.execute("SELECT DISTINCT category FROM categories ORDER BY category").fetchall()
+        return self.connection.execute("SELECT category, count, signature FROM categories WHERE version = ? ORDER BY rowid", (version,)).fetchall()
+
+    def entries(self, version:str, category:str) -> list[dict]:
+        # sorted by offset, so maybe similar files are neighbors
+        rows = self.connection.execute("SELECT * FROM entries WHERE version = ? AND category = ? ORDER BY offset", (version, category))
+        return [AssetDatabase.record(row) for row in rows]
+
+    def query(self, text:str="", mode:str="substring", versions:list[str]=None, category:str=None, offset:int=None, reference:int=None,
+            min_size:int=None, max_size:int=None, compression:tuple[int, int]=None, asset_type:str=None, content_hash:str=None, limit:int=None) -> list[dict]:
+        where = []
+        params = []
+        if versions is not None:
+            where.append(f"version IN ({', '.join('?' * len(versions))})")
+            params += versions
+        if text != "":
+            text = text.lower()
+            if mode == "prefix":
+                # anything starting with text sorts before text followed by the largest character
+                names = "name >= ? AND name < ?"
+                params += [text, text + "\U0010ffff"]
+            else:
+                names = "instr(name, ?) > 0"
+                params.append(text)
+            where.append(f"id IN (SELECT entry FROM names WHERE {names})")
+        for column, value in (("category", category), ("offset", offset), ("reference", reference), ("asset_type", asset_type), ("content_hash", content_hash)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if min_size is not None:
+            where.append("original_size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            where.append("original_size <= ?")
+            params.append(max_size)
+        if compression is not None:
+            where.append("lookback_bit = ? AND repetition_bit = ?")
+            params += list(compression)
+
+        sql = "SELECT * FROM entries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY version, offset, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [AssetDatabase.record(row) for row in self.connection.execute(sql, params)]
+
+    def export_version(self, version:str) -> dict[str, list[dict]]:
+        # back to the found files format, in the order they were in
+        out = {row["category"]: [] for row in self.categories(version)}
+        for row in self.connection.execute("SELECT category, data FROM entries WHERE version = ? ORDER BY id", (version,)):
+            out[row["category"]].append(json.loads(row["data"]))
+        return out
+
+def update_index(version_path:FilePaths) -> int:
+    with AssetDatabase(version_path.index_db_path) as db:
+        return db.import_version(version_path)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Query the index of every extracted version's found files")
+    parser.add_argument("text", nargs="?", default="", help="part of an output or known file name")
+    parser.add_argument("--prefix", action="store_true", help="match names that start with text instead")
+    parser.add_argument("--version", dest="versions", action="append", choices=list(VERSION_PATHS.keys()), help="can be given more than once, defaults to every version")
+    parser.add_argument("--category", default=None)
+    parser.add_argument("--offset", type=lambda x: int(x, 0), default=None, help="where the entry is in its input file")
+    parser.add_argument("--reference", type=lambda x: int(x, 0), default=None, help="address of the table entry that pointed at it")
+    parser.add_argument("--type", dest="asset_type", default=None)
+    parser.add_argument("--hash", dest="content_hash", default=None, help="sha1 of the extracted file")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--export", metavar="FOLDER", default=None, help="write each version's found files json from the index instead")
+    args = parser.parse_args()
+
+    with AssetDatabase(index_db_path(VERSION_PATHS)) as db:
+        db.sync(VERSION_PATHS)
+        versions = args.versions or [v for v in VERSION_PATHS if v in db.signatures()]
+
+        if args.export is not None:
+            ensure_dir(args.export)
+            for version in versions:
+                with open(join(args.export, f"{version}.json"), "w") as f:
+                    json.dump(db.export_version(version), f)
+            return
+
+        records = db.query(args.text, "prefix" if args.prefix else "substring", versions, args.category, args.offset, args.reference,
+            asset_type=args.asset_type, content_hash=args.content_hash, limit=args.limit)
+        for record in records:
+            name = f' ({record["known_name"]})' if record["known_name"] and record["known_name"] != record["Output"] else ""
+            print(f'{record["version"]} {record["category"]}/{record["Output"]}{name} {record["Input"]} {record["offset"]:08x} size {record["original_size"]:x} {record.get("AssetType") or ""}')
+
+if __name__ == "__main__":
+    main()
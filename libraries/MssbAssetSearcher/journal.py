@@ -0,0 +1,91 @@
+import json
+import os
+from os.path import exists
+
+JOURNAL_FORMAT = 1
+
+def input_signature(path:str) -> list[int]:
+    # size and modified time, if either changes the journal doesn't apply anymore
+    if not exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+class ExtractionJournal:
+    """Append only record of one version's extraction as it goes, each finished phase's entries and each written output,
+    so a stopped or crashed run can pick up where it left off instead of searching everything again"""
+    def __init__(self, path:str, inputs:list[str]) -> None:
+        self.path = path
+        self.inputs = {x: input_signature(x) for x in inputs}
+        # phase name -> category -> entry dicts, as they were when the phase finished
+        self.phases:dict[str, dict[str, list[dict]]] = {}
+        self.last_phase:str = None
+        # output key -> output name it was written as, None if it couldn't be extracted
+        self.outputs:dict[str, str] = {}
+
+        records = self.__load()
+        self.resumed = len(records) > 1
+        # written back out either way, a line cut off by a crash shouldn't end up in the middle of the file
+        self.file = open(path, "w")
+        for record in records or [{"journal": JOURNAL_FORMAT, "inputs": self.inputs}]:
+            self.__write(record)
+        self.file.flush()
+
+    def __load(self) -> list[dict]:
+        if not exists(self.path):
+            return []
+
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # everything before the broken line is still good
+                    break
+
+        if len(records) == 0 or records[0].get("journal") != JOURNAL_FORMAT or records[0].get("inputs") != self.inputs:
+            return []
+
+        for record in records[1:]:
+            if "phase" in record:
+                self.phases[record["phase"]] = record["entries"]
+                self.last_phase = record["phase"]
+            elif "output" in record:
+                self.outputs[record["output"]] = record["name"]
+        return records
+
+    def __write(self, record:dict):
+        self.file.write(json.dumps(record) + "\n")
+
+    def phase_done(self, phase:str) -> bool:
+        return phase in self.phases
+
+    def complete_phase(self, phase:str, entries:dict[str, set]):
+        # entries is category -> set of DataEntry
+        record = {"phase": phase, "entries": {category: [x.to_dict() for x in collection] for category, collection in entries.items()}}
+        self.__write(record)
+        self.file.flush()
+        # phases are few and expensive, make sure they're really on disk
+        os.fsync(self.file.fileno())
+        self.phases[phase] = record["entries"]
+        self.last_phase = phase
+
+    def output_key(category:str, entry) -> str:
+        # from before the entry gets renamed, so it's the same on every run
+        return f"{category}/{entry.file}/{entry.disk_location:x}/{entry.lookback_bit_size:02x}{entry.repetition_bit_size:02x}"
+
+    def record_output(self, key:str, name:str):
+        self.__write({"output": key, "name": name})
+        # flushed, not synced, a killed process still loses nothing
+        self.file.flush()
+        self.outputs[key] = name
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def finish(self):
+        # everything made it into the found files, nothing to resume anymore
+        self.close()
+        os.remove(self.path)
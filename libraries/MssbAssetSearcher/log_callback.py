@@ -1,35 +1,212 @@
+import atexit
+import io
+import queue
+import threading
+import time
 from typing import Any
 
+# progress and labels are only passed on this often, however often they're set
+FRAME_RATE = 30
+# most log lines handed to the sink in one go, the rest wait for the next frame
+MAX_LOG_BATCH = 500
 
-class MssbAssetLog():
-    LOG_CALLBACK = lambda *args, **kwargs: None
+LOG_LINE = "log"
+LOG_LABEL = "label"
+LOG_PROGRESS = "progress"
+
+def print_args_to_string(*args, **kwargs) -> str:
+    with io.StringIO() as output:
+        print(*args, file=output, **kwargs)
+        return output.getvalue()
+
+class LogSink:
+    """Where events end up once they're pumped, this one just prints the log, for headless runs"""
+    def log(self, lines:list[str]):
+        for line in lines:
+            print(line, end="")
+
+    def label(self, text:str):
+        pass
+
+    def progress(self, value:float):
+        pass
+
+class NullSink(LogSink):
+    def log(self, lines:list[str]):
+        pass
+
+class LogEventBus:
+    """Thread safe hand off between whatever is doing the work and whatever shows it.
+    Log lines are queued, only the latest label and progress are kept, and pump() passes it all on in one batch"""
+    def __init__(self, sink:LogSink=None, frame_rate:int=FRAME_RATE) -> None:
+        self.sink = sink if sink is not None else LogSink()
+        self.frame_time = 1 / frame_rate
+        self.lines = queue.SimpleQueue()
+        self.latest_label:str = None
+        self.latest_progress:float = None
+        self.shown_label:str = None
+        self.shown_progress:float = None
+        # events from worker processes, only made if something asks for it
+        self.manager = None
+        self.worker_events = None
+
+        self.pump_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.last_pump = 0.0
+        # pumped on a background thread unless the ui says it'll do it
+        self.manual = False
+        self.pump_thread:threading.Thread = None
+
+    def put_log(self, text:str):
+        self.lines.put(text)
+        self.__ensure_pumping()
+
+    def set_label(self, text:str):
+        self.latest_label = text
+        self.__ensure_pumping()
+
+    def set_progress(self, value:float):
+        self.latest_progress = value
+        self.__ensure_pumping()
+
+    def worker_queue(self):
+        # a queue that can be pickled into ProcessPoolExecutor jobs, see MssbAssetLog.for_worker
+        if self.worker_events is None:
+            import multiprocessing
+            self.manager = multiprocessing.Manager()
+            self.worker_events = self.manager.Queue()
+        return self.worker_events
+
+    def pump_manually(self, sink:LogSink=None):
+        # for a ui with its own loop, which then calls pump() every frame from the thread that's allowed to draw
+        self.manual = True
+        if sink is not None:
+            self.sink = sink
+
+    def pump(self, force=False):
+        with self.pump_lock:
+            now = time.monotonic()
+            if not force and now - self.last_pump < self.frame_time:
+                return
+            self.last_pump = now
+
+            if self.worker_events is not None:
+                self.__drain_worker_events()
+
+            lines = []
+            while len(lines) < MAX_LOG_BATCH:
+                try:
+                    lines.append(self.lines.get_nowait())
+                except queue.Empty:
+                    break
+            if lines:
+                self.sink.log(lines)
+
+            label, progress = self.latest_label, self.latest_progress
+            if label != self.shown_label:
+                self.shown_label = label
+                self.sink.label(label)
+            if progress != self.shown_progress:
+                self.shown_progress = progress
+                self.sink.progress(progress)
 
-    def __init__(self, label_callback = None, progbar_callback=None, max_iterations=-1) -> None:
-        self.label_callback = self.LOG_CALLBACK
-        self.progress_bar_callback = progbar_callback
+    def flush(self):
+        # everything still waiting, regardless of frame rate or batch size
+        while not self.lines.empty() or (self.worker_events is not None and not self.worker_events.empty()):
+            self.pump(force=True)
+        self.pump(force=True)
+
+    def put_event(self, kind:str, value):
+        # an event as sent by WorkerEvents
+        if kind == LOG_LINE:
+            self.put_log(value)
+        elif kind == LOG_LABEL:
+            self.set_label(value)
+        elif kind == LOG_PROGRESS:
+            self.set_progress(value)
+
+    def __drain_worker_events(self):
+        while True:
+            try:
+                kind, value = self.worker_events.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return
+            self.put_event(kind, value)
+
+    def __ensure_pumping(self):
+        if self.manual or self.pump_thread is not None:
+            return
+        with self.start_lock:
+            if self.pump_thread is not None:
+                return
+            self.pump_thread = threading.Thread(target=self.__pump_forever, daemon=True)
+            self.pump_thread.start()
+        # whatever the daemon thread didn't get to before exit
+        atexit.register(self.flush)
+
+    def __pump_forever(self):
+        while not self.manual:
+            self.pump()
+            time.sleep(self.frame_time)
+
+# progress from a worker is only sent when it moves this much, so at most this many times however many updates there are
+WORKER_PROGRESS_STEPS = 1000
+
+class WorkerEvents:
+    """Same interface as LogEventBus for MssbAssetLog, but sends everything back to the parent,
+    send is anything that takes a (kind, value) tuple, e.g. a queue's put or a pipe's send"""
+    def __init__(self, send, progress:bool=True) -> None:
+        self.send = send
+        # off when several workers share one progress bar, only their log lines are sent
+        self.progress = progress
+        self.last_step = None
+
+    def put_log(self, text:str):
+        self.send((LOG_LINE, text))
+
+    def set_label(self, text:str):
+        if self.progress:
+            self.send((LOG_LABEL, text))
+
+    def set_progress(self, value:float):
+        if not self.progress:
+            return
+        # this one goes across processes, steps rather than time so the last value is never held back
+        step = int(value * WORKER_PROGRESS_STEPS)
+        if step == self.last_step:
+            return
+        self.last_step = step
+        self.send((LOG_PROGRESS, value))
+
+LOG_EVENTS = LogEventBus()
+
+class MssbAssetLog():
+    def __init__(self, max_iterations=-1, events:LogEventBus=None) -> None:
+        self.events = events if events is not None else LOG_EVENTS
         self.max_iter = max_iterations
 
     def update_label(self, *args, **kwargs):
-        if self.label_callback:
-            self.label_callback(*args, **kwargs)
+        self.events.set_label(print_args_to_string(*args, **kwargs))
 
     def update_iters(self, iters):
-        if self.progress_bar_callback:
-            if self.max_iter == 0:
-                self.progress_bar_callback(0)
-            else:
-                self.progress_bar_callback(iters / self.max_iter)
+        if self.max_iter == 0:
+            self.events.set_progress(0)
+        else:
+            self.events.set_progress(iters / self.max_iter)
 
     def set_max_iters(self, max_iters):
         self.max_iter = max_iters
-    
+
     def __call__(self, *args: Any, **kwds: Any) -> Any:
-        if self.LOG_CALLBACK:
-            print(*args, *kwds)
-            self.LOG_CALLBACK(*args, **kwds)
+        self.events.put_log(print_args_to_string(*args, **kwds))
+
     def finish(self):
         self.update_iters(self.max_iter)
         self.update_label("Done")
-    
+
+    def for_worker(self, progress:bool=True) -> "MssbAssetLog":
+        # picklable, for passing to a worker process, its events show up on this log's bus
+        return MssbAssetLog(self.max_iter, WorkerEvents(self.events.worker_queue().put, progress))
+
     def __str__(self) -> str:
         return "MssbAssetLog: "
@@ -23,8 +23,9 @@ class bitbuffer:
     __BITS_PER_BUFFER = __BYTE_COUNT_PER_BUFFER * BITS_PER_BYTE
     __ENDIAN = "big"
 
-    def __init__(self, data = bytearray(), offset = 0) -> None:
-        self._byte_array = data
+    def __init__(self, data = None, offset = 0) -> None:
+        # a default bytearray would be shared between every bitbuffer that gets written to
+        self._byte_array = bytearray() if data is None else data
         self.bit_buffer = 0
         self.buffer_bit_count = 0
         self.byte_index = offset
@@ -228,6 +229,86 @@ def decompress(in_buffer:bytes, offset:int, final_decompressed_size:int, lookbac
     
     return bytes(output)
 
+class StreamingDecompressor:
+    """Decompresses only as far as has been asked for, picking up where it left off next time"""
+    def __init__(self, in_buffer:bytes, offset:int, final_decompressed_size:int, lookback_size=LZ11_BITS_PER_LOOKBACK, repetition_size=LZ11_BITS_PER_REPETITION) -> None:
+        self.compressed_data = bitbuffer(in_buffer, offset)
+        self.output = bytearray()
+        self.final_decompressed_size = final_decompressed_size
+        self.lookback_size = lookback_size
+        self.repetition_size = repetition_size
+        self.min_reptition = get_min_repetitions(lookback_size, repetition_size)
+
+    def decompress_until(self, size:int) -> bytearray:
+        COMPRESSED_DATA = self.compressed_data
+        output = self.output
+        size = min(size, self.final_decompressed_size)
+
+        while len(output) < size:
+            if COMPRESSED_DATA.read_bits(LZ11_BITS_PER_FLAG) == LZ11_FLAG_REPETITION:
+                lookback = COMPRESSED_DATA.read_bits(self.lookback_size)
+                if lookback >= len(output):
+                    raise IllegalDecompressionSequenceException()
+
+                neg_lookback = -1 - lookback
+                count = COMPRESSED_DATA.read_bits(self.repetition_size) + self.min_reptition
+
+                if lookback >= count:
+                    pos_lookback = len(output) + neg_lookback
+                    output.extend(output[pos_lookback : pos_lookback + count])
+                else:
+                    while count > 0:
+                        output.append(output[neg_lookback])
+                        count -= 1
+
+            else: # FLAG_ORIGINAL
+                output.append(COMPRESSED_DATA.read_bits(BITS_PER_BYTE))
+
+        return output
+
+def decompress_to_file(in_buffer:bytes, offset:int, final_decompressed_size:int, out_file, lookback_size=LZ11_BITS_PER_LOOKBACK, repetition_size=LZ11_BITS_PER_REPETITION, chunk_size=0x10000) -> int:
+    # same as decompress, but only keeps enough output around to look back into, the rest goes to out_file
+    COMPRESSED_DATA = bitbuffer(in_buffer, offset)
+    output = bytearray()
+    # how many bytes have already left `output`
+    flushed = 0
+
+    min_reptition = get_min_repetitions(lookback_size, repetition_size)
+    window_size = 1 << lookback_size
+
+    while flushed + len(output) < final_decompressed_size:
+
+        if COMPRESSED_DATA.read_bits(LZ11_BITS_PER_FLAG) == LZ11_FLAG_REPETITION:
+
+            lookback = COMPRESSED_DATA.read_bits(lookback_size)
+            if lookback >= flushed + len(output):
+                raise IllegalDecompressionSequenceException()
+
+            neg_lookback = -1 - lookback
+
+            count = COMPRESSED_DATA.read_bits(repetition_size) + min_reptition
+
+            if lookback >= count:
+                pos_lookback = len(output) + neg_lookback
+                output.extend(output[pos_lookback : pos_lookback + count])
+            else:
+                while count > 0:
+                    output.append(output[neg_lookback])
+                    count -= 1
+
+        else: # FLAG_ORIGINAL
+            output.append(COMPRESSED_DATA.read_bits(BITS_PER_BYTE))
+
+        # lookbacks can't reach further back than the window, so everything before it can be written
+        if len(output) >= chunk_size + window_size:
+            to_flush = len(output) - window_size
+            out_file.write(output[:to_flush])
+            del output[:to_flush]
+            flushed += to_flush
+
+    out_file.write(output)
+    return flushed + len(output)
+
 
 def compress(in_buffer: bytes, lookback_size=LZ11_BITS_PER_LOOKBACK, repetition_size=LZ11_BITS_PER_REPETITION) -> bytes:
     # bytes are immutable, no need to copy
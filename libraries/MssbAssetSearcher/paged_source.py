@@ -0,0 +1,85 @@
+from abc import (ABC, abstractmethod)
+from collections import OrderedDict
+from .helper_filesystem import FILE_CACHE
+from .lzss import StreamingDecompressor
+
+class PagedSource(ABC):
+    """Random access reads over something big, only keeping a few recently used pages around"""
+    PAGE_SIZE = 0x1000
+
+    def __init__(self, size:int, cached_pages:int=32) -> None:
+        self.size = size
+        self.cached_pages = cached_pages
+        self.__pages:OrderedDict[int, bytes] = OrderedDict()
+
+    @abstractmethod
+    def _read_range(self, offset:int, size:int) -> bytes:
+        pass
+
+    def __get_page(self, page_index:int) -> bytes:
+        page = self.__pages.get(page_index)
+        if page is None:
+            offset = page_index * self.PAGE_SIZE
+            page = bytes(self._read_range(offset, min(self.PAGE_SIZE, self.size - offset)))
+            self.__pages[page_index] = page
+            if len(self.__pages) > self.cached_pages:
+                self.__pages.popitem(last=False)
+        else:
+            self.__pages.move_to_end(page_index)
+        return page
+
+    def read(self, offset:int, size:int) -> bytes:
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return b""
+
+        first_page = offset // self.PAGE_SIZE
+        last_page = (end - 1) // self.PAGE_SIZE
+        out = b"".join(self.__get_page(i) for i in range(first_page, last_page + 1))
+
+        start_in_page = offset - first_page * self.PAGE_SIZE
+        return out[start_in_page : start_in_page + (end - offset)]
+
+    def close(self):
+        self.__pages.clear()
+
+class MappedFileSource(PagedSource):
+    def __init__(self, path:str, offset:int=0, size:int=None) -> None:
+        self.mapping = FILE_CACHE.get_file_mapping(path)
+        self.offset = offset
+        if size is None:
+            size = len(self.mapping) - offset
+        super().__init__(size)
+
+    def _read_range(self, offset:int, size:int) -> bytes:
+        return self.mapping[self.offset + offset : self.offset + offset + size]
+
+    def close(self):
+        super().close()
+        self.mapping.close()
+
+def part_source(path:str, part:dict) -> MappedFileSource:
+    # one sub-file of an extracted file, from its "Parts" entry, reads never leave the part
+    return MappedFileSource(path, part["offset"], part["size"])
+
+class CompressedEntrySource(PagedSource):
+    """An entry read straight out of its archive, decompressed only as far as has been looked at"""
+    def __init__(self, archive_path:str, disk_location:int, original_size:int, compression_flag:int, lookback_bit:int, repetition_bit:int) -> None:
+        self.mapping = FILE_CACHE.get_file_mapping(archive_path)
+        self.disk_location = disk_location
+        self.decompressor = None
+        if compression_flag == 4:
+            self.decompressor = StreamingDecompressor(self.mapping, disk_location, original_size, lookback_bit, repetition_bit)
+        super().__init__(original_size)
+
+    def from_dict(d:dict):
+        return CompressedEntrySource(d["Input"], d["offset"], d["original_size"], d["compression_flag"], d["lookback_bit"], d["repetition_bit"])
+
+    def _read_range(self, offset:int, size:int) -> bytes:
+        if self.decompressor is None:
+            return self.mapping[self.disk_location + offset : self.disk_location + offset + size]
+        return self.decompressor.decompress_until(offset + size)[offset : offset + size]
+
+    def close(self):
+        super().close()
+        self.mapping.close()
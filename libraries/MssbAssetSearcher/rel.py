@@ -0,0 +1,64 @@
+import struct
+
+# decompressed rel module header, only the fields needed to find its sections
+REL_HEADER_SIZE = 0x40
+REL_SECTION_INFO_SIZE = 8
+# most rels have well under this, anything bigger is something else
+MAX_REL_SECTIONS = 0x40
+# low bit of a section's offset marks it as code
+REL_SECTION_EXECUTABLE = 1
+
+class RelSection:
+    def __init__(self, index:int, offset:int, size:int, executable:bool) -> None:
+        self.index = index
+        self.name = f"section{index}"
+        self.offset = offset
+        self.size = size
+        self.executable = executable
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    def __contains__(self, file_offset:int) -> bool:
+        return self.offset <= file_offset < self.end
+
+    def address_of(self, file_offset:int) -> int:
+        # rels get relocated when they're loaded, so the offset into the section is the only stable address
+        return file_offset - self.offset
+
+    def __repr__(self) -> str:
+        return f"{self.name} {self.offset:08x}-{self.end:08x}{' code' if self.executable else ''}"
+
+class RelHeader:
+    def __init__(self, b:bytes) -> None:
+        if len(b) < REL_HEADER_SIZE:
+            raise ValueError("too small to be a rel")
+
+        (self.module_id, _, _, section_count, section_info_offset, _, _, self.version,
+            self.bss_size) = struct.unpack_from(">9I", b, 0)
+        if not (0 < section_count <= MAX_REL_SECTIONS) or section_info_offset + section_count * REL_SECTION_INFO_SIZE > len(b):
+            raise ValueError("section table isn't inside the file")
+
+        self.sections:list[RelSection] = []
+        for i in range(section_count):
+            offset, size = struct.unpack_from(">II", b, section_info_offset + i * REL_SECTION_INFO_SIZE)
+            executable = bool(offset & REL_SECTION_EXECUTABLE)
+            offset &= ~REL_SECTION_EXECUTABLE
+            # empty entries, and bss which has a size but nothing in the file
+            if offset == 0 or size == 0:
+                continue
+            if offset + size > len(b):
+                raise ValueError(f"section {i} isn't inside the file")
+            self.sections.append(RelSection(i, offset, size, executable))
+
+    @property
+    def data_sections(self) -> list[RelSection]:
+        return [x for x in self.sections if not x.executable]
+
+def read_rel_header(b:bytes) -> RelHeader:
+    # None if it doesn't look like a rel, so callers can fall back to searching the whole thing
+    try:
+        return RelHeader(b)
+    except (ValueError, struct.error):
+        return None
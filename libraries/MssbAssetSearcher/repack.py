@@ -0,0 +1,226 @@
+from __future__ import annotations
+import json
+import shutil
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from os.path import basename
+from .helper_filesystem import (FilePaths, VERSION_PATHS, FILE_CACHE, FOUND_FILES, exists, ensure_dir, join, REFERENCED_OUTPUT, ADGC_OUTPUT, RAW_OUTPUT, REL_OUTPUT)
+from .lzss import compress, decompress
+from .search import DataEntry
+from .log_callback import MssbAssetLog
+
+SECTOR_SIZE = 0x800
+
+# only these categories have a DataEntry table pointing at them, so only they can be moved
+RELOCATABLE_OUTPUTS = (REFERENCED_OUTPUT, RAW_OUTPUT, REL_OUTPUT)
+
+class RepackException(Exception): pass
+
+def align_to_sector(size:int) -> int:
+    return size + (-size % SECTOR_SIZE)
+
+def encode_entry(raw:bytes, compression_flag:int, lookback:int, repetition:int) -> bytes:
+    if compression_flag == 4:
+        return compress(raw, lookback, repetition)
+    return raw
+
+def encode_entries(jobs:list[tuple[bytes, int, int, int]], max_workers=None) -> list[bytes]:
+    if len(jobs) <= 1:
+        return [encode_entry(*job) for job in jobs]
+
+    # compression is pure python, so spread it over processes instead of threads
+    with ProcessPoolExecutor(max_workers) as pool:
+        return list(pool.map(encode_entry, *zip(*jobs)))
+
+def entry_to_bytes(entry:DataEntry) -> bytes:
+    return DataEntry.COMPRESSION_CONSTRUCT.build(entry.to_dict())
+
+def moved_entry(entry:DataEntry, offset:int, original_size:int, compressed_size:int) -> DataEntry:
+    return DataEntry.from_dict(entry.to_dict() | {
+        "offset": offset,
+        "original_size": original_size,
+        "compressed_size": compressed_size,
+    })
+
+class ArchivePatch:
+    """Writes that turn a copy of an archive file into the repacked archive"""
+    def __init__(self, archive_size:int) -> None:
+        # anything that doesn't fit in its old spot goes after the last sector of the file
+        self.end = align_to_sector(archive_size)
+        self.writes:list[tuple[int, bytes]] = []
+
+    def place(self, entry:DataEntry, payload:bytes, relocatable:bool) -> int:
+        if relocatable and entry.disk_location % SECTOR_SIZE == 0:
+            # table referenced files own the rest of their sector
+            slot = entry.to_range()
+        else:
+            # AdGC hits come from a magic scan, the next one can start in the same sector
+            slot = range(entry.disk_location, entry.disk_location + entry.compressed_size)
+
+        if len(payload) <= len(slot):
+            # fits where the old data was, clear out whatever is left of the old data
+            self.writes.append((slot.start, payload + bytes(len(slot) - len(payload))))
+            return slot.start
+
+        if not relocatable:
+            raise RepackException(f"{entry.output_name} grew from 0x{len(slot):x} to 0x{len(payload):x} bytes, and nothing references it, so it can't be moved")
+
+        offset = self.end
+        padded = payload + bytes(-len(payload) % SECTOR_SIZE)
+        self.writes.append((offset, padded))
+        self.end += len(padded)
+        return offset
+
+    def write(self, source_path:str, out_path:str):
+        # let the os copy the untouched sectors, then only write the ones that changed
+        shutil.copyfile(source_path, out_path)
+        with open(out_path, "r+b") as f:
+            for offset, payload in sorted(self.writes):
+                f.seek(offset)
+                f.write(payload)
+
+class TablePatch:
+    """Old and new DataEntry bytes, applied to every table that could reference them"""
+    def __init__(self) -> None:
+        self.replacements:list[tuple[bytes, bytes]] = []
+
+    def add(self, old_entry:DataEntry, new_entry:DataEntry):
+        old_bytes = entry_to_bytes(old_entry)
+        new_bytes = entry_to_bytes(new_entry)
+        if old_bytes != new_bytes:
+            self.replacements.append((old_bytes, new_bytes))
+
+    def apply(self, table_bytes:bytes) -> tuple[bytes, int]:
+        patched_count = 0
+        for old_bytes, new_bytes in self.replacements:
+            patched_count += table_bytes.count(old_bytes)
+            # entries are all the same size, so no offsets in the table change
+            table_bytes = table_bytes.replace(old_bytes, new_bytes)
+        return table_bytes, patched_count
+
+def find_replacements(mod_folder:str, found_files:dict[str, list[dict]]) -> dict[tuple[str, str], str]:
+    # mod folders use the same layout as the extracted outputs: <category>/<name>/<name>
+    found = {}
+    for category, entries in found_files.items():
+        for d in entries:
+            path = join(mod_folder, category, d["Output"], d["Output"])
+            if exists(path):
+                found[(category, d["Output"])] = path
+    return found
+
+def repack_version(version_path:FilePaths, replacements:dict[tuple[str, str], str], log_callback:MssbAssetLog, output_folder:str=None, max_workers=None):
+    if output_folder is None:
+        output_folder = version_path.output_repacked
+
+    with open(version_path.found_files_path, "r") as f:
+        found_files:dict[str, list[dict]] = json.load(f)
+
+    entries = {
+        category: [DataEntry.from_dict(d) for d in dicts]
+        for category, dicts in found_files.items()
+    }
+
+    this_data = FILE_CACHE.get_file_bytes(version_path.data_path)
+    this_code = FILE_CACHE.get_file_bytes(version_path.code_path)
+    this_main = FILE_CACHE.get_file_bytes(version_path.main_path)
+
+    data_patch = ArchivePatch(len(this_data))
+    code_patch = ArchivePatch(len(this_code))
+    table_patch = TablePatch()
+
+    def read_replacement(category:str, entry:DataEntry) -> bytes:
+        with open(replacements[(category, entry.output_name)], "rb") as f:
+            return f.read()
+
+    def place(category:str, entry:DataEntry, raw:bytes, payload:bytes) -> DataEntry:
+        archive_patch = code_patch if entry.file == version_path.code_path else data_patch
+        offset = archive_patch.place(entry, payload, category in RELOCATABLE_OUTPUTS)
+        new_entry = moved_entry(entry, offset, len(raw), len(payload))
+
+        if category == ADGC_OUTPUT:
+            # AdGCForms keep their size in the 8 bytes before the magic, rather than in a table
+            header_offset = offset - len(b"AdGCForm") - 8
+            compression_info = struct.unpack_from('<I', this_data, header_offset + 4)[0]
+            header = struct.pack('<II', len(raw) | (entry.compression_flag << 28), compression_info)
+            archive_patch.writes.append((header_offset, header))
+        else:
+            table_patch.add(entry, new_entry)
+
+        return new_entry
+
+    # recompress everything that isn't a rel first, rels might need new tables written into them
+    changed = [
+        (category, i, entry)
+        for category, category_entries in entries.items()
+        if category != REL_OUTPUT
+        for i, entry in enumerate(category_entries)
+        if (category, entry.output_name) in replacements
+    ]
+    log_callback(f"Repacking {len(changed)} changed entries for {version_path.version}")
+
+    raws = [read_replacement(category, entry) for category, _, entry in changed]
+    payloads = encode_entries([
+        (raw, entry.compression_flag, entry.lookback_bit_size, entry.repetition_bit_size)
+        for raw, (_, _, entry) in zip(raws, changed)
+    ], max_workers)
+
+    for (category, i, entry), raw, payload in zip(changed, raws, payloads):
+        entries[category][i] = place(category, entry, raw, payload)
+
+    # rels hold some of the tables, so a rel changes if it was replaced or if one of its entries moved
+    changed_rels = []
+    for i, rel in enumerate(entries.get(REL_OUTPUT, [])):
+        replaced = (REL_OUTPUT, rel.output_name) in replacements
+        if replaced:
+            raw = read_replacement(REL_OUTPUT, rel)
+        else:
+            raw = decompress(this_code, rel.disk_location, rel.original_size, rel.lookback_bit_size, rel.repetition_bit_size)
+
+        # a replaced rel goes in whether or not it has any of the moved tables
+        patched_raw, patched_count = table_patch.apply(raw)
+        if replaced or patched_count > 0:
+            changed_rels.append((i, rel, patched_raw))
+
+    log_callback(f"Recompressing {len(changed_rels)} rels")
+    rel_payloads = encode_entries([
+        (raw, rel.compression_flag, rel.lookback_bit_size, rel.repetition_bit_size)
+        for _, rel, raw in changed_rels
+    ], max_workers)
+
+    for (i, rel, raw), payload in zip(changed_rels, rel_payloads):
+        entries[REL_OUTPUT][i] = place(REL_OUTPUT, rel, raw, payload)
+
+    patched_main, patched_count = table_patch.apply(this_main)
+    log_callback(f"Patched {patched_count} entries in {basename(version_path.main_path)}")
+
+    ensure_dir(output_folder)
+    data_patch.write(version_path.data_path, join(output_folder, basename(version_path.data_path)))
+    code_patch.write(version_path.code_path, join(output_folder, basename(version_path.code_path)))
+    with open(join(output_folder, basename(version_path.main_path)), "wb") as f:
+        f.write(patched_main)
+
+    with open(join(output_folder, FOUND_FILES), "w") as f:
+        json.dump({
+            category: [x.to_dict() for x in category_entries]
+            for category, category_entries in entries.items()
+        }, f)
+
+    log_callback.finish()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Rebuild a version's archives with modified assets")
+    parser.add_argument("version", choices=list(VERSION_PATHS.keys()))
+    parser.add_argument("mod_folder", help="folder laid out like the extracted outputs, containing only the changed files")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    version_path = VERSION_PATHS[args.version]
+    with open(version_path.found_files_path, "r") as f:
+        found_files = json.load(f)
+
+    repack_version(version_path, find_replacements(args.mod_folder, found_files), MssbAssetLog(), args.output, args.workers)
+
+if __name__ == "__main__":
+    main()
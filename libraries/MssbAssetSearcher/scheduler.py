@@ -0,0 +1,123 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from os.path import (getsize, realpath)
+from concurrent.futures import (ProcessPoolExecutor, wait, FIRST_COMPLETED)
+from .helper_filesystem import FilePaths
+from .log_callback import (MssbAssetLog, FRAME_RATE)
+from .search import search_game
+
+HASH_CHUNK_SIZE = 0x100000
+
+def dump_inputs(version_path:FilePaths) -> list[str]:
+    return [version_path.data_path, version_path.code_path, version_path.main_path]
+
+def dump_size(version_path:FilePaths) -> int:
+    return sum(getsize(x) for x in dump_inputs(version_path))
+
+class InputHashCache:
+    """Content hash of each input file, only worked out once per file however many dumps list it"""
+    def __init__(self) -> None:
+        self.hashes:dict[tuple, str] = {}
+
+    def __getitem__(self, path:str) -> str:
+        stat = os.stat(path)
+        key = (realpath(path), stat.st_size, stat.st_mtime_ns)
+        if key not in self.hashes:
+            sha = hashlib.sha1()
+            with open(path, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    sha.update(chunk)
+            self.hashes[key] = sha.hexdigest()
+        return self.hashes[key]
+
+def run_dump(version_path:FilePaths, log_callback:MssbAssetLog, stop_event, profiler:str=None, max_memory:int=None, index_parts:bool=False, inner_workers:int=None) -> str:
+    # runs in a worker, log_callback is from for_worker so its lines show up on the scheduler's log
+    search_game(version_path, log_callback, stop_event.is_set, profiler, max_memory, index_parts, inner_workers)
+    return version_path.version
+
+def link_or_copy(source:str, target:str):
+    # outputs of identical dumps are identical, so share the files where the filesystem lets us
+    if os.path.exists(target):
+        # could itself be a link from an earlier copy, copying over it would change the source too
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def copy_dump_outputs(source:FilePaths, target:FilePaths):
+    # the outputs of a dump with the same inputs, with the inputs swapped for this dump's own
+    shutil.copytree(source.output_folder, target.output_folder, copy_function=link_or_copy, dirs_exist_ok=True)
+
+    with open(target.found_files_path, "r") as f:
+        found_files:dict[str, list[dict]] = json.load(f)
+    renamed = dict(zip(dump_inputs(source), dump_inputs(target)))
+    for entries in found_files.values():
+        for entry in entries:
+            entry["Input"] = renamed.get(entry["Input"], entry["Input"])
+            entry["ReferencedBy"] = renamed.get(entry.get("ReferencedBy"), entry.get("ReferencedBy"))
+
+    # probably a link to the source's manifest, so it has to be a new file rather than written over
+    os.remove(target.found_files_path)
+    with open(target.found_files_path, "w") as f:
+        json.dump(found_files, f)
+
+def schedule_dumps(version_paths:list[FilePaths], log_callback:MssbAssetLog, stopExtracting, profiler:str=None, max_memory:int=None, index_parts:bool=False, max_workers:int=None):
+    # search_game for every dump, a few at a time on a pool of processes
+    hashes = InputHashCache()
+
+    # dumps with exactly the same inputs are only searched once, the others get copies of its outputs
+    groups:dict[tuple, list[FilePaths]] = {}
+    for version_path in version_paths:
+        groups.setdefault(tuple(hashes[x] for x in dump_inputs(version_path)), []).append(version_path)
+
+    # biggest first, so the end of the run isn't one big dump on its own
+    ordered = sorted(groups.values(), key=lambda x: dump_size(x[0]), reverse=True)
+    max_workers = max_workers or os.cpu_count()
+    # each dump's own pools (rels, AdGC, classification) share what's left, so it's about cpu_count processes in all
+    inner_workers = max(1, os.cpu_count() // max_workers)
+    log_callback(f"Searching {len(ordered)} dumps on {max_workers} workers with {inner_workers} each, {len(version_paths) - len(ordered)} identical to another dump")
+    log_callback.set_max_iters(len(version_paths))
+    log_callback.update_iters(0)
+
+    # the progress bar is the scheduler's, the workers only send their log lines
+    worker_log = log_callback.for_worker(progress=False)
+    done = 0
+    with multiprocessing.Manager() as manager:
+        stop_event = manager.Event()
+
+        with ProcessPoolExecutor(max_workers) as pool:
+            futures = {
+                pool.submit(run_dump, group[0], worker_log, stop_event, profiler, max_memory, index_parts, inner_workers): group
+                for group in ordered
+            }
+            pending = set(futures)
+            while pending:
+                finished, pending = wait(pending, timeout=1 / FRAME_RATE, return_when=FIRST_COMPLETED)
+
+                if stopExtracting() and not stop_event.is_set():
+                    # running dumps stop at their next check, ones that haven't started never do
+                    stop_event.set()
+                    for future in pending:
+                        future.cancel()
+
+                for future in finished:
+                    group = futures[future]
+                    if future.cancelled():
+                        continue
+                    if future.exception() is not None:
+                        log_callback(f"{group[0].version} failed: {future.exception()!r}")
+                        continue
+
+                    for duplicate in group[1:]:
+                        if group[0].extracted():
+                            copy_dump_outputs(group[0], duplicate)
+                            log_callback(f"{duplicate.version} is the same as {group[0].version}, copied its outputs")
+                    done += len(group)
+                    log_callback.update_label(f"Searched {done}/{len(version_paths)} dumps")
+                    log_callback.update_iters(done)
+
+    log_callback.finish()
@@ -1,11 +1,26 @@
 from __future__ import annotations
 import json
+import hashlib
 import json.encoder
-from .helper_filesystem import (FilePaths, VERSION_PATHS, exists, ensure_dir, join, FILE_CACHE, REFERENCED_OUTPUT, ADGC_OUTPUT, UNREFERENCED_CMPR_OUTPUT, RAW_OUTPUT, REL_OUTPUT)
+import mmap
+import sqlite3
+import struct
+import tracemalloc
+from os import remove
+from os.path import dirname
+from .helper_filesystem import (FilePaths, VERSION_PATHS, exists, ensure_dir, join, get_part_ranges, FILE_CACHE, REFERENCED_OUTPUT, ADGC_OUTPUT, UNREFERENCED_CMPR_OUTPUT, RAW_OUTPUT, REL_OUTPUT)
 import construct as cs
-from .lzss import (get_compressed_size, get_decompressed_size, test_decompress, decompress, BitBufferReadException, IllegalDecompressionSequenceException, LZ11_BITS_PER_LOOKBACK, LZ11_BITS_PER_REPETITION)
+from .lzss import (get_compressed_size, get_decompressed_size, test_decompress, decompress, decompress_to_file, BitBufferReadException, IllegalDecompressionSequenceException, LZ11_BITS_PER_LOOKBACK, LZ11_BITS_PER_REPETITION)
 from .MultipleRanges import MultipleRanges
 from .log_callback import MssbAssetLog
+from .search_report import SearchReport
+from .classify import (classify_files, ADGC_MAGIC)
+from .dol import (DolSection, read_dol_header)
+from .rel import read_rel_header
+from .journal import ExtractionJournal
+from .index_db import update_index
+from concurrent.futures import (ProcessPoolExecutor, as_completed)
+from contextlib import closing
 
 
 class DataEntry():
@@ -23,9 +38,23 @@ class DataEntry():
 
     def __init__(self, b: type[bytes | dict], offset:int=0, file="") -> None:
         output_name = None
+        extracted = False
+        asset_type = None
+        sections = []
+        reference = None
+        reference_section = None
+        referenced_by = None
+        parts = []
         if isinstance(b, dict):
             output_name = b.get("Output", None)
             file = b.get("Input")
+            extracted = b.get("Extracted", False)
+            asset_type = b.get("AssetType", None)
+            sections = b.get("Sections", [])
+            reference = b.get("Reference", None)
+            reference_section = b.get("ReferenceSection", None)
+            referenced_by = b.get("ReferencedBy", None)
+            parts = b.get("Parts", [])
             b = self.COMPRESSION_CONSTRUCT.build(b) # kinda unneccessary, but whatever
             # makes it easy to parse
         parsed = self.COMPRESSION_CONSTRUCT.parse(b[offset : offset + self.SIZE])
@@ -37,6 +66,18 @@ class DataEntry():
         self.disk_location = parsed.offset
         self.compressed_size = parsed.compressed_size
         self.file = file
+        # set once the entry has been written to the outputs
+        self.extracted = extracted
+        # filled in by the classifier once the entry has been extracted
+        self.asset_type = asset_type
+        self.sections = sections
+        # where the table entry that pointed at this file was found, when it was found in a dol or rel section:
+        # the file (main, or a rel's output name), the section, and its game memory address (for rels, offset into the section)
+        self.referenced_by = referenced_by
+        self.reference_section = reference_section
+        self.reference = reference
+        # offset, size and hash of each sub-file in the file's offset table, only filled in when parts are indexed
+        self.parts = parts
         if output_name != None:
             self.output_name = output_name
         else:
@@ -80,7 +121,14 @@ class DataEntry():
             "offset": self.disk_location,
             "compressed_size": self.compressed_size,
             "compression_flag": self.compression_flag,
-            "footerSize": self.footer_size
+            "footerSize": self.footer_size,
+            "Extracted": self.extracted,
+            "AssetType": self.asset_type,
+            "Sections": self.sections,
+            "Reference": self.reference,
+            "ReferenceSection": self.reference_section,
+            "ReferencedBy": self.referenced_by,
+            "Parts": self.parts,
         }
 
     def from_dict(d:dict) -> DataEntry:
@@ -112,95 +160,86 @@ class DataEntry():
 class FingerPrintSearcher:
     USABLE_CMPR_CONSTANTS = ((11, 4), (0xe, 5))
 
-    def search_all_compressions(self, data:bytes, asset_file_name:str) -> set[DataEntry]:
+    def __init__(self, report:SearchReport=None) -> None:
+        self.report = report if report is not None else SearchReport()
+
+    def search_all_compressions(self, data:bytes, asset_file_name:str, sections:list[DolSection]=None) -> set[DataEntry]:
+        # with sections, only those parts of data are searched, otherwise all of it
         s = set()
-        for lookback, repetition in self.USABLE_CMPR_CONSTANTS:
-            s.update(self.search_compression(data, lookback, repetition, asset_file_name))
+        for section in ([None] if sections is None else sections):
+            self.report.scanned(len(data) if section is None else section.size)
+            for lookback, repetition in self.USABLE_CMPR_CONSTANTS:
+                s.update(self.search_compression(data, lookback, repetition, asset_file_name, section))
         return s
 
-    def search_compression(self, data:bytes, lookback:int, repetitions:int, asset_file_name:str) -> set[DataEntry]:
+    def search_compression(self, data:bytes, lookback:int, repetitions:int, asset_file_name:str, section:DolSection=None) -> set[DataEntry]:
         to_find = bytes([0, 0, repetitions, lookback])
         fingerprint_size = len(to_find)
-        data_size = len(data)
+        begin_index, data_size = (0, len(data)) if section is None else (section.offset, section.end)
 
         found = set()
-        begin_index = 0
-        ind = data.find(to_find, begin_index)
+        ind = data.find(to_find, begin_index, data_size)
         while ind > 0 and ind + DataEntry.SIZE <= data_size:
             entry = DataEntry(data, ind, asset_file_name)
+            if section is not None:
+                entry.reference = section.address_of(ind)
+                entry.reference_section = section.name
             # for now it has to be a mult of 2048 bytes, and not 0
-            if entry.disk_location % 0x800 == 0 and entry.disk_location != 0 and entry.compression_flag == 4:
+            if self.report.probe(entry.disk_location % 0x800 == 0 and entry.disk_location != 0 and entry.compression_flag == 4):
                 found.add(entry)
 
             # increment to found index + 4 (compression fingerprintSize)
             # could be 16 (size of DataEntry) if found, but its best to get lots of data, and test each one
             begin_index = ind + fingerprint_size
 
-            ind = data.find(to_find, begin_index)
+            ind = data.find(to_find, begin_index, data_size)
+
+        return found
 
+    def search_uncompressed(self, data:bytes, asset_file_name:str, sections:list[DolSection]=None) -> set[DataEntry]:
+        found = set()
+        for section in ([None] if sections is None else sections):
+            found.update(self.search_uncompressed_section(data, asset_file_name, section))
         return found
 
-    def search_uncompressed(self, data:bytes, asset_file_name:str) -> set[DataEntry]:
+    def search_uncompressed_section(self, data:bytes, asset_file_name:str, section:DolSection=None) -> set[DataEntry]:
         epsilon = 3
         to_find = (0).to_bytes(4, 'big')
-        data_size = len(data)
+        begin_index, data_size = (0, len(data)) if section is None else (section.offset, section.end)
 
         found = set()
-        begin_index = 0
-        ind = data.find(to_find, begin_index)
+        self.report.scanned(data_size - begin_index)
+        ind = data.find(to_find, begin_index, data_size)
         while ind > 0 and ind + DataEntry.SIZE <= data_size:
             entry = DataEntry(data, ind, asset_file_name)
+            if section is not None:
+                entry.reference = section.address_of(ind)
+                entry.reference_section = section.name
             # for now it has to be a mult of 2048 bytes, not 0, and no compression flag
-            if (entry.compression_flag == 0 and entry.disk_location % 0x800 == 0 and entry.disk_location != 0 and
+            if self.report.probe(entry.compression_flag == 0 and entry.disk_location % 0x800 == 0 and entry.disk_location != 0 and
                 # compressed size and entry size should be close to same size, but not 0
                 entry.compressed_size > 0 and entry.original_size > 0 and abs(entry.compressed_size - entry.original_size) <= epsilon):
                 found.add(entry)
 
             begin_index = ind + 1
-            ind = data.find(to_find, begin_index)
+            ind = data.find(to_find, begin_index, data_size)
         return found
 
-    def search_adgc(self, data:bytes, asset_file_name:str) -> set[DataEntry]:
-        to_find = b"AdGCForm"
-        data_size = len(data)
-        import struct
+    def search_adgc(self, data:bytes, asset_file_name:str, max_workers=None) -> set[DataEntry]:
+        self.report.scanned(len(data))
+        shards = adgc_shards(len(data))
+        if len(shards) == 1:
+            results = [find_adgc_entries(data, 0, len(data), asset_file_name)]
+        else:
+            # asset_file_name is the data file, each worker maps it rather than having it pickled over
+            with ProcessPoolExecutor(max_workers) as pool:
+                results = list(pool.map(search_adgc_shard, [asset_file_name] * len(shards), *zip(*shards), [asset_file_name] * len(shards)))
 
+        # map keeps the shard order, so the merged hits are the same however many workers there were
         found = set()
-        begin_index = 0
-        ind = data.find(to_find, begin_index)
-        while ind > 0 and ind + DataEntry.SIZE <= data_size:
-            compression_beginning = ind + len(b"AdGCForm")
-            finger_print = data[ind-8:ind]
-
-            original_size, compression_info = struct.unpack('<II', finger_print)
-            compressed_flag = original_size >> 28
-            original_size &= 0xfffffff
-
-            if compressed_flag == 0:
-                lookback_bit = 0
-                repetition_bit = 0
-                compressed_size = original_size
-            else:
-                lookback_bit = compression_info & 0xff
-                repetition_bit = (compression_info >> 8) & 0xff
-
-                compressed_size = get_compressed_size(data, compression_beginning, original_size, lookback_bit, repetition_bit)
-
-            entry = DataEntry.from_dict({
-                "Input": asset_file_name,
-                "Output":  f"AdGCForm {lookback_bit:02x}{repetition_bit:02x} {compression_beginning:08x}.dat",
-                "lookback_bit" : lookback_bit,
-                "repetition_bit": repetition_bit,
-                "original_size" : original_size,
-                "offset" : compression_beginning,
-                "compressed_size" : compressed_size,
-                "compression_flag" : compressed_flag
-            })
-
-            found.add(entry)
-
-            begin_index = ind + 1
-            ind = data.find(to_find, begin_index)
+        for entries, probes_attempted, probes_passed in results:
+            found.update(DataEntry.from_dict(x) for x in entries)
+            self.report.probes(probes_attempted, probes_passed)
         return found
 
     def get_code_files(self, data:bytes, found_main_compressions:set[DataEntry], code_file_name:str) -> set[DataEntry]:
@@ -210,11 +249,12 @@ class FingerPrintSearcher:
         lookback = 11
         repetition = 4
 
+        self.report.scanned(len(data))
         found_code_decompressions = [
             offset
             for offset
             in range(0, len(data), 0x800)
-            if test_decompress(data, offset, minimum_bytes_to_decompress, lookback, repetition)
+            if self.report.probe(test_decompress(data, offset, minimum_bytes_to_decompress, lookback, repetition))
         ]
 
         for this_offset in found_code_decompressions:
@@ -269,7 +309,134 @@ class FingerPrintSearcher:
         return set(out)
 
 
-def populate_outputs(log_callback:MssbAssetLog, skip_if_extracted, stopExtracting):
+# shards of the data file for the AdGC scan, each worker still sees the whole file,
+# so a compressed stream running past the end of its shard is sized the same as before
+ADGC_SHARD_SIZE = 0x2000000
+
+# in the order search_game runs them, each one's entries are checkpointed in the journal once it finishes
+SEARCH_PHASES = ["fingerprint search", "rel discovery", "AdGC search", "rel fingerprint search", "missing ranges"]
+
+def adgc_shards(data_size:int) -> list[tuple[int, int]]:
+    return [(start, min(start + ADGC_SHARD_SIZE, data_size)) for start in range(0, max(data_size, 1), ADGC_SHARD_SIZE)]
+
+def find_adgc_entries(data:bytes, start:int, end:int, asset_file_name:str) -> tuple[list[dict], int, int]:
+    # every AdGCForm magic starting in [start, end), as DataEntry dicts, with the probe counts from sizing them
+    data_size = len(data)
+    finger_print_size = 8
+
+    # find every hit first, then size them all in one go
+    hits = []
+    ind = data.find(ADGC_MAGIC, max(start, finger_print_size), end + len(ADGC_MAGIC) - 1)
+    while ind != -1 and ind + DataEntry.SIZE <= data_size:
+        hits.append(ind)
+        ind = data.find(ADGC_MAGIC, ind + 1, end + len(ADGC_MAGIC) - 1)
+
+    found = []
+    probes_attempted = probes_passed = 0
+    for ind in hits:
+        compression_beginning = ind + len(ADGC_MAGIC)
+        original_size, compression_info = struct.unpack_from('<II', data, ind - finger_print_size)
+        compressed_flag = original_size >> 28
+        original_size &= 0xfffffff
+
+        if compressed_flag == 0:
+            lookback_bit = 0
+            repetition_bit = 0
+            compressed_size = original_size
+        else:
+            lookback_bit = compression_info & 0xff
+            repetition_bit = (compression_info >> 8) & 0xff
+
+            compressed_size = get_compressed_size(data, compression_beginning, original_size, lookback_bit, repetition_bit)
+            # get_compressed_size gives back where the stream ended, not how long it was
+            probes_attempted += 1
+            if compressed_size != -1:
+                probes_passed += 1
+                compressed_size -= compression_beginning
+
+        found.append({
+            "Input": asset_file_name,
+            "Output":  f"AdGCForm {lookback_bit:02x}{repetition_bit:02x} {compression_beginning:08x}.dat",
+            "lookback_bit" : lookback_bit,
+            "repetition_bit": repetition_bit,
+            "original_size" : original_size,
+            "offset" : compression_beginning,
+            "compressed_size" : compressed_size,
+            "compression_flag" : compressed_flag
+        })
+    return found, probes_attempted, probes_passed
+
+def search_adgc_shard(path:str, start:int, end:int, asset_file_name:str) -> tuple[list[dict], int, int]:
+    # runs in a worker
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return find_adgc_entries(data, start, end, asset_file_name)
+
+def index_file_parts(path:str) -> list[dict]:
+    # mapped, hashing a part only reads that part
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                return [
+                    {"offset": offset, "size": size, "hash": hashlib.sha1(view[offset : offset + size]).hexdigest()}
+                    for offset, size in get_part_ranges(data)
+                ]
+            finally:
+                view.release()
+
+def set_referenced_by(entries:set[DataEntry], referenced_by:str) -> set[DataEntry]:
+    for entry in entries:
+        entry.referenced_by = referenced_by
+    return entries
+
+def search_rel(code_path:str, data_path:str, rel_dict:dict) -> dict:
+    # runs in a worker, decompresses one rel out of the code file and searches its data sections for file tables
+    rel = DataEntry.from_dict(rel_dict)
+    with open(code_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as code:
+        decompressed = decompress(code, rel.disk_location, rel.original_size, rel.lookback_bit_size, rel.repetition_bit_size)
+
+    header = read_rel_header(decompressed)
+    # without a header, search all of it like before
+    sections = None if header is None else header.data_sections
+
+    report = SearchReport()
+    searcher = FingerPrintSearcher(report)
+    with report.span("rel") as span:
+        compressed = set_referenced_by(searcher.search_all_compressions(decompressed, data_path, sections), rel.output_name)
+        uncompressed = set_referenced_by(searcher.search_uncompressed(decompressed, data_path, sections), rel.output_name)
+
+    return {
+        "Rel": rel.output_name,
+        "Hash": hashlib.sha1(decompressed).hexdigest(),
+        "Sections": None if sections is None else [x.name for x in sections],
+        "Compressed": [x.to_dict() for x in compressed],
+        "Uncompressed": [x.to_dict() for x in uncompressed],
+        "DecompressedBytes": len(decompressed),
+        "BytesScanned": span.bytes_scanned,
+        "ProbesAttempted": span.probes_attempted,
+        "ProbesPassed": span.probes_passed,
+    }
+
+def search_rels(jobs:list[tuple], parallel=True, max_workers=None):
+    # search_rel for each (code_path, data_path, rel_dict), yields the results as they finish
+    if not parallel or len(jobs) <= 1:
+        # one at a time in this process, each rel is dropped before the next one is decompressed
+        for job in jobs:
+            yield search_rel(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers) as pool:
+        futures = [pool.submit(search_rel, *job) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # closed early when stopped, the rels that haven't started never do
+            pool.shutdown(cancel_futures=True)
+
+def populate_outputs(log_callback:MssbAssetLog, skip_if_extracted, stopExtracting, profiler:str=None, max_memory:int=None, index_parts:bool=False):
 
     for i, version_paths in enumerate(VERSION_PATHS.values()):
         if stopExtracting():
@@ -278,14 +445,18 @@ def populate_outputs(log_callback:MssbAssetLog, skip_if_extracted, stopExtractin
         if not version_paths.extracted() or skip_if_extracted:
             log_callback.update_iters(i)
             log_callback.update_label(f"Checking {version_paths.version} version...")
-            search_game(version_paths, log_callback, stopExtracting)
+            search_game(version_paths, log_callback, stopExtracting, profiler, max_memory, index_parts)
         else:
             log_callback(f"{version_paths.version} already extracted, skipping...")
 
     log_callback.finish()
 
 
-def look_for_missing_ranges(multiRange:MultipleRanges, data:bytes, data_file_name:str):
+def look_for_missing_ranges(multiRange:MultipleRanges, data:bytes, data_file_name:str, report:SearchReport=None):
+    if report is None:
+        report = SearchReport()
+    report.scanned(len(data))
+
     upper_segment_start = p = len(data)
     prev_p = p
     SEGMENT_SIZE = 0x800
@@ -331,7 +502,7 @@ def look_for_missing_ranges(multiRange:MultipleRanges, data:bytes, data_file_nam
         in_the_range_now = (p == upper_segment_start)
 
         # if ever we are in a section that is not in a range, look to decompress
-        if not in_the_range_now and test_decompress(data, p, min_bytes_to_decompress):
+        if not in_the_range_now and report.probe(test_decompress(data, p, min_bytes_to_decompress)):
             # we found a range that can be decompressed, assume it goes all the way to the end of this section
             out.append(DataEntry.from_dict({
                 "Input": data_file_name,
@@ -354,7 +525,35 @@ def look_for_missing_ranges(multiRange:MultipleRanges, data:bytes, data_file_nam
 
     return set(out)
 
-def search_game(version_path : FilePaths, log_callback: MssbAssetLog, stopExtracting):
+def extract_entry(data:bytes, entry:DataEntry, out_filename:str, chunk_size:int=None) -> bool:
+    # with a chunk size, the entry is streamed to disk instead of being built in memory first
+    try:
+        if chunk_size is None:
+            if entry.compression_flag == 4:
+                out_data = decompress(data, entry.disk_location, entry.original_size, entry.lookback_bit_size, entry.repetition_bit_size)
+            else:
+                out_data = data[entry.disk_location : entry.disk_location + entry.original_size]
+
+            ensure_dir(dirname(out_filename))
+            with open(out_filename, "wb") as f:
+                f.write(out_data)
+        else:
+            ensure_dir(dirname(out_filename))
+            with open(out_filename, "wb") as f:
+                if entry.compression_flag == 4:
+                    decompress_to_file(data, entry.disk_location, entry.original_size, f, entry.lookback_bit_size, entry.repetition_bit_size, chunk_size)
+                else:
+                    end = entry.disk_location + entry.original_size
+                    for start in range(entry.disk_location, end, chunk_size):
+                        f.write(data[start : min(start + chunk_size, end)])
+    except (BitBufferReadException, IllegalDecompressionSequenceException):
+        if exists(out_filename):
+            remove(out_filename)
+        return False
+
+    return True
+
+def search_game(version_path : FilePaths, log_callback: MssbAssetLog, stopExtracting, profiler:str=None, max_memory:int=None, index_parts:bool=False, max_workers:int=None):
     log_callback(version_path.version)
     if not version_path.valid():
         # we can't read the main/data/code, so we can't decompress them
@@ -363,8 +562,38 @@ def search_game(version_path : FilePaths, log_callback: MssbAssetLog, stopExtrac
 
     ensure_dir(version_path.output_folder)
 
+    report = SearchReport(version_path.version, profiler, version_path.output_profiles)
+    report.max_memory = max_memory
+    if max_memory is not None:
+        # tracemalloc only sees this process
+        report.peak_memory_scope = "this process only, the AdGC search and classification workers aren't counted"
+    # picks up a previous run that didn't finish, as long as the inputs haven't changed since
+    journal = ExtractionJournal(version_path.journal_path,
+        [version_path.data_path, version_path.code_path, version_path.main_path, version_path.known_files_path])
+    if max_memory is not None:
+        tracemalloc.start()
+    try:
+        _search_game(version_path, log_callback, stopExtracting, report, journal, max_memory, index_parts, max_workers)
+    finally:
+        journal.close()
+        if max_memory is not None:
+            report.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            log_callback(f"Peak memory {report.peak_memory / 2**20:.1f}MiB, budget {max_memory / 2**20:.1f}MiB")
+        # write whatever phases finished, even if we were stopped
+        report.write_json(version_path.search_report_path)
+
+def _search_game(version_path : FilePaths, log_callback: MssbAssetLog, stopExtracting, report: SearchReport, journal:ExtractionJournal, max_memory:int=None, index_parts:bool=False, max_workers:int=None):
+    # with a budget, the sources are mapped instead of read, and outputs are streamed out in chunks
+    if max_memory is None:
+        read_source = FILE_CACHE.get_file_bytes
+        chunk_size = None
+    else:
+        read_source = FILE_CACHE.get_file_mapping
+        chunk_size = min(max(max_memory // 16, 0x1000), 0x100000)
+
     cached_bytes = {
-        x: FILE_CACHE.get_file_bytes(x)
+        x: read_source(x)
         for x
         in [version_path.data_path, version_path.code_path, version_path.main_path]
     }
@@ -381,97 +610,207 @@ def search_game(version_path : FilePaths, log_callback: MssbAssetLog, stopExtrac
             known_files[int(d["Location"], 16)] = d["Name"]
 
     # search for decompression fingerprints
-    searcher = FingerPrintSearcher()
+    searcher = FingerPrintSearcher(report)
     found_compressed:set[DataEntry] = set()
     found_uncompressed:set[DataEntry] = set()
     found_rels:set[DataEntry] = set()
     found_adgc:set[DataEntry] = set()
     found_unreferenced:set[DataEntry] = set()
 
-    def update_findings_from_code(code_data:bytes, compressed_set:set[DataEntry], uncompressed_set:set[DataEntry]):
+    found_sets = {
+        REFERENCED_OUTPUT: found_compressed,
+        RAW_OUTPUT: found_uncompressed,
+        REL_OUTPUT: found_rels,
+        ADGC_OUTPUT: found_adgc,
+        UNREFERENCED_CMPR_OUTPUT: found_unreferenced,
+    }
+
+    # phases before the journal's last one are skipped, and its entries are put back as they were when it finished
+    def skip_phase(phase:str) -> bool:
+        return journal.last_phase is not None and SEARCH_PHASES.index(phase) <= SEARCH_PHASES.index(journal.last_phase)
+
+    if journal.last_phase is not None:
+        for category, entries in journal.phases[journal.last_phase].items():
+            found_sets[category].update(DataEntry.from_dict(x) for x in entries)
+        log_callback(f"Resuming {version_path.version} after {journal.last_phase}, {len(journal.outputs)} outputs already written")
+
+    def update_findings_from_code(code_data:bytes, compressed_set:set[DataEntry], uncompressed_set:set[DataEntry], sections:list[DolSection]=None):
         # work through main, find all compressed and uncompressed fingerprints
-        found = searcher.search_all_compressions(code_data, version_path.data_path)
+        found = searcher.search_all_compressions(code_data, version_path.data_path, sections)
         if len(found) > 0:
             log_callback("found fingerprints", len(found))
-        compressed_set.update(found)
+        compressed_set.update(set_referenced_by(found, version_path.main_path))
 
-        found = searcher.search_uncompressed(code_data, version_path.data_path)
-        uncompressed_set.update(found)
+        found = searcher.search_uncompressed(code_data, version_path.data_path, sections)
+        uncompressed_set.update(set_referenced_by(found, version_path.main_path))
         log_callback("found uncompressed", len(found))
 
-    update_findings_from_code(this_main, found_compressed, found_uncompressed)
+    # the file tables can only be in main's data sections, not its code or the padding between sections
+    main_header = read_dol_header(this_main)
+    if main_header is None:
+        log_callback("main doesn't have a dol header, searching all of it")
+    main_sections = None if main_header is None else main_header.data_sections
+
+    if not skip_phase("fingerprint search"):
+        with report.span("fingerprint search"):
+            update_findings_from_code(this_main, found_compressed, found_uncompressed, main_sections)
+        journal.complete_phase("fingerprint search", found_sets)
     if stopExtracting(): return
 
     # find the rels
-    found_rels.update(searcher.get_code_files(this_code, found_compressed, version_path.code_path))
+    if not skip_phase("rel discovery"):
+        with report.span("rel discovery"):
+            found_rels.update(searcher.get_code_files(this_code, found_compressed, version_path.code_path))
+        journal.complete_phase("rel discovery", found_sets)
     log_callback("Found rels", len(found_rels))
 
     # find any adgc files
-    found_adgc.update(searcher.search_adgc(this_data, version_path.data_path))
+    if not skip_phase("AdGC search"):
+        with report.span("AdGC search"):
+            found_adgc.update(searcher.search_adgc(this_data, version_path.data_path, max_workers))
+        journal.complete_phase("AdGC search", found_sets)
     log_callback("AdGC", len(found_adgc))
     if stopExtracting(): return
 
-    for rel in found_rels:
-        log_callback(f"{rel.disk_location:08x}")
-        decompressed_rel = decompress(this_code, rel.disk_location, rel.original_size, rel.lookback_bit_size, rel.repetition_bit_size)
-        update_findings_from_code(decompressed_rel, found_compressed, found_uncompressed)
-        if stopExtracting(): return
+    if not skip_phase("rel fingerprint search"):
+        with report.span("rel fingerprint search"):
+            # the same rel can be stored more than once, identical compressed bytes decompress to the same rel so only search one
+            unique_rels = {}
+            for rel in sorted(found_rels):
+                compressed = this_code[rel.disk_location : rel.disk_location + rel.compressed_size]
+                key = (rel.lookback_bit_size, rel.repetition_bit_size, rel.original_size, hashlib.sha1(compressed).hexdigest())
+                unique_rels.setdefault(key, rel)
+            log_callback(f"Searching {len(unique_rels)} rels, skipped {len(found_rels) - len(unique_rels)} duplicates")
+
+            results = []
+            jobs = [(version_path.code_path, version_path.data_path, rel.to_dict()) for rel in unique_rels.values()]
+            # with a budget they're searched one at a time here, so only one rel is ever decompressed and the peak memory counts it
+            with closing(search_rels(jobs, max_memory is None, max_workers)) as rel_results:
+                for result in rel_results:
+                    log_callback(result["Rel"], "all of it" if result["Sections"] is None else ", ".join(result["Sections"]))
+                    results.append(result)
+                    if stopExtracting():
+                        return
+
+            # merged in rel order, so the same entries win however the workers finished
+            seen_hashes = set()
+            for result in sorted(results, key=lambda x: x["Rel"]):
+                report.decompressed(result["DecompressedBytes"])
+                report.scanned(result["BytesScanned"])
+                report.probes(result["ProbesAttempted"], result["ProbesPassed"])
+                if result["Hash"] in seen_hashes:
+                    continue
+                seen_hashes.add(result["Hash"])
+
+                found_compressed.update(DataEntry.from_dict(x) for x in result["Compressed"])
+                found_uncompressed.update(DataEntry.from_dict(x) for x in result["Uncompressed"])
+                if len(result["Compressed"]) > 0:
+                    log_callback(f"{result['Rel']}: found fingerprints", len(result["Compressed"]))
+        journal.complete_phase("rel fingerprint search", found_sets)
 
     # found_unreferenced = searcher.find_unreferenced_compressed_files(this_data, found_compressed, version_path.data_path)
-    
-    multirange = MultipleRanges()
-    for collection in (found_compressed, found_uncompressed, found_adgc):
-        for entry in collection:
-            multirange.add_range(entry.to_range())
-    log_callback("looking for unreferenced files... (could take a minute)")
-    _found_unreferenced = look_for_missing_ranges(multirange, this_data, version_path.data_path)
-    log_callback("unreferenced", len(_found_unreferenced))
-    found_unreferenced.update(_found_unreferenced)
+
+    if not skip_phase("missing ranges"):
+        with report.span("missing ranges"):
+            multirange = MultipleRanges()
+            for collection in (found_compressed, found_uncompressed, found_adgc):
+                for entry in collection:
+                    multirange.add_range(entry.to_range())
+            log_callback("looking for unreferenced files... (could take a minute)")
+            found_unreferenced.update(look_for_missing_ranges(multirange, this_data, version_path.data_path, report))
+        journal.complete_phase("missing ranges", found_sets)
+    log_callback("unreferenced", len(found_unreferenced))
     if stopExtracting(): return
 
     # time to attempt some decompressions
     log_callback("Validating all compressions")
 
-    for folder, collection in [
-            (version_path.output_compressed_referenced, found_compressed),
-            (version_path.output_raw, found_uncompressed),
-            (version_path.output_rels, found_rels),
-            (version_path.output_adgc, found_adgc),
-            (version_path.output_compressed_unreferenced, found_unreferenced)
-        ]:
-        collection_copy = list(collection)
-        log_callback(f"Extracting {folder} files")
-        
-        log_callback.set_max_iters(len(collection_copy))
-        for i, entry in enumerate(collection_copy):
-            log_callback.update_label(f"Extracting {version_path.version} files... {i}/{len(collection_copy)}")
-            if stopExtracting(): return
-
-            entry:DataEntry
-            log_callback.update_iters(i)
-            data_to_extract = cached_bytes[entry.file]
-
-            if entry.original_size > 0:
-                if entry.compression_flag == 4:
-                    try:
-                        out_data = decompress(data_to_extract, entry.disk_location, entry.original_size, entry.lookback_bit_size, entry.repetition_bit_size)
-                    except (BitBufferReadException, IllegalDecompressionSequenceException):
+    output_collections = [
+        (REFERENCED_OUTPUT, version_path.output_compressed_referenced, found_compressed),
+        (RAW_OUTPUT, version_path.output_raw, found_uncompressed),
+        (REL_OUTPUT, version_path.output_rels, found_rels),
+        (ADGC_OUTPUT, version_path.output_adgc, found_adgc),
+        (UNREFERENCED_CMPR_OUTPUT, version_path.output_compressed_unreferenced, found_unreferenced),
+    ]
+
+    with report.span("extraction"):
+        for category, folder, collection in output_collections:
+            collection_copy = list(collection)
+            log_callback(f"Extracting {folder} files")
+
+            log_callback.set_max_iters(len(collection_copy))
+            for i, entry in enumerate(collection_copy):
+                log_callback.update_label(f"Extracting {version_path.version} files... {i}/{len(collection_copy)}")
+                if stopExtracting(): return
+
+                entry:DataEntry
+                log_callback.update_iters(i)
+                data_to_extract = cached_bytes[entry.file]
+
+                if entry.original_size > 0:
+                    # already done by the run being resumed, as long as what it wrote is still there
+                    key = ExtractionJournal.output_key(category, entry)
+                    if key in journal.outputs:
+                        output_name = journal.outputs[key]
+                        if output_name is None:
+                            collection.remove(entry)
+                            continue
+                        if exists(join(folder, output_name, output_name)):
+                            entry.output_name = output_name
+                            entry.extracted = True
+                            continue
+
+                    # rename based on known file names
+                    if entry.file != version_path.code_path and entry.disk_location in known_files:
+                        entry.output_name = known_files[entry.disk_location]
+
+                    out_filename = join(folder, entry.output_name, entry.output_name)
+
+                    if not report.probe(extract_entry(data_to_extract, entry, out_filename, chunk_size)):
+                        journal.record_output(key, None)
                         collection.remove(entry)
                         continue
-                else:
-                    out_data = data_to_extract[entry.disk_location : entry.disk_location + entry.original_size]
-                
-                # rename based on known file names
-                if entry.file != version_path.code_path and entry.disk_location in known_files:
-                    entry.output_name = known_files[entry.disk_location]
-
-                this_output_folder = join(folder, entry.output_name)
-                ensure_dir(this_output_folder)
-                out_filename = join(this_output_folder, entry.output_name)
 
-                with open(out_filename, "wb") as f:
-                    f.write(out_data)
+                    journal.record_output(key, entry.output_name)
+                    entry.extracted = True
+                    report.scanned(entry.compressed_size)
+                    if entry.compression_flag == 4:
+                        report.decompressed(entry.original_size)
+
+    # byte level checks on everything that was written out, spread over processes
+    with report.span("classification"):
+        to_classify = [
+            (entry, join(folder, entry.output_name, entry.output_name), category)
+            for category, folder, collection in output_collections
+            for entry in collection
+            if entry.extracted
+        ]
+        log_callback(f"Classifying {len(to_classify)} files")
+        results = classify_files([(path, category) for _, path, category in to_classify], max_workers)
+        for (entry, _, _), (asset_type, sections) in zip(to_classify, results):
+            entry.asset_type = asset_type
+            entry.sections = [{"type": t, "offset": offset} for t, offset in sections]
+    if stopExtracting(): return
 
+    if index_parts:
+        with report.span("part indexing"):
+            parts_index = {}
+            for category, folder, collection in output_collections:
+                for entry in sorted(collection):
+                    if not entry.extracted:
+                        continue
+                    entry.parts = index_file_parts(join(folder, entry.output_name, entry.output_name))
+                    report.scanned(sum(x["size"] for x in entry.parts))
+                    for part in entry.parts:
+                        # the same part in several files is only listed once, with everywhere it shows up
+                        parts_index.setdefault(part["hash"], {"size": part["size"], "locations": []})["locations"].append(
+                            {"category": category, "Output": entry.output_name, "offset": part["offset"]})
+
+            with open(version_path.parts_index_path, "w") as f:
+                json.dump(parts_index, f)
+            part_count = sum(len(x["locations"]) for x in parts_index.values())
+            log_callback(f"Indexed {part_count} parts, {len(parts_index)} unique")
+        if stopExtracting(): return
 
     def to_dict_list(data_entries: set[DataEntry]):
         return [
@@ -490,6 +829,13 @@ def search_game(version_path : FilePaths, log_callback: MssbAssetLog, stopExtrac
     ensure_dir(version_path.output_folder)
     with open(version_path.found_files_path, "w") as f:
         json.dump(out_json, f)
+    journal.finish()
+
+    try:
+        log_callback(f"Indexed {update_index(version_path)} entries")
+    except sqlite3.Error as e:
+        # the found files are what matters, the index gets rebuilt from them next time it's opened
+        log_callback(f"Couldn't update the index: {e}")
 
     # search for uncompressed fingerprints
-    # verify all fingerprints
\ No newline at end of file
+    # verify all fingerprints
@@ -0,0 +1,129 @@
+import json
+import time
+from contextlib import contextmanager
+from .helper_filesystem import (ensure_dir, join)
+
+class PhaseSpan:
+    def __init__(self, name:str) -> None:
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.bytes_scanned = 0
+        self.probes_attempted = 0
+        self.probes_passed = 0
+        self.decompressed_bytes = 0
+
+    def probe(self, passed:bool) -> bool:
+        # returns what it was given, so it can wrap a condition in place
+        self.probes_attempted += 1
+        if passed:
+            self.probes_passed += 1
+        return passed
+
+    @property
+    def decompressed_bytes_per_second(self) -> float:
+        if self.wall_time == 0:
+            return 0.0
+        return self.decompressed_bytes / self.wall_time
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "bytes_scanned": self.bytes_scanned,
+            "probes_attempted": self.probes_attempted,
+            "probes_passed": self.probes_passed,
+            "decompressed_bytes": self.decompressed_bytes,
+            "decompressed_bytes_per_second": self.decompressed_bytes_per_second,
+        }
+
+class SearchReport:
+    PROFILERS = ("cprofile", "pyinstrument")
+
+    def __init__(self, version:str="", profiler:str=None, profile_folder:str=None) -> None:
+        assert profiler in (None, *self.PROFILERS), f"unknown profiler {profiler}"
+        self.version = version
+        self.profiler = profiler
+        self.profile_folder = profile_folder
+        self.spans:list[PhaseSpan] = []
+        # only measured when running with a memory budget
+        self.max_memory:int = None
+        self.peak_memory:int = None
+        # which processes peak_memory covers
+        self.peak_memory_scope:str = None
+        # anything probed outside of a phase lands here, and doesn't get reported
+        self.current = PhaseSpan("")
+
+    @contextmanager
+    def span(self, name:str):
+        this_span = PhaseSpan(name)
+        self.spans.append(this_span)
+        previous_span, self.current = self.current, this_span
+
+        profiler = self.__start_profiler()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield this_span
+        finally:
+            this_span.wall_time = time.perf_counter() - wall_start
+            this_span.cpu_time = time.process_time() - cpu_start
+            self.__stop_profiler(profiler, name)
+            self.current = previous_span
+
+    def probe(self, passed:bool) -> bool:
+        return self.current.probe(passed)
+
+    def probes(self, attempted:int, passed:int):
+        # counts from probes run somewhere else, e.g. in a worker process
+        self.current.probes_attempted += attempted
+        self.current.probes_passed += passed
+
+    def scanned(self, byte_count:int):
+        self.current.bytes_scanned += byte_count
+
+    def decompressed(self, byte_count:int):
+        self.current.decompressed_bytes += byte_count
+
+    def __start_profiler(self):
+        if self.profiler == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profiler == "pyinstrument":
+            # optional, only needed if someone asks for it
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+
+    def __stop_profiler(self, profiler, name:str):
+        if profiler is None:
+            return
+
+        ensure_dir(self.profile_folder)
+        if self.profiler == "cprofile":
+            profiler.disable()
+            profiler.dump_stats(join(self.profile_folder, f"{name}.prof"))
+        else:
+            profiler.stop()
+            with open(join(self.profile_folder, f"{name}.html"), "w") as f:
+                f.write(profiler.output_html())
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "wall_time": sum(x.wall_time for x in self.spans),
+            "cpu_time": sum(x.cpu_time for x in self.spans),
+            "max_memory": self.max_memory,
+            "peak_memory": self.peak_memory,
+            "peak_memory_scope": self.peak_memory_scope,
+            "phases": [x.to_dict() for x in self.spans],
+        }
+
+    def write_json(self, path:str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
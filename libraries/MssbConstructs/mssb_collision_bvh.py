@@ -0,0 +1,270 @@
+from .mssb_construct_collision import *
+
+def expand_ranges(starts:np.ndarray, counts:np.ndarray, owners:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # [start, start + count) for every start, each paired with its owner
+    total = int(counts.sum())
+    range_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    items = np.repeat(starts, counts) + (np.arange(total) - range_starts)
+    return items, np.repeat(owners, counts)
+
+def dot(a:np.ndarray, b:np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+def closest_points_on_triangles(p:np.ndarray, a:np.ndarray, b:np.ndarray, c:np.ndarray) -> np.ndarray:
+    # Ericson's region tests, for every (point, triangle) row at once
+    ab = b - a
+    ac = c - a
+    ap = p - a
+    bp = p - b
+    cp = p - c
+    d1, d2 = dot(ab, ap), dot(ac, ap)
+    d3, d4 = dot(ab, bp), dot(ac, bp)
+    d5, d6 = dot(ab, cp), dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = 1 / (va + vb + vc)
+        # inside the face, then each edge and vertex region overrides it, the vertex regions win
+        out = a + ab * (vb * denom)[:, None] + ac * (vc * denom)[:, None]
+
+        on_bc = (va <= 0) & ((d4 - d3) >= 0) & ((d5 - d6) >= 0)
+        w = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        out = np.where(on_bc[:, None], b + (c - b) * w[:, None], out)
+
+        on_ac = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        w = d2 / (d2 - d6)
+        out = np.where(on_ac[:, None], a + ac * w[:, None], out)
+
+        on_ab = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        v = d1 / (d1 - d3)
+        out = np.where(on_ab[:, None], a + ab * v[:, None], out)
+
+    out = np.where(((d6 >= 0) & (d5 <= d6))[:, None], c, out)
+    out = np.where(((d3 >= 0) & (d4 <= d3))[:, None], b, out)
+    out = np.where(((d1 <= 0) & (d2 <= 0))[:, None], a, out)
+    return out
+
+def ray_triangle_distances(origins:np.ndarray, directions:np.ndarray, a:np.ndarray, b:np.ndarray, c:np.ndarray) -> np.ndarray:
+    # Moller-Trumbore, inf where the ray misses
+    epsilon = 1e-9
+    ab = b - a
+    ac = c - a
+    pvec = np.cross(directions, ac)
+    det = dot(ab, pvec)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_det = 1 / det
+        tvec = origins - a
+        u = dot(tvec, pvec) * inv_det
+        qvec = np.cross(tvec, ab)
+        v = dot(directions, qvec) * inv_det
+        t = dot(ac, qvec) * inv_det
+        hit = (np.abs(det) > epsilon) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+
+    return np.where(hit, t, np.inf)
+
+def flag_names(flags:np.ndarray) -> list:
+    # enumCollisionFlags name for each flag, None where nothing was hit
+    return [enumCollisionFlags.decmapping.get(int(x), int(x)) if x >= 0 else None for x in flags]
+
+class CollisionBVH:
+    """Bounding volume hierarchy over a CollisionMesh, stored as flat arrays
+
+    The root's children are the stadium's own bounding boxes, and each box's triangles are
+    split further on the longest axis until a leaf has at most LEAF_SIZE triangles.
+    """
+    LEAF_SIZE = 8
+
+    def __init__(self, mesh:CollisionMesh) -> None:
+        self.mesh = mesh
+        self.a = mesh.positions[mesh.triangles[:, 0]].astype(np.float64)
+        self.b = mesh.positions[mesh.triangles[:, 1]].astype(np.float64)
+        self.c = mesh.positions[mesh.triangles[:, 2]].astype(np.float64)
+
+        tri_min = np.minimum(np.minimum(self.a, self.b), self.c)
+        tri_max = np.maximum(np.maximum(self.a, self.b), self.c)
+        centroids = (tri_min + tri_max) / 2
+
+        node_min, node_max = [], []
+        child_start, child_count = [], []
+        tri_start, tri_count = [], []
+        order = []
+
+        def new_nodes(count:int) -> int:
+            first = len(node_min)
+            for _ in range(count):
+                node_min.append(np.full(3, np.inf))
+                node_max.append(np.full(3, -np.inf))
+                child_start.append(0)
+                child_count.append(0)
+                tri_start.append(0)
+                tri_count.append(0)
+            return first
+
+        def fill(node:int, tri_ids:np.ndarray, box:np.ndarray=None):
+            if len(tri_ids) > 0:
+                node_min[node] = tri_min[tri_ids].min(axis=0)
+                node_max[node] = tri_max[tri_ids].max(axis=0)
+            if box is not None:
+                node_min[node] = np.minimum(node_min[node], box[0])
+                node_max[node] = np.maximum(node_max[node], box[1])
+
+            if len(tri_ids) <= self.LEAF_SIZE:
+                tri_start[node] = len(order)
+                tri_count[node] = len(tri_ids)
+                order.extend(tri_ids.tolist())
+                return
+
+            # median split on the longest axis of the centroids
+            spread = centroids[tri_ids].max(axis=0) - centroids[tri_ids].min(axis=0)
+            axis = int(np.argmax(spread))
+            sorted_ids = tri_ids[np.argsort(centroids[tri_ids, axis], kind="stable")]
+            half = len(sorted_ids) // 2
+
+            first_child = new_nodes(2)
+            child_start[node] = first_child
+            child_count[node] = 2
+            fill(first_child, sorted_ids[:half])
+            fill(first_child + 1, sorted_ids[half:])
+
+        root = new_nodes(1)
+        box_count = len(mesh.bounding_boxes)
+        first_box = new_nodes(box_count)
+        child_start[root] = first_box
+        child_count[root] = box_count
+        for box_index in range(box_count):
+            fill(first_box + box_index, np.flatnonzero(mesh.triangle_boxes == box_index), mesh.bounding_boxes[box_index].astype(np.float64))
+        if box_count > 0:
+            node_min[root] = np.min(node_min[first_box:], axis=0)
+            node_max[root] = np.max(node_max[first_box:], axis=0)
+
+        self.node_min = np.array(node_min)
+        self.node_max = np.array(node_max)
+        self.child_start = np.array(child_start, np.int64)
+        self.child_count = np.array(child_count, np.int64)
+        self.tri_start = np.array(tri_start, np.int64)
+        self.tri_count = np.array(tri_count, np.int64)
+        self.order = np.array(order, np.int64)
+
+    def from_bytes(b:bytes, collision_offset:int) -> "CollisionBVH":
+        return CollisionBVH(read_collision_arrays(b, collision_offset))
+
+    def __traverse(self, query_count:int, node_test, leaf_test):
+        # breadth first over every query at once, as (node, query) pairs
+        nodes = np.zeros(query_count, np.int64)
+        queries = np.arange(query_count)
+
+        while len(nodes) > 0:
+            keep = node_test(nodes, queries)
+            nodes, queries = nodes[keep], queries[keep]
+
+            is_leaf = self.child_count[nodes] == 0
+            leaf_nodes, leaf_queries = nodes[is_leaf], queries[is_leaf]
+            if len(leaf_nodes) > 0:
+                slots, tri_queries = expand_ranges(self.tri_start[leaf_nodes], self.tri_count[leaf_nodes], leaf_queries)
+                if len(slots) > 0:
+                    leaf_test(self.order[slots], tri_queries)
+
+            inner_nodes, inner_queries = nodes[~is_leaf], queries[~is_leaf]
+            nodes, queries = expand_ranges(self.child_start[inner_nodes], self.child_count[inner_nodes], inner_queries)
+
+    def ray_cast(self, origins, directions, max_distance=np.inf) -> dict[str, np.ndarray]:
+        origins = np.atleast_2d(np.asarray(origins, np.float64))
+        directions = np.atleast_2d(np.asarray(directions, np.float64))
+        directions = np.broadcast_to(directions, origins.shape)
+        query_count = len(origins)
+
+        best_distance = np.full(query_count, float(max_distance))
+        best_triangle = np.full(query_count, -1, np.int64)
+
+        with np.errstate(divide="ignore"):
+            inverse_directions = 1 / directions
+
+        def node_test(nodes, queries):
+            # slab test, skipping anything further than the closest hit so far
+            with np.errstate(invalid="ignore"):
+                t1 = (self.node_min[nodes] - origins[queries]) * inverse_directions[queries]
+                t2 = (self.node_max[nodes] - origins[queries]) * inverse_directions[queries]
+            t_near = np.nanmax(np.minimum(t1, t2), axis=1)
+            t_far = np.nanmin(np.maximum(t1, t2), axis=1)
+            return (t_near <= t_far) & (t_far >= 0) & (t_near <= best_distance[queries])
+
+        def leaf_test(triangles, queries):
+            distances = ray_triangle_distances(origins[queries], directions[queries], self.a[triangles], self.b[triangles], self.c[triangles])
+            np.minimum.at(best_distance, queries, distances)
+            closest = (distances == best_distance[queries]) & np.isfinite(distances)
+            best_triangle[queries[closest]] = triangles[closest]
+
+        self.__traverse(query_count, node_test, leaf_test)
+        hit_distance = np.where(best_triangle >= 0, best_distance, 0)
+        return self.__results(best_triangle, best_distance, origins + directions * hit_distance[:, None])
+
+    def triangle_below(self, points, max_distance=np.inf) -> dict[str, np.ndarray]:
+        # "what is the ground under this position", stadiums are Y up so that's straight down -Y
+        return self.ray_cast(points, np.array([[0.0, -1.0, 0.0]]), max_distance)
+
+    def nearest_surface(self, points, max_distance=np.inf) -> dict[str, np.ndarray]:
+        points = np.atleast_2d(np.asarray(points, np.float64))
+        query_count = len(points)
+
+        best_distance_squared = np.full(query_count, float(max_distance) ** 2)
+        best_triangle = np.full(query_count, -1, np.int64)
+        best_point = np.zeros((query_count, 3))
+
+        def node_test(nodes, queries):
+            return self.__box_distances_squared(nodes, points[queries]) <= best_distance_squared[queries]
+
+        def leaf_test(triangles, queries):
+            closest = closest_points_on_triangles(points[queries], self.a[triangles], self.b[triangles], self.c[triangles])
+            offset = closest - points[queries]
+            distances = dot(offset, offset)
+            np.minimum.at(best_distance_squared, queries, distances)
+            is_best = (distances == best_distance_squared[queries]) & np.isfinite(distances)
+            best_triangle[queries[is_best]] = triangles[is_best]
+            best_point[queries[is_best]] = closest[is_best]
+
+        # a first guess from the leaf each point is closest to, so the real search can skip most of the tree
+        first_leaves = self.__closest_leaves(points)
+        slots, tri_queries = expand_ranges(self.tri_start[first_leaves], self.tri_count[first_leaves], np.arange(query_count))
+        if len(slots) > 0:
+            leaf_test(self.order[slots], tri_queries)
+
+        self.__traverse(query_count, node_test, leaf_test)
+        return self.__results(best_triangle, np.sqrt(best_distance_squared), best_point)
+
+    def __box_distances_squared(self, nodes:np.ndarray, points:np.ndarray) -> np.ndarray:
+        outside = np.maximum(self.node_min[nodes] - points, 0) + np.maximum(points - self.node_max[nodes], 0)
+        return dot(outside, outside)
+
+    def __closest_leaves(self, points:np.ndarray) -> np.ndarray:
+        # walk down from the root, always into the child box closest to the point
+        nodes = np.zeros(len(points), np.int64)
+        while True:
+            queries = np.flatnonzero(self.child_count[nodes] > 0)
+            if len(queries) == 0:
+                return nodes
+
+            children, owners = expand_ranges(self.child_start[nodes[queries]], self.child_count[nodes[queries]], queries)
+            distances = self.__box_distances_squared(children, points[owners])
+            order = np.lexsort((distances, owners))
+            first_of_owner = np.r_[True, owners[order][1:] != owners[order][:-1]]
+            nodes[owners[order][first_of_owner]] = children[order][first_of_owner]
+
+    def boxes_containing(self, points) -> np.ndarray:
+        # index of the first stadium bounding box each point is in, -1 if none
+        points = np.atleast_2d(np.asarray(points, np.float64))
+        boxes = self.mesh.bounding_boxes
+        inside = np.all((points[:, None, :] >= boxes[None, :, 0, :]) & (points[:, None, :] <= boxes[None, :, 1, :]), axis=2)
+        return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    def __results(self, triangles:np.ndarray, distances:np.ndarray, points:np.ndarray) -> dict[str, np.ndarray]:
+        hit = triangles >= 0
+        return {
+            "hit": hit,
+            "triangle": triangles,
+            "distance": np.where(hit, distances, np.inf),
+            "point": points,
+            "collisionFlags": np.where(hit, self.mesh.triangle_flags[np.maximum(triangles, 0)].astype(np.int64), -1) if len(self.mesh.triangle_flags) else np.full(len(triangles), -1),
+        }
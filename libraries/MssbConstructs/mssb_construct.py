@@ -1,4 +1,6 @@
 import construct as cs
+import io
+import itertools
 
 GECKO_FLOAT   = cs.Float32b
 GECKO_DOUBLE  = cs.Float64b
@@ -10,19 +12,95 @@ GECKO_U8      = cs.Int8ub
 GECKO_S8      = cs.Int8sb
 GECKO_POINTER = GECKO_U32
 
-class UnvalidatedCString(cs.Adapter):
-    def _decode(self, obj, ctx, path):
-        return "".join(chr(x) for x in obj)
+# names are mostly ascii, some are shift-jis, anything that isn't valid shift-jis keeps one character per byte
+GECKO_STRING_ENCODING = "shift_jis"
+GECKO_STRING_FALLBACK_ENCODING = "latin-1"
+# how much is read at a time looking for the end of a string, most names fit in one read
+CSTRING_CHUNK_SIZE = 0x40
 
-    def _encode(self, obj, ctx, path):
-        return bytes([ord(x) for x in obj] + [0])
+def decode_gecko_string(raw:bytes) -> str:
+    try:
+        return raw.decode(GECKO_STRING_ENCODING)
+    except UnicodeDecodeError:
+        return raw.decode(GECKO_STRING_FALLBACK_ENCODING)
+
+def encode_gecko_string(s:str) -> bytes:
+    try:
+        return s.encode(GECKO_STRING_ENCODING)
+    except UnicodeEncodeError:
+        return s.encode(GECKO_STRING_FALLBACK_ENCODING)
+
+def read_gecko_string_bytes(stream) -> bytes:
+    # reads in chunks and finds the 0 with bytes.find, rather than a construct per byte
+    start = stream.tell()
+    raw = b""
+    while True:
+        chunk = stream.read(CSTRING_CHUNK_SIZE)
+        end = chunk.find(b"\0")
+        if end != -1:
+            raw += chunk[:end]
+            # leave the stream just past the 0, same as building writes it
+            stream.seek(start + len(raw) + 1)
+            return raw
+        raw += chunk
+        if len(chunk) < CSTRING_CHUNK_SIZE:
+            # ran off the end without a 0, keep what was there
+            return raw
+
+class GeckoCString(cs.Construct):
+    """0 terminated string, decoded as shift-jis, or one character per byte if it isn't"""
+    def _parse(self, stream, context, path):
+        return decode_gecko_string(read_gecko_string_bytes(stream))
+
+    def _build(self, obj, stream, context, path):
+        raw = encode_gecko_string(obj) + b"\0"
+        cs.stream_write(stream, raw, len(raw), path)
+        return obj
+
+    def _sizeof(self, context, path):
+        raise cs.SizeofError("GeckoCString has no fixed size", path=path)
 
-def _whenToStopReadingCString(obj, ctx):
-    if obj == 0: raise cs.CancelParsing
+    # no _emitparse, the compiled parser calls _parse directly, which is already one find and one decode
 
-GECKO_STRING = UnvalidatedCString(cs.GreedyRange(GECKO_U8 * _whenToStopReadingCString))
-# previous definition, but fails on sjis strings
+GECKO_STRING = GeckoCString()
+# previous definitions, the first fails on sjis strings, the second read a byte at a time
 # GECKO_STRING = cs.CString("ascii")
+# GECKO_STRING = UnvalidatedCString(cs.GreedyRange(GECKO_U8 * _whenToStopReadingCString))
+
+class StringTable:
+    """Strings in a file by offset, each one is only decoded once however many pointers lead to it"""
+    def __init__(self, b:bytes) -> None:
+        self.b = b
+        self.strings:dict[int, str] = {}
+
+    def __getitem__(self, offset:int) -> str:
+        s = self.strings.get(offset)
+        if s is None:
+            end = self.b.find(b"\0", offset)
+            if end == -1:
+                end = len(self.b)
+            s = self.strings[offset] = decode_gecko_string(bytes(self.b[offset:end]))
+        return s
+
+    def read_pointers(self, pointer_offsets:list[int], base:int=0) -> list[str]:
+        # every u32 pointer at pointer_offsets, relative to base, as the string it points at, None for null pointers
+        out = []
+        for pointer_offset in pointer_offsets:
+            pointer = int.from_bytes(self.b[pointer_offset:pointer_offset + 4], "big")
+            out.append(self[base + pointer] if pointer != 0 else None)
+        return out
+
+class FixedBitwise(cs.Transformed):
+    """cs.Bitwise over a fixed size subcon, which construct won't compile on its own"""
+    def __init__(self, subcon: cs.Construct) -> None:
+        size = subcon.sizeof() // 8
+        super().__init__(subcon, cs.bytes2bits, size, cs.bits2bytes, size)
+
+    def _emitparse(self, code):
+        return f"restream(bytes2bits(io.read({self.decodeamount})), lambda io: ({self.subcon._compileparse(code)}))"
+
+def FixedBitStruct(*subcons, **subconskw):
+    return FixedBitwise(cs.Struct(*subcons, **subconskw))
 
 def retrieve_base_pointer():
     return "pBase" / cs.Computed(cs.this._.pBase)
@@ -30,16 +108,37 @@ def retrieve_base_pointer():
 def make_me_base_pointer():
     return "pBase" / cs.Tell
 
+def emit_validator(code, subcon_code:str, condition:str) -> str:
+    # compiled version of a Validator, condition is python using obj
+    fname = f"parse_validator_{code.allocateId()}"
+    code.append(f"""
+        def {fname}(obj):
+            if not ({condition}): raise ValidationError("object failed validation: %s" % (obj,))
+            return obj
+    """)
+    return f"{fname}({subcon_code})"
+
 class ValidatePointerIsntNull(cs.Validator):
     def _validate(self, obj, ctx, path):
         return obj != 0
 
+    def _emitparse(self, code):
+        return emit_validator(code, self.subcon._compileparse(code), "obj != 0")
+
+def field_from_parent(fieldName: str):
+    # "offsetToArray" -> this._.offsetToArray, "_.offsetToArray" -> this._._.offsetToArray
+    # an expression instead of a lambda so the struct can still compile
+    expr = cs.this._
+    for name in fieldName.split("."):
+        expr = expr[name]
+    return expr
+
 def PointerToStruct(struct: cs.Construct, fieldName: type[None | str] = None, nullable=False):
     return cs.Struct(
         # get the base offset from our parent
         retrieve_base_pointer(),
         # read a pointer (consume a pointer, otherwise read from a field in the parent)
-        "p" / (GECKO_POINTER if fieldName == None else cs.Computed(lambda ctx : ctx._[fieldName])),
+        "p" / (GECKO_POINTER if fieldName == None else cs.Computed(field_from_parent(fieldName))),
         # make bool for valid pointer
         "validPointer" / (cs.Computed(cs.this.p != 0) if nullable else ValidatePointerIsntNull(cs.Computed(cs.this.p != 0))),
         # if the pointer is valid, read the struct, add the base
@@ -80,6 +179,10 @@ def get_struct_from_offset(offset_index:int, struct:cs.Construct):
         "pData" / PointerToStruct(struct, nullable=False)
     )
 
+def get_offset_from_index(b:bytes, offset_index:int) -> int:
+    # same pointer get_struct_from_offset follows, without parsing anything
+    return int.from_bytes(b[4 * offset_index : 4 * offset_index + 4], "big")
+
 def attempt_to_understand_file_section(b:bytes, offset_index:int, struct:cs.Construct):
     file_with_struct = get_struct_from_offset(offset_index, struct)
 
@@ -102,11 +205,91 @@ class RangeValidator(cs.Validator):
             return self.min <= obj <= self.max
         else:
             return self.min <= obj < self.max
-    
+
+    def _emitparse(self, code):
+        condition = f"{self.min!r} <= obj {'<=' if self.includes_max else '<'} {self.max!r}"
+        return emit_validator(code, self.subcon._compileparse(code), condition)
+
 class CollectionValidator(cs.Validator):
     def __init__(self, subcon: cs.Construct, collection) -> None:
         super().__init__(subcon)
         self.collection = collection
     
     def _validate(self, obj, ctx, path):
-        return obj in self.collection
\ No newline at end of file
+        return obj in self.collection
+
+    def _emitparse(self, code):
+        return emit_validator(code, self.subcon._compileparse(code), f"obj in {self.collection!r}")
+
+class GreedyRangeUntil(cs.GreedyRange):
+    """GreedyRange that also stops at the first element matching predicate, without consuming it.
+    Same result as a GreedyRange with a CancelParsing hook, but predicate is an obj_ expression so it compiles"""
+    def __init__(self, subcon: cs.Construct, predicate) -> None:
+        super().__init__(subcon)
+        self.predicate = predicate
+
+    def _parse(self, stream, context, path):
+        obj = cs.ListContainer()
+        try:
+            for i in itertools.count():
+                context._index = i
+                fallback = cs.stream_tell(stream, path)
+                e = self.subcon._parsereport(stream, context, path)
+                if self.predicate(e, obj, context):
+                    cs.stream_seek(stream, fallback, 0, path)
+                    break
+                obj.append(e)
+        except cs.StopFieldError:
+            pass
+        except cs.ExplicitError:
+            raise
+        except Exception:
+            cs.stream_seek(stream, fallback, 0, path)
+        return obj
+
+    def _emitparse(self, code):
+        fname = f"parse_greedyrangeuntil_{code.allocateId()}"
+        code.append(f"""
+            def {fname}(io, this):
+                list_ = ListContainer()
+                try:
+                    while True:
+                        fallback = io.tell()
+                        obj_ = {self.subcon._compileparse(code)}
+                        if ({self.predicate}):
+                            io.seek(fallback)
+                            break
+                        list_.append(obj_)
+                except StopFieldError:
+                    pass
+                except ExplicitError:
+                    raise
+                except Exception:
+                    io.seek(fallback)
+                return list_
+        """)
+        return f"{fname}(io, this)"
+
+# compiled parsers, one per schema, made the first time they're asked for
+COMPILED_STRUCTS:dict[int, tuple[cs.Construct, cs.Construct]] = {}
+
+def get_compiled_struct(struct:cs.Construct) -> cs.Construct:
+    # anything that fails to compile keeps using the interpreter, the UI always uses the interpreted structs
+    cached = COMPILED_STRUCTS.get(id(struct))
+    if cached is None:
+        try:
+            compiled = struct.compile()
+        except Exception as e:
+            print(f"Could not compile {struct}, using the interpreter: {e}")
+            compiled = struct
+        # keep the struct alive alongside, so its id can't be reused
+        cached = (struct, compiled)
+        COMPILED_STRUCTS[id(struct)] = cached
+    return cached[1]
+
+def parse_struct_at(b:bytes, offset:int, struct:cs.Construct, compiled=True, **contextkw):
+    # parse in place rather than on a slice, so Tell based base pointers match get_struct_from_offset
+    # contextkw stands in for the parent, e.g. pBase for structs using retrieve_base_pointer
+    stream = io.BytesIO(b)
+    stream.seek(offset)
+    return (get_compiled_struct(struct) if compiled else struct).parse_stream(stream, **contextkw)
\ No newline at end of file
@@ -0,0 +1,58 @@
+import argparse
+import time
+from .mssb_construct import (get_compiled_struct, get_offset_from_index, parse_struct_at)
+from .mssb_construct_geo import (geoHeader, geoHeaderColorArray)
+from .mssb_construct_collision import collisionHeader
+
+SCHEMAS = {
+    "geo": geoHeader,
+    "geo-color-array": geoHeaderColorArray,
+    "collision": collisionHeader,
+}
+
+def time_parse(b:bytes, offset:int, struct, compiled:bool, repeat:int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_struct_at(b, offset, struct, compiled)
+    return (time.perf_counter() - start) / repeat
+
+def benchmark_file(path:str, schema:str, offset_index:int=None, repeat:int=10) -> dict:
+    with open(path, "rb") as f:
+        b = f.read()
+
+    struct = SCHEMAS[schema]
+    # geo files start with the header, stadium files point to their collision through the offset table
+    offset = 0 if offset_index is None else get_offset_from_index(b, offset_index)
+
+    # compile before timing, it only happens once per schema
+    start = time.perf_counter()
+    get_compiled_struct(struct)
+    compile_time = time.perf_counter() - start
+
+    matching = parse_struct_at(b, offset, struct, False) == parse_struct_at(b, offset, struct, True)
+    interpreted = time_parse(b, offset, struct, False, repeat)
+    compiled = time_parse(b, offset, struct, True, repeat)
+    return {
+        "path": path,
+        "compile_time": compile_time,
+        "interpreted": interpreted,
+        "compiled": compiled,
+        "speedup": interpreted / compiled if compiled else 0.0,
+        "matching": matching,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the interpreted and compiled parsers on real files")
+    parser.add_argument("schema", choices=SCHEMAS.keys())
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--offset-index", type=int, default=None, help="read the struct from this pointer in the file's offset table, e.g. a stadium's collision")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        r = benchmark_file(path, args.schema, args.offset_index, args.repeat)
+        print(f"{r['path']}: interpreted {r['interpreted'] * 1000:.2f}ms, compiled {r['compiled'] * 1000:.2f}ms, "
+              f"{r['speedup']:.1f}x faster (compiled once in {r['compile_time']:.2f}s), results match: {r['matching']}")
+
+if __name__ == "__main__":
+    main()
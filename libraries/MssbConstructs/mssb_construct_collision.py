@@ -1,4 +1,7 @@
-from mssb_construct import *
+from .mssb_construct import *
+from .mssb_gltf import GlbBuilder
+import struct
+import numpy as np
 
 boundingBox = cs.Struct(
     "min" / VEC3F,
@@ -32,18 +35,16 @@ collisionVertexCollection = cs.Struct(
     # flag is bool
     "isTriangleStrip" / cs.Flag,
     "rawVertCount" / GECKO_U16,
-    # only works with ctx, not this.
-    "vertCount" / cs.Computed(lambda ctx: (ctx.rawVertCount + 2) if (ctx.isTriangleStrip) else (ctx.rawVertCount * 3)),
+    # IfThenElse rather than a lambda, so this still compiles
+    "vertCount" / cs.IfThenElse(cs.this.isTriangleStrip, cs.Computed(cs.this.rawVertCount + 2), cs.Computed(cs.this.rawVertCount * 3)),
     # immediately followed by an array of collision triangles
     "vertexArray" / collisionTriangle[cs.this.vertCount]
 )
 
-def whenToStopCollectingTriangles(obj, ctx):
-    if obj.rawVertCount == 0: raise cs.CancelParsing
-
 triangleCollectionArray = cs.Struct(
     # use greedy range here, cs.RepeatUntil works in theory, but not compatible with the UI
-    "triCollection" / (cs.GreedyRange(collisionVertexCollection * whenToStopCollectingTriangles)),
+    # stops at the empty collection without consuming it, same as a CancelParsing hook but compilable
+    "triCollection" / GreedyRangeUntil(collisionVertexCollection, cs.obj_.rawVertCount == 0),
     # last triCollection has to have a collisionVertexCollection with 0 triangles
     # this solution is technically a triCollection with length 0, but its kinda nicer this way, means you don't have to
     # make a new triangle collection with 0 triangles, just your valid collection
@@ -101,3 +102,128 @@ def write_collision(outData: cs.Struct, outFileName: str):
                         i += 1
                     else:
                         i += 3
+
+
+# numpy path, reads the same layout as collisionHeader, without building a construct container per vertex
+
+COLLISION_VERTEX_DTYPE = np.dtype([
+    ("position", ">f4", 3),
+    ("collisionFlags", ">u2"),
+    ("pad", ">u2"),
+])
+
+class CollisionMesh:
+    def __init__(self, positions:np.ndarray, triangles:np.ndarray, triangle_flags:np.ndarray, triangle_boxes:np.ndarray, bounding_boxes:np.ndarray) -> None:
+        # (vertexCount, 3) float32, deduplicated
+        self.positions = positions
+        # (triangleCount, 3) indices into positions
+        self.triangles = triangles
+        # (triangleCount,) enumCollisionFlags value of each triangle
+        self.triangle_flags = triangle_flags
+        # (triangleCount,) which bounding box each triangle was listed under
+        self.triangle_boxes = triangle_boxes
+        # (boxCount, 2, 3) min and max of each box
+        self.bounding_boxes = bounding_boxes
+
+def read_collection_indices(vertex_count:int, is_triangle_strip:bool) -> np.ndarray:
+    if is_triangle_strip:
+        # every vertex after the first 2 makes a triangle with the 2 before it
+        starts = np.arange(vertex_count - 2)
+    else:
+        starts = np.arange(0, vertex_count - 2, 3)
+    return starts[:, None] + np.arange(3)
+
+def read_collision_arrays(b:bytes, collision_offset:int) -> CollisionMesh:
+    box_count, _, pBoundingBoxes = struct.unpack_from(">HHI", b, collision_offset)
+    bounding_boxes = np.frombuffer(b, ">f4", box_count * 6, collision_offset + pBoundingBoxes).astype(np.float32).reshape(box_count, 2, 3)
+    box_pointers = np.frombuffer(b, ">u4", box_count, collision_offset + 8)
+
+    vertex_arrays = []
+    index_arrays = []
+    box_arrays = []
+    vertex_total = 0
+    for box_index, p in enumerate(box_pointers):
+        p = collision_offset + int(p)
+        while True:
+            _, is_triangle_strip, raw_vert_count = struct.unpack_from(">BBH", b, p)
+            # same terminator as triangleCollectionArray
+            if raw_vert_count == 0:
+                break
+
+            vert_count = (raw_vert_count + 2) if is_triangle_strip else (raw_vert_count * 3)
+            vertex_arrays.append(np.frombuffer(b, COLLISION_VERTEX_DTYPE, vert_count, p + 4))
+            indices = read_collection_indices(vert_count, is_triangle_strip) + vertex_total
+            index_arrays.append(indices)
+            box_arrays.append(np.full(len(indices), box_index, np.uint16))
+
+            vertex_total += vert_count
+            p += 4 + vert_count * COLLISION_VERTEX_DTYPE.itemsize
+
+    if len(vertex_arrays) == 0:
+        return CollisionMesh(np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int64), np.zeros(0, np.uint16), np.zeros(0, np.uint16), bounding_boxes)
+
+    vertices = np.concatenate(vertex_arrays)
+    triangles = np.concatenate(index_arrays)
+
+    # each triangle takes the type of the vertex that finished it
+    triangle_flags = vertices["collisionFlags"][triangles[:, 2]].astype(np.uint16)
+
+    # the same position shows up once per strip/list it's in, only keep one
+    positions, inverse = np.unique(vertices["position"].astype(np.float32), axis=0, return_inverse=True)
+    triangles = inverse.reshape(-1)[triangles]
+
+    return CollisionMesh(positions, triangles, triangle_flags, np.concatenate(box_arrays), bounding_boxes)
+
+def write_collision_obj(mesh:CollisionMesh, outFileName:str):
+    with open(outFileName, "w") as f:
+        np.savetxt(f, mesh.positions, fmt="v %.9g %.9g %.9g")
+        np.savetxt(f, mesh.triangles + 1, fmt="f %d %d %d")
+
+def write_collision_ply(mesh:CollisionMesh, outFileName:str):
+    face_dtype = np.dtype([("count", "u1"), ("indices", "<i4", 3), ("collisionFlags", "<u2")])
+    faces = np.empty(len(mesh.triangles), face_dtype)
+    faces["count"] = 3
+    faces["indices"] = mesh.triangles
+    faces["collisionFlags"] = mesh.triangle_flags
+
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {len(mesh.positions)}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        f"element face {len(mesh.triangles)}\n"
+        "property list uchar int vertex_indices\n"
+        "property ushort collision_flags\n"
+        "end_header\n"
+    )
+    with open(outFileName, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(mesh.positions.astype("<f4").tobytes())
+        f.write(faces.tobytes())
+
+def write_collision_glb(mesh:CollisionMesh, outFileName:str):
+    glb = GlbBuilder()
+    position_accessor = glb.add_positions(mesh.positions)
+
+    # one primitive per triangle type, so they can be told apart once imported
+    primitives = []
+    for flag in np.unique(mesh.triangle_flags):
+        primitives.append({
+            "attributes": {"POSITION": position_accessor},
+            "indices": glb.add_indices(mesh.triangles[mesh.triangle_flags == flag]),
+            "extras": {"collisionFlags": enumCollisionFlags.decmapping.get(int(flag), int(flag))},
+        })
+
+    glb.write(outFileName, [{"mesh": 0}], [{"primitives": primitives}])
+
+COLLISION_WRITERS = {
+    ".obj": write_collision_obj,
+    ".ply": write_collision_ply,
+    ".glb": write_collision_glb,
+}
+
+def write_collision_mesh(mesh:CollisionMesh, outFileName:str):
+    extension = outFileName[outFileName.rfind("."):].lower()
+    COLLISION_WRITERS[extension](mesh, outFileName)
@@ -1,4 +1,5 @@
 from .mssb_construct import *
+import numpy as np
 
 
 class BitToFloatAdaptor(cs.Adapter):
@@ -12,9 +13,12 @@ class BitToFloatAdaptor(cs.Adapter):
     def _encode(self, obj, ctx, path):
         return int(obj * self.maxAmount)
 
+    def _emitparse(self, code):
+        return f"float(({self.subcon._compileparse(code)}) / {self.maxAmount})"
+
 
 def make_color_struct(r_size, g_size, b_size, a_size=0, end_padding=0):
-    return cs.BitStruct(
+    return FixedBitStruct(
         "R" / BitToFloatAdaptor(cs.BitsInteger(r_size), r_size),
         "G" / BitToFloatAdaptor(cs.BitsInteger(g_size), g_size),
         "B" / BitToFloatAdaptor(cs.BitsInteger(b_size), b_size),
@@ -29,3 +33,93 @@ COLOR_888X = make_color_struct(8, 8, 8, 0, 8)
 COLOR_4444 = make_color_struct(4, 4, 4, 4)
 COLOR_6666 = make_color_struct(6, 6, 6, 6)
 COLOR_8888 = make_color_struct(8, 8, 8, 8)
+
+
+class ColorArrayDecoder:
+    """Decodes a whole array of one of the color formats at once, instead of one BitStruct per color"""
+    def __init__(self, r_size, g_size, b_size, a_size=0, end_padding=0) -> None:
+        self.channel_sizes = (r_size, g_size, b_size, a_size)
+        self.total_bits = r_size + g_size + b_size + a_size + end_padding
+        self.byte_size = self.total_bits // 8
+
+    def _pack_bytes(self, raw:bytes, count:int, offset:int) -> np.ndarray:
+        packed = np.frombuffer(raw, np.uint8, count * self.byte_size, offset).reshape(count, self.byte_size)
+        # colors are big endian, and some are 3 bytes, so build the integer up a byte at a time
+        value = np.zeros(count, np.uint32)
+        for i in range(self.byte_size):
+            value = (value << 8) | packed[:, i]
+        return value
+
+    def decode(self, raw:bytes, count:int, offset:int=0, as_uint8=False) -> np.ndarray:
+        value = self._pack_bytes(raw, count, offset)
+
+        out = np.empty((count, 4), np.uint8 if as_uint8 else np.float32)
+        shift = self.total_bits
+        for i, size in enumerate(self.channel_sizes):
+            if size == 0:
+                # no alpha, same as the Computed(1.0) in make_color_struct
+                out[:, i] = 255 if as_uint8 else 1.0
+                continue
+
+            shift -= size
+            max_amount = (1 << size) - 1
+            channel = (value >> shift) & max_amount
+            if as_uint8:
+                out[:, i] = (channel * 255 + max_amount // 2) // max_amount
+            else:
+                out[:, i] = channel / np.float32(max_amount)
+        return out
+
+    def encode(self, colors:np.ndarray) -> bytes:
+        colors = np.asarray(colors, np.float32)
+        value = np.zeros(len(colors), np.uint32)
+        shift = self.total_bits
+        for i, size in enumerate(self.channel_sizes):
+            if size == 0:
+                continue
+            shift -= size
+            max_amount = (1 << size) - 1
+            # same truncation as BitToFloatAdaptor._encode
+            value |= (colors[:, i] * max_amount).astype(np.uint32) << shift
+
+        big_endian = value.astype(">u4").view(np.uint8).reshape(-1, 4)
+        return big_endian[:, 4 - self.byte_size:].tobytes()
+
+COLOR_565_DECODER = ColorArrayDecoder(5, 6, 5)
+COLOR_888_DECODER = ColorArrayDecoder(8, 8, 8)
+COLOR_888X_DECODER = ColorArrayDecoder(8, 8, 8, 0, 8)
+COLOR_4444_DECODER = ColorArrayDecoder(4, 4, 4, 4)
+COLOR_6666_DECODER = ColorArrayDecoder(6, 6, 6, 6)
+COLOR_8888_DECODER = ColorArrayDecoder(8, 8, 8, 8)
+
+class ColorArray(cs.Construct):
+    """Parses `count` colors as one (count, 4) array, picking the format from the quantize value"""
+    def __init__(self, decoder_dict:dict[int, ColorArrayDecoder], quantize_value, count, as_uint8=False) -> None:
+        super().__init__()
+        self.decoder_dict = decoder_dict
+        self.quantize_value = quantize_value
+        self.count = count
+        self.as_uint8 = as_uint8
+
+    def __get_decoder(self, context, path) -> ColorArrayDecoder:
+        quantize_value = cs.evaluate(self.quantize_value, context)
+        if quantize_value not in self.decoder_dict:
+            raise cs.ExplicitError(f"unknown color format {quantize_value}", path=path)
+        return self.decoder_dict[quantize_value]
+
+    def _parse(self, stream, context, path):
+        decoder = self.__get_decoder(context, path)
+        count = cs.evaluate(self.count, context)
+        raw = cs.stream_read(stream, decoder.byte_size * count, path)
+        return decoder.decode(raw, count, as_uint8=self.as_uint8)
+
+    def _build(self, obj, stream, context, path):
+        decoder = self.__get_decoder(context, path)
+        colors = np.asarray(obj)
+        if self.as_uint8:
+            colors = colors / np.float32(255)
+        cs.stream_write(stream, decoder.encode(colors), decoder.byte_size * len(colors), path)
+        return obj
+
+    def _sizeof(self, context, path):
+        return self.__get_decoder(context, path).byte_size * cs.evaluate(self.count, context)
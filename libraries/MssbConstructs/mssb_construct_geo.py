@@ -1,4 +1,6 @@
 from construct.core import Construct
+import struct
+import numpy as np
 from .mssb_construct_color import *
 
 QUANTIZE_FLOAT_DICT = {
@@ -19,6 +21,15 @@ QUANTIZE_COLOR_DICT = {
     5 : COLOR_8888
 }
 
+QUANTIZE_COLOR_DECODER_DICT = {
+    0 : COLOR_565_DECODER,
+    1 : COLOR_888_DECODER,
+    2 : COLOR_888X_DECODER,
+    3 : COLOR_4444_DECODER,
+    4 : COLOR_6666_DECODER,
+    5 : COLOR_8888_DECODER
+}
+
 class FloatQuantizeAdaptor(cs.Adapter):
     def _decode(self, obj, ctx, path):
         return obj / ctx.quantizeInfo.shiftAmount
@@ -26,6 +37,9 @@ class FloatQuantizeAdaptor(cs.Adapter):
     def _encode(self, obj, ctx, path):
         return int(obj * ctx.quantizeInfo.shiftAmount)
 
+    def _emitparse(self, code):
+        return f"(({self.subcon._compileparse(code)}) / this['quantizeInfo']['shiftAmount'])"
+
 # quantizedValue = cs.Struct(
 #     "rawValue" / cs.Switch(cs.this._.quantizeInfo.quantizeValue, QUANTIZE_TYPE_DICT, default=cs.Error),
 #     "shiftedValue" / cs.Computed(cs.this.rawValue / cs.this._.quantizeInfo.shiftAmount)
@@ -45,7 +59,7 @@ displayObjectColorComponents = cs.Struct(
     "myValues" / cs.Switch(cs.this._._.quantizeInfo.quantizeValue, QUANTIZE_COLOR_DICT, default=cs.Error),
 )
 
-displayObjectPositionHeader_QuantizedData = cs.Bitwise(cs.Struct(
+displayObjectPositionHeader_QuantizedData = FixedBitwise(cs.Struct(
     "quantizeValue" / cs.Nibble,
     "shift" / cs.Nibble,
     "shiftAmount" / cs.Computed(1 << cs.this.shift)
@@ -61,19 +75,29 @@ displayObjectPositionHeader = cs.Struct(
     "pPositionArray" / PointerToArray(displayObjectFloatComponents, "numberOfPositions", "offsetToPositionArray"),
 )
 
-displayObjectColorHeader_QuantizedData = cs.Bitwise(cs.Struct(
+displayObjectColorHeader_QuantizedData = FixedBitwise(cs.Struct(
     "quantizeValue" / cs.Nibble,
     cs.Nibble,
 ))
 
-displayObjectColorHeader = cs.Struct(
-    retrieve_base_pointer(),
-    "offsetToColorArray" / GECKO_POINTER,
-    "numberOfColors" / GECKO_U16,
-    "quantizeInfo" / displayObjectColorHeader_QuantizedData,
-    "numberOfComponents" / GECKO_U8,  # 3 or 4
-    "pColorArray" / PointerToArray(displayObjectColorComponents, "numberOfColors", "offsetToColorArray"),
-)
+# the whole color array as one (numberOfColors, 4) float32 numpy array
+# inside the PointerToStruct, so the color header is up 1 parent
+displayObjectColorArray = ColorArray(QUANTIZE_COLOR_DECODER_DICT, cs.this._.quantizeInfo.quantizeValue, cs.this._.numberOfColors)
+
+def make_color_header(use_color_array=False):
+    return cs.Struct(
+        retrieve_base_pointer(),
+        "offsetToColorArray" / GECKO_POINTER,
+        "numberOfColors" / GECKO_U16,
+        "quantizeInfo" / displayObjectColorHeader_QuantizedData,
+        "numberOfComponents" / GECKO_U8,  # 3 or 4
+        "pColorArray" / (
+            PointerToStruct(displayObjectColorArray, "offsetToColorArray") if use_color_array
+            else PointerToArray(displayObjectColorComponents, "numberOfColors", "offsetToColorArray")
+        ),
+    )
+
+displayObjectColorHeader = make_color_header()
 
 displayObjectTextureHeader = cs.Struct(
     retrieve_base_pointer(),
@@ -97,11 +121,11 @@ displayObjectLightingHeader = cs.Struct(
 )
 
 displayObjectPrimitiveList = cs.Struct(
-    "byteList" / cs.Array(lambda ctx: ctx._._.primitiveByteSize, GECKO_U8)
-    # "byteList" / cs.Array(1, GECKO_U8)
+    # raw GX display list, decoded by mssb_geo_display_list rather than a construct per byte
+    "byteList" / cs.Bytes(cs.this._.primitiveByteSize)
 )
 
-displayObjectStateTexture = cs.BitStruct(
+displayObjectStateTexture = FixedBitStruct(
     "magFilter" / cs.BitsInteger(4),
     "minFilter" / cs.BitsInteger(4),
     "wrapT" / cs.BitsInteger(4),
@@ -111,7 +135,7 @@ displayObjectStateTexture = cs.BitStruct(
     "textureIndex" / cs.BitsInteger(8)
 )
 
-displayObjectStateVCD = cs.BitStruct(
+displayObjectStateVCD = FixedBitStruct(
     cs.Const(0, cs.BitsInteger(6)), # unused
     "texCoord7" / cs.BitsInteger(2),
     "texCoord6" / cs.BitsInteger(2),
@@ -128,7 +152,7 @@ displayObjectStateVCD = cs.BitStruct(
     "posMatrixIndex" / cs.BitsInteger(2),
 )
 
-displayObjectMtxLoad = cs.BitStruct(
+displayObjectMtxLoad = FixedBitStruct(
     "mtxSrcIdx" / cs.BitsInteger(16),
     "mtxDstIdx" / cs.BitsInteger(16),
 )
@@ -146,7 +170,9 @@ displayObjectDisplayState = cs.Struct(
     "setting" / cs.Switch(cs.this.stateID, DISPLAY_STATE_DICT, default=cs.Error),
     "offsetToPrimitives" / GECKO_POINTER,
     "primitiveByteSize" / GECKO_U32,
-    # "pPrimitives" / PointerToStruct(displayObjectPrimitiveList, "offsetToPrimitives")
+    # offsetToPrimitives is from the primitive bank in displayObjectDisplayHeader, which is up 2 parents
+    "pPrimitives" / cs.If(cs.this.primitiveByteSize != 0,
+        cs.Pointer(cs.this.pBase + cs.this._._.offsetToPrimitiveBank + cs.this.offsetToPrimitives, displayObjectPrimitiveList)),
 )
 
 displayObjectDisplayHeader = cs.Struct(
@@ -159,36 +185,125 @@ displayObjectDisplayHeader = cs.Struct(
 )
 
 
-displayObjectLayout = cs.Struct(
-    make_me_base_pointer(),
-    "pPositionData" / PointerToStruct(displayObjectPositionHeader) * "Vertices",
-    "pColorData" / PointerToStruct(displayObjectColorHeader) * "Vertex Colors",
-    "pTextureData" / PointerToStruct(displayObjectTextureHeader) * "UVs",
-    "pLightingData" / PointerToStruct(displayObjectLightingHeader, nullable=True) * "Normals",
-    "pDisplayData" / PointerToStruct(displayObjectDisplayHeader) * "Combine all data into triangles",
-    "numberOfTextures" / GECKO_U8,
-    cs.Const(0xff, GECKO_U8), #unknown
-    cs.Padding(2 + 4),
-    # bounding box
-    "minX" / GECKO_FLOAT,
-    "maxX" / GECKO_FLOAT,
-    "minY" / GECKO_FLOAT,
-    "maxY" / GECKO_FLOAT,
-    "minZ" / GECKO_FLOAT,
-    "maxZ" / GECKO_FLOAT,
-)
+def make_geo_header(use_color_array=False):
+    # use_color_array parses each vertex color array as one numpy array, instead of a BitStruct per color
+    displayObjectLayout = cs.Struct(
+        make_me_base_pointer(),
+        "pPositionData" / PointerToStruct(displayObjectPositionHeader) * "Vertices",
+        "pColorData" / PointerToStruct(make_color_header(use_color_array)) * "Vertex Colors",
+        "pTextureData" / PointerToStruct(displayObjectTextureHeader) * "UVs",
+        "pLightingData" / PointerToStruct(displayObjectLightingHeader, nullable=True) * "Normals",
+        "pDisplayData" / PointerToStruct(displayObjectDisplayHeader) * "Combine all data into triangles",
+        "numberOfTextures" / GECKO_U8,
+        cs.Const(0xff, GECKO_U8), #unknown
+        cs.Padding(2 + 4),
+        # bounding box
+        "minX" / GECKO_FLOAT,
+        "maxX" / GECKO_FLOAT,
+        "minY" / GECKO_FLOAT,
+        "maxY" / GECKO_FLOAT,
+        "minZ" / GECKO_FLOAT,
+        "maxZ" / GECKO_FLOAT,
+    )
 
-geoDescriptor = cs.Struct(
-    retrieve_base_pointer(),
-    "pDisplayObject" / PointerToStruct(displayObjectLayout),
-    "pName" / PointerToStruct(GECKO_STRING),
-)
+    geoDescriptor = cs.Struct(
+        retrieve_base_pointer(),
+        "pDisplayObject" / PointerToStruct(displayObjectLayout),
+        "pName" / PointerToStruct(GECKO_STRING),
+    )
 
-geoHeader = cs.Struct(
-    make_me_base_pointer(),
-    "vesionNumber" / cs.Const(6012001, GECKO_U32),
-    "userDataSize" / GECKO_U32,
-    "pUserData" / PointerToArray(GECKO_U8, "userDataSize", nullable=True),
-    "numGeomDescriptors" / GECKO_U32,
-    "pGeomDescriptors" / PointerToArray(geoDescriptor, "numGeomDescriptors"),
-)
+    return cs.Struct(
+        make_me_base_pointer(),
+        "vesionNumber" / cs.Const(6012001, GECKO_U32),
+        "userDataSize" / GECKO_U32,
+        "pUserData" / PointerToArray(GECKO_U8, "userDataSize", nullable=True),
+        "numGeomDescriptors" / GECKO_U32,
+        "pGeomDescriptors" / PointerToArray(geoDescriptor, "numGeomDescriptors"),
+    )
+
+geoHeader = make_geo_header()
+# alternative backend, same layout with the vertex colors decoded by numpy
+geoHeaderColorArray = make_geo_header(use_color_array=True)
+
+# numpy fast path, reads the same layout as the structs above without going through construct
+
+QUANTIZE_FLOAT_DTYPE_DICT = {
+    0 : np.dtype(">u2"),
+    1 : np.dtype(">f4"),
+    2 : np.dtype(">u2"),
+    3 : np.dtype(">i2"),
+    4 : np.dtype("u1"),
+    5 : np.dtype("i1")
+}
+
+GEO_VERSION_NUMBER = 6012001
+
+def read_u32(b:bytes, offset:int) -> int:
+    return int.from_bytes(b[offset:offset + 4], "big")
+
+def read_float_header(b:bytes, base:int, header_offset:int) -> tuple[int, int, int, int, int]:
+    # offsetToArray, count, then the quantize nibbles, then numberOfComponents, same for positions/uvs/normals
+    array_offset, count, quantize, component_count = struct.unpack_from(">IHBB", b, base + header_offset)
+    return base + array_offset, count, quantize >> 4, 1 << (quantize & 0xf), component_count
+
+def decode_float_array(b:bytes, array_offset:int, count:int, quantize_value:int, shift_amount:int, component_count:int) -> np.ndarray:
+    dtype = QUANTIZE_FLOAT_DTYPE_DICT[quantize_value]
+    raw = np.frombuffer(b, dtype, count * component_count, array_offset)
+    return (raw.astype(np.float32) / np.float32(shift_amount)).reshape(count, component_count)
+
+def read_float_components(b:bytes, base:int, header_offset:int) -> np.ndarray:
+    if header_offset == 0:
+        return None
+    return decode_float_array(b, *read_float_header(b, base, header_offset))
+
+def read_colors(b:bytes, base:int, header_offset:int, as_uint8=False) -> np.ndarray:
+    if header_offset == 0:
+        return None
+    array_offset, count, quantize, _ = struct.unpack_from(">IHBB", b, base + header_offset)
+    return QUANTIZE_COLOR_DECODER_DICT[quantize >> 4].decode(b, count, base + array_offset, as_uint8)
+
+def read_display_object_arrays(b:bytes, display_object_offset:int) -> dict[str, np.ndarray]:
+    pPositionData, pColorData, pTextureData, pLightingData = struct.unpack_from(">IIII", b, display_object_offset)
+    return {
+        "positions": read_float_components(b, display_object_offset, pPositionData),
+        "colors": read_colors(b, display_object_offset, pColorData),
+        "texture_coords": read_float_components(b, display_object_offset, pTextureData),
+        "normals": read_float_components(b, display_object_offset, pLightingData),
+    }
+
+def read_geo_arrays(b:bytes, geo_offset:int=0) -> list[dict[str, np.ndarray]]:
+    version_number, _, _, descriptor_count, pGeomDescriptors = struct.unpack_from(">IIIII", b, geo_offset)
+    if version_number != GEO_VERSION_NUMBER:
+        raise ValueError(f"not a geo file, version {version_number}")
+
+    out = []
+    for i in range(descriptor_count):
+        pDisplayObject = read_u32(b, geo_offset + pGeomDescriptors + i * 8)
+        out.append(read_display_object_arrays(b, geo_offset + pDisplayObject))
+    return out
+
+def check_geo_arrays(b:bytes, geo_offset:int=0) -> bool:
+    # parses with the construct structs above, and makes sure the fast path gets the same values
+    parsed = geoHeader.parse(b[geo_offset:])
+    fast = read_geo_arrays(b, geo_offset)
+
+    for descriptor, arrays in zip(parsed.pGeomDescriptors.valueAtPointer, fast):
+        layout = descriptor.pDisplayObject.valueAtPointer
+        for header, field, key in (
+                (layout.pPositionData, "pPositionArray", "positions"),
+                (layout.pTextureData, "pTextureCoordArray", "texture_coords"),
+                (layout.pLightingData, "pNormalArray", "normals"),
+            ):
+            if not header.validPointer:
+                if arrays[key] is not None:
+                    return False
+                continue
+            expected = np.array([x.myValues for x in header.valueAtPointer[field].valueAtPointer], dtype=np.float32)
+            if not np.allclose(expected.reshape(arrays[key].shape), arrays[key]):
+                return False
+
+        colors = layout.pColorData.valueAtPointer.pColorArray.valueAtPointer
+        expected = np.array([[x.myValues.R, x.myValues.G, x.myValues.B, x.myValues.A] for x in colors], dtype=np.float32)
+        if not np.allclose(expected, arrays["colors"]):
+            return False
+    return True
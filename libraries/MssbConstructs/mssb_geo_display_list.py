@@ -0,0 +1,319 @@
+import struct
+import numpy as np
+from .mssb_construct_geo import (QUANTIZE_FLOAT_DTYPE_DICT, QUANTIZE_COLOR_DECODER_DICT, read_float_header)
+
+# GX display list commands, the low 3 bits of a draw command are the vertex format, which we don't need
+GX_NOP             = 0x00
+GX_LOAD_CP_REG     = 0x08
+GX_LOAD_XF_REG     = 0x10
+GX_LOAD_INDX_A     = 0x20
+GX_LOAD_INDX_B     = 0x28
+GX_LOAD_INDX_C     = 0x30
+GX_LOAD_INDX_D     = 0x38
+GX_CALL_DL         = 0x40
+GX_INVAL_VTX_CACHE = 0x48
+GX_LOAD_BP_REG     = 0x61
+
+GX_DRAW_QUADS          = 0x80
+GX_DRAW_TRIANGLES      = 0x90
+GX_DRAW_TRIANGLE_STRIP = 0x98
+GX_DRAW_TRIANGLE_FAN   = 0xA0
+GX_DRAW_LINES          = 0xA8
+GX_DRAW_LINE_STRIP     = 0xB0
+GX_DRAW_POINTS         = 0xB8
+GX_PRIMITIVE_MASK      = 0xF8
+
+# bytes after the opcode, for the commands that aren't draws
+GX_COMMAND_SIZES = {
+    GX_LOAD_CP_REG: 5,
+    GX_LOAD_INDX_A: 4,
+    GX_LOAD_INDX_B: 4,
+    GX_LOAD_INDX_C: 4,
+    GX_LOAD_INDX_D: 4,
+    GX_CALL_DL: 8,
+    GX_INVAL_VTX_CACHE: 0,
+    GX_LOAD_BP_REG: 4,
+}
+
+# vertex attribute types in displayObjectStateVCD
+GX_NONE    = 0
+GX_DIRECT  = 1
+GX_INDEX8  = 2
+GX_INDEX16 = 3
+
+# the order attributes appear in each vertex, which is the reverse of the VCD bitfield
+VCD_ATTRIBUTES = (
+    "posMatrixIndex", "position", "normal", "color0", "color1",
+    "texCoord0", "texCoord1", "texCoord2", "texCoord3", "texCoord4", "texCoord5", "texCoord6", "texCoord7",
+)
+
+def strip_to_triangles(count:int) -> np.ndarray:
+    i = np.arange(count - 2)
+    triangles = np.stack([i, i + 1, i + 2], axis=1)
+    # every other triangle in a strip is wound the other way
+    triangles[1::2, :2] = triangles[1::2, 1::-1]
+    return triangles
+
+def fan_to_triangles(count:int) -> np.ndarray:
+    i = np.arange(1, count - 1)
+    return np.stack([np.zeros_like(i), i, i + 1], axis=1)
+
+def quads_to_triangles(count:int) -> np.ndarray:
+    quads = np.arange(count - count % 4).reshape(-1, 4)
+    return np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=1).reshape(-1, 3)
+
+def list_to_triangles(count:int) -> np.ndarray:
+    return np.arange(count - count % 3).reshape(-1, 3)
+
+PRIMITIVE_TO_TRIANGLES = {
+    GX_DRAW_QUADS: quads_to_triangles,
+    GX_DRAW_TRIANGLES: list_to_triangles,
+    GX_DRAW_TRIANGLE_STRIP: strip_to_triangles,
+    GX_DRAW_TRIANGLE_FAN: fan_to_triangles,
+}
+
+def direct_attribute_sizes(b:bytes, base:int, pPositionData:int, pColorData:int, pTextureData:int, pLightingData:int) -> dict[str, int]:
+    # a direct attribute is the value itself, as big as one element of that array
+    def float_size(header_offset):
+        _, _, quantize, component_count = struct.unpack_from(">IHBB", b, base + header_offset)
+        return QUANTIZE_FLOAT_DTYPE_DICT[quantize >> 4].itemsize * component_count
+
+    sizes = {"posMatrixIndex": 1}
+    if pPositionData:
+        sizes["position"] = float_size(pPositionData)
+    if pLightingData:
+        sizes["normal"] = float_size(pLightingData)
+    if pTextureData:
+        sizes["texCoord0"] = float_size(pTextureData)
+    if pColorData:
+        _, _, quantize, _ = struct.unpack_from(">IHBB", b, base + pColorData)
+        sizes["color0"] = sizes["color1"] = QUANTIZE_COLOR_DECODER_DICT[quantize >> 4].byte_size
+    return sizes
+
+def vertex_attributes(vcd, direct_sizes:dict[str, int]) -> list[tuple[str, int, int]]:
+    # (name, attribute type, byte size) of everything in a vertex, in order
+    out = []
+    for name in VCD_ATTRIBUTES:
+        attribute_type = vcd[name]
+        if attribute_type == GX_NONE:
+            continue
+        if attribute_type == GX_INDEX8:
+            size = 1
+        elif attribute_type == GX_INDEX16:
+            size = 2
+        elif name in direct_sizes:
+            size = direct_sizes[name]
+        else:
+            raise ValueError(f"Don't know the size of direct attribute {name}")
+        out.append((name, attribute_type, size))
+    return out
+
+def read_vertex_indices(raw:np.ndarray, attributes:list[tuple[str, int, int]]) -> np.ndarray:
+    # (vertex count, attribute count) of indices, direct attributes aren't indices so are left as -1
+    out = np.full((len(raw), len(attributes)), -1, np.int32)
+    column = 0
+    for i, (name, attribute_type, size) in enumerate(attributes):
+        if attribute_type == GX_INDEX16:
+            out[:, i] = (raw[:, column].astype(np.int32) << 8) | raw[:, column + 1]
+        elif attribute_type == GX_INDEX8 or name == "posMatrixIndex":
+            out[:, i] = raw[:, column]
+        column += size
+    return out
+
+def read_direct_bytes(raw:np.ndarray, attributes:list[tuple[str, int, int]]) -> dict[str, np.ndarray]:
+    # (vertex count, byte size) of the value bytes of each direct attribute
+    out = {}
+    column = 0
+    for name, attribute_type, size in attributes:
+        if attribute_type == GX_DIRECT and name != "posMatrixIndex":
+            out[name] = raw[:, column:column + size]
+        column += size
+    return out
+
+class DisplayListDraws:
+    """Every vertex drawn by a display list, and the triangles made from them"""
+    def __init__(self, attributes:list[tuple[str, int, int]], indices:np.ndarray, direct:dict[str, np.ndarray], triangles:np.ndarray) -> None:
+        self.attribute_names = [x[0] for x in attributes]
+        # (vertex count, attribute count), one row per vertex as it appears in the list
+        self.indices = indices
+        # name to (vertex count, byte size) for the attributes stored in the vertex instead of indexed
+        self.direct = direct
+        # (triangle count, 3), rows of indices
+        self.triangles = triangles
+
+    def attribute(self, name:str) -> np.ndarray:
+        if name not in self.attribute_names:
+            return None
+        return self.indices[:, self.attribute_names.index(name)]
+
+def decode_display_list(b:bytes, offset:int, size:int, attributes:list[tuple[str, int, int]]) -> DisplayListDraws:
+    stride = sum(x[2] for x in attributes)
+    end = offset + size
+
+    index_tables = []
+    direct_tables = []
+    triangle_lists = []
+    vertex_total = 0
+    position = offset
+    while position < end:
+        command = b[position]
+        position += 1
+
+        if command == GX_NOP:
+            continue
+
+        primitive = command & GX_PRIMITIVE_MASK
+        if GX_DRAW_QUADS <= primitive <= GX_DRAW_POINTS:
+            count = int.from_bytes(b[position:position + 2], "big")
+            position += 2
+            if position + count * stride > end:
+                raise ValueError(f"Draw at {position - 3:#x} runs past the end of the display list")
+
+            to_triangles = PRIMITIVE_TO_TRIANGLES.get(primitive)
+            # lines and points still have to be skipped over, but don't make any triangles
+            if to_triangles is not None and count >= 3:
+                raw = np.frombuffer(b, np.uint8, count * stride, position).reshape(count, stride)
+                index_tables.append(read_vertex_indices(raw, attributes))
+                direct_tables.append(read_direct_bytes(raw, attributes))
+                triangle_lists.append(to_triangles(count) + vertex_total)
+                vertex_total += count
+            position += count * stride
+        elif command == GX_LOAD_XF_REG:
+            # length is one less than the number of registers written
+            register_count = int.from_bytes(b[position:position + 2], "big") + 1
+            position += 4 + 4 * register_count
+        elif command in GX_COMMAND_SIZES:
+            position += GX_COMMAND_SIZES[command]
+        else:
+            raise ValueError(f"Unknown display list command {command:#x} at {position - 1:#x}")
+
+    if index_tables:
+        indices = np.concatenate(index_tables)
+        direct = {name: np.concatenate([x[name] for x in direct_tables]) for name in direct_tables[0]}
+        triangles = np.concatenate(triangle_lists).astype(np.uint32)
+    else:
+        indices = np.zeros((0, len(attributes)), np.int32)
+        direct = {}
+        triangles = np.zeros((0, 3), np.uint32)
+    return DisplayListDraws(attributes, indices, direct, triangles)
+
+class GeoMesh:
+    """One display object as plain triangles, every vertex has its own position/normal/color/uv"""
+    def __init__(self, positions:np.ndarray, normals:np.ndarray, colors:np.ndarray, texture_coords:np.ndarray, triangles:np.ndarray, triangle_textures:np.ndarray) -> None:
+        self.positions = positions
+        self.normals = normals
+        self.colors = colors
+        self.texture_coords = texture_coords
+        self.triangles = triangles
+        # index of the texture set when each triangle was drawn, -1 if none
+        self.triangle_textures = triangle_textures
+
+# values for vertices from a state whose vcd doesn't have that attribute, colors are white like GX draws them
+MISSING_ATTRIBUTE_VALUES = {"position": 0.0, "normal": 0.0, "color0": 1.0, "texCoord0": 0.0}
+
+def decode_direct_values(b:bytes, base:int, name:str, header_offset:int, raw:np.ndarray) -> np.ndarray:
+    # the same decoding as the indexed array, just on the bytes inside each vertex
+    raw = np.ascontiguousarray(raw).tobytes()
+    if name == "color0":
+        _, _, quantize, _ = struct.unpack_from(">IHBB", b, base + header_offset)
+        decoder = QUANTIZE_COLOR_DECODER_DICT[quantize >> 4]
+        return decoder.decode(raw, len(raw) // decoder.byte_size)
+    _, _, quantize, shift_amount, component_count = read_float_header(b, base, header_offset)
+    values = np.frombuffer(raw, QUANTIZE_FLOAT_DTYPE_DICT[quantize])
+    return (values.astype(np.float32) / np.float32(shift_amount)).reshape(-1, component_count)
+
+def read_display_object_mesh(display_object) -> GeoMesh:
+    # walks the display states in order, like drawing them would: texture and vcd states change what the
+    # primitive lists that follow them mean
+    d = display_object
+    direct_sizes = direct_attribute_sizes(d.b, d.offset, d.pPositionData, d.pColorData, d.pTextureData, d.pLightingData)
+    primitive_bank = d.display_header[0]
+
+    # (array header, indexed values) of each attribute the mesh keeps
+    sources = {
+        "position": (d.pPositionData, d.positions),
+        "normal": (d.pLightingData, d.normals),
+        "color0": (d.pColorData, d.colors),
+        "texCoord0": (d.pTextureData, d.texture_coords),
+    }
+    # direct values go after the indexed ones, so a direct vertex gets an index into the same table
+    direct_values = {name: [] for name in sources}
+    direct_totals = {name: 0 if values is None else len(values) for name, (_, values) in sources.items()}
+
+    vcd = None
+    texture_index = -1
+    vertex_columns = {name: [] for name in sources}
+    triangle_lists = []
+    triangle_textures = []
+    vertex_total = 0
+    for state in d.display_states:
+        if state.stateID == 1:
+            texture_index = state.setting.textureIndex
+        elif state.stateID == 2:
+            vcd = state.setting
+
+        if state.primitiveByteSize == 0:
+            continue
+        if vcd is None:
+            raise ValueError("Primitives drawn before any vertex descriptor was set")
+
+        draws = decode_display_list(d.b, d.offset + primitive_bank + state.offsetToPrimitives, state.primitiveByteSize,
+            vertex_attributes(vcd, direct_sizes))
+        vertex_count = len(draws.indices)
+        for name, columns in vertex_columns.items():
+            column = draws.attribute(name)
+            if name in draws.direct:
+                values = decode_direct_values(d.b, d.offset, name, sources[name][0], draws.direct[name])
+                column = direct_totals[name] + np.arange(vertex_count, dtype=np.int32)
+                direct_values[name].append(values)
+                direct_totals[name] += vertex_count
+            elif column is not None:
+                indexed = sources[name][1]
+                if indexed is None:
+                    raise ValueError(f"{name} is indexed, but the display object has no {name} array")
+                if (column >= len(indexed)).any():
+                    raise ValueError(f"{name} index past the end of the {name} array")
+            columns.append(np.full(vertex_count, -1, np.int32) if column is None else column)
+        triangle_lists.append(draws.triangles + vertex_total)
+        triangle_textures.append(np.full(len(draws.triangles), texture_index, np.int32))
+        vertex_total += vertex_count
+
+    if triangle_lists:
+        table = np.stack([np.concatenate(columns) for columns in vertex_columns.values()], axis=1)
+        triangles = np.concatenate(triangle_lists)
+        textures = np.concatenate(triangle_textures)
+    else:
+        table = np.zeros((0, len(vertex_columns)), np.int32)
+        triangles = np.zeros((0, 3), np.uint32)
+        textures = np.zeros(0, np.int32)
+
+    # the same combination of indices is the same vertex, only keep one of each
+    unique, inverse = np.unique(table, axis=0, return_inverse=True)
+    triangles = inverse.reshape(-1)[triangles].astype(np.uint32)
+
+    attributes = {}
+    for k, (name, (_, values)) in enumerate(sources.items()):
+        indices = unique[:, k]
+        missing = indices < 0
+        if missing.all():
+            # no state draws with it, like a model without normals
+            attributes[name] = None
+            continue
+
+        all_values = np.concatenate(([] if values is None else [values]) + direct_values[name])
+        out = np.empty((len(indices), all_values.shape[1]), np.float32)
+        out[~missing] = all_values[indices[~missing]]
+        out[missing] = MISSING_ATTRIBUTE_VALUES[name]
+        attributes[name] = out
+
+    if attributes["position"] is None and len(triangles) > 0:
+        raise ValueError("Triangles drawn without positions")
+
+    return GeoMesh(
+        attributes["position"],
+        attributes["normal"],
+        attributes["color0"],
+        attributes["texCoord0"],
+        triangles,
+        textures,
+    )
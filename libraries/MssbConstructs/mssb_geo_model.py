@@ -0,0 +1,259 @@
+import argparse
+import mmap
+import os
+import struct
+from functools import cached_property
+from .mssb_construct_geo import *
+from .mssb_geo_display_list import *
+from .mssb_gltf import *
+
+# lazy view over the same layout as geoHeader, header fields are read straight away,
+# everything behind a pointer is only decoded the first time it's asked for, then kept
+
+# same nesting displayObjectDisplayState sees inside displayObjectDisplayHeader, with the header's fields passed in as context
+DISPLAY_STATE_LIST = cs.Struct(
+    retrieve_base_pointer(),
+    "states" / cs.Array(cs.this._.displayStateCount, displayObjectDisplayState),
+)
+
+class LazyDisplayObject:
+    def __init__(self, b:bytes, offset:int, strings:StringTable=None) -> None:
+        self.b = b
+        self.offset = offset
+        # shared with the rest of the geo, so names several things point at are only decoded once
+        self.strings = strings if strings is not None else StringTable(b)
+        (self.pPositionData, self.pColorData, self.pTextureData, self.pLightingData, self.pDisplayData,
+            self.numberOfTextures) = struct.unpack_from(">IIIIIB", b, offset)
+        minX, maxX, minY, maxY, minZ, maxZ = struct.unpack_from(">6f", b, offset + 28)
+        self.bounds = ((minX, minY, minZ), (maxX, maxY, maxZ))
+
+    @cached_property
+    def positions(self) -> np.ndarray:
+        return read_float_components(self.b, self.offset, self.pPositionData)
+
+    @cached_property
+    def colors(self) -> np.ndarray:
+        return read_colors(self.b, self.offset, self.pColorData)
+
+    @cached_property
+    def texture_coords(self) -> np.ndarray:
+        return read_float_components(self.b, self.offset, self.pTextureData)
+
+    @cached_property
+    def normals(self) -> np.ndarray:
+        return read_float_components(self.b, self.offset, self.pLightingData)
+
+    @cached_property
+    def texture_name(self) -> str:
+        if self.pTextureData == 0:
+            return None
+        pName = read_u32(self.b, self.offset + self.pTextureData + 8)
+        return self.strings[self.offset + pName] if pName != 0 else None
+
+    @cached_property
+    def display_header(self) -> tuple[int, int, int]:
+        # offsetToPrimitiveBank, offsetToDisplayStateList, displayStateCount
+        return struct.unpack_from(">IIH", self.b, self.offset + self.pDisplayData)
+
+    @cached_property
+    def display_states(self) -> list:
+        primitive_bank, state_list, count = self.display_header
+        return parse_struct_at(self.b, self.offset + state_list, DISPLAY_STATE_LIST,
+            pBase=self.offset, offsetToPrimitiveBank=primitive_bank, displayStateCount=count).states
+
+    @cached_property
+    def mesh(self) -> GeoMesh:
+        return read_display_object_mesh(self)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        # same dict as read_display_object_arrays
+        return {
+            "positions": self.positions,
+            "colors": self.colors,
+            "texture_coords": self.texture_coords,
+            "normals": self.normals,
+        }
+
+class LazyGeoDescriptor:
+    def __init__(self, b:bytes, geo_offset:int, offset:int, strings:StringTable=None) -> None:
+        self.b = b
+        self.geo_offset = geo_offset
+        self.strings = strings if strings is not None else StringTable(b)
+        self.pDisplayObject, self.pName = struct.unpack_from(">II", b, offset)
+
+    @cached_property
+    def name(self) -> str:
+        return self.strings[self.geo_offset + self.pName]
+
+    @cached_property
+    def display_object(self) -> LazyDisplayObject:
+        return LazyDisplayObject(self.b, self.geo_offset + self.pDisplayObject, self.strings)
+
+    @property
+    def bounds(self):
+        return self.display_object.bounds
+
+class LazyGeo:
+    def __init__(self, b:bytes, geo_offset:int=0) -> None:
+        self.b = b
+        self.geo_offset = geo_offset
+        (version_number, self.userDataSize, self.pUserData,
+            descriptor_count, self.pGeomDescriptors) = struct.unpack_from(">IIIII", b, geo_offset)
+        if version_number != GEO_VERSION_NUMBER:
+            raise ValueError(f"not a geo file, version {version_number}")
+
+        self.strings = StringTable(b)
+        self.descriptors = [
+            LazyGeoDescriptor(b, geo_offset, geo_offset + self.pGeomDescriptors + i * 8, self.strings)
+            for i in range(descriptor_count)
+        ]
+
+    def from_file(path:str, geo_offset:int=0) -> "LazyGeo":
+        # mapped, so only the pages that get looked at are read
+        with open(path, "rb") as f:
+            return LazyGeo(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), geo_offset)
+
+    @cached_property
+    def user_data(self) -> bytes:
+        if self.pUserData == 0:
+            return None
+        start = self.geo_offset + self.pUserData
+        return bytes(self.b[start : start + self.userDataSize])
+
+    def read_all_strings(self) -> dict[int, str]:
+        # every descriptor and texture name in one pass, by offset, the descriptors and display objects read from the same table
+        # pName is the second pointer of each descriptor
+        name_pointers = [self.geo_offset + self.pGeomDescriptors + i * 8 + 4 for i in range(len(self.descriptors))]
+        self.strings.read_pointers(name_pointers, self.geo_offset)
+        for descriptor in self.descriptors:
+            descriptor.display_object.texture_name
+        return self.strings.strings
+
+    def summary(self) -> list[dict]:
+        return [{"name": d.name, "bounds": d.bounds} for d in self.descriptors]
+
+def pad_components(array:np.ndarray, count:int) -> np.ndarray:
+    # 2 component positions and 1 component uvs still have to be vec3/vec2 once exported
+    if array.shape[1] >= count:
+        return array[:, :count]
+    return np.pad(array, ((0, 0), (0, count - array.shape[1])))
+
+def exported_triangles(mesh:GeoMesh) -> np.ndarray:
+    # GX treats clockwise triangles as front facing, gltf and obj want counter clockwise
+    return mesh.triangles[:, ::-1]
+
+def write_geo_obj(geo:LazyGeo, outFileName:str):
+    with open(outFileName, "w") as f:
+        # v, vt and vn are numbered separately, and not every mesh has uvs or normals
+        position_total = 0
+        texture_total = 0
+        normal_total = 0
+        for descriptor in geo.descriptors:
+            mesh = descriptor.display_object.mesh
+            f.write(f"o {descriptor.name}\n")
+            if mesh.positions is None or len(mesh.triangles) == 0:
+                continue
+
+            np.savetxt(f, pad_components(mesh.positions, 3), fmt="v %.9g %.9g %.9g")
+            if mesh.texture_coords is not None:
+                np.savetxt(f, pad_components(mesh.texture_coords, 2), fmt="vt %.9g %.9g")
+            if mesh.normals is not None:
+                np.savetxt(f, pad_components(mesh.normals, 3), fmt="vn %.9g %.9g %.9g")
+
+            # every array has one entry per vertex, so it's the same index into each, offset by that array's own total
+            triangles = exported_triangles(mesh).astype(np.int64) + 1
+            columns = [triangles + position_total]
+            if mesh.texture_coords is not None:
+                columns.append(triangles + texture_total)
+            if mesh.normals is not None:
+                columns.append(triangles + normal_total)
+
+            if mesh.texture_coords is not None and mesh.normals is not None:
+                face_format = "f %d/%d/%d %d/%d/%d %d/%d/%d"
+            elif mesh.texture_coords is not None:
+                face_format = "f %d/%d %d/%d %d/%d"
+            elif mesh.normals is not None:
+                face_format = "f %d//%d %d//%d %d//%d"
+            else:
+                face_format = "f %d %d %d"
+            # interleaved per corner, v/vt/vn of the first corner, then the second...
+            np.savetxt(f, np.stack(columns, axis=2).reshape(len(triangles), -1), fmt=face_format)
+
+            position_total += len(mesh.positions)
+            if mesh.texture_coords is not None:
+                texture_total += len(mesh.texture_coords)
+            if mesh.normals is not None:
+                normal_total += len(mesh.normals)
+
+def write_geo_glb(geo:LazyGeo, outFileName:str):
+    glb = GlbBuilder()
+    nodes = []
+    meshes = []
+    for descriptor in geo.descriptors:
+        mesh = descriptor.display_object.mesh
+        nodes.append({"name": descriptor.name})
+        if mesh.positions is None or len(mesh.triangles) == 0:
+            continue
+
+        attributes = {"POSITION": glb.add_positions(pad_components(mesh.positions, 3))}
+        if mesh.normals is not None:
+            attributes["NORMAL"] = glb.add_accessor(pad_components(mesh.normals, 3).astype("<f4"), GLTF_FLOAT, "VEC3", GLTF_ARRAY_BUFFER)
+        if mesh.colors is not None:
+            attributes["COLOR_0"] = glb.add_accessor(mesh.colors.astype("<f4"), GLTF_FLOAT, "VEC4", GLTF_ARRAY_BUFFER)
+        if mesh.texture_coords is not None:
+            attributes["TEXCOORD_0"] = glb.add_accessor(pad_components(mesh.texture_coords, 2).astype("<f4"), GLTF_FLOAT, "VEC2", GLTF_ARRAY_BUFFER)
+
+        # one primitive per texture, so they can be told apart once imported
+        triangles = exported_triangles(mesh)
+        primitives = []
+        for texture_index in np.unique(mesh.triangle_textures):
+            primitives.append({
+                "attributes": attributes,
+                "indices": glb.add_indices(triangles[mesh.triangle_textures == texture_index]),
+                "extras": {"textureIndex": int(texture_index)},
+            })
+        nodes[-1]["mesh"] = len(meshes)
+        meshes.append({"name": descriptor.name, "primitives": primitives})
+
+    glb.write(outFileName, nodes, meshes)
+
+GEO_WRITERS = {
+    ".obj": write_geo_obj,
+    ".glb": write_geo_glb,
+}
+
+def write_geo(geo:LazyGeo, outFileName:str):
+    extension = outFileName[outFileName.rfind("."):].lower()
+    GEO_WRITERS[extension](geo, outFileName)
+
+def is_geo_file(path:str) -> bool:
+    with open(path, "rb") as f:
+        header = f.read(4)
+    return len(header) == 4 and int.from_bytes(header, "big") == GEO_VERSION_NUMBER
+
+def list_geo_models(folder:str):
+    # every model name and bounding box under folder, without decoding any arrays
+    for root, _, files in os.walk(folder):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            if not is_geo_file(path):
+                continue
+            try:
+                geo = LazyGeo.from_file(path)
+                yield path, geo.summary()
+            except (ValueError, struct.error) as e:
+                print(f"Could not read {path}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="List the model names and bounds of every geo file in a folder")
+    parser.add_argument("folder")
+    args = parser.parse_args()
+
+    for path, models in list_geo_models(args.folder):
+        print(path)
+        for model in models:
+            (minX, minY, minZ), (maxX, maxY, maxZ) = model["bounds"]
+            print(f"    {model['name']}: ({minX:g}, {minY:g}, {minZ:g}) to ({maxX:g}, {maxY:g}, {maxZ:g})")
+
+if __name__ == "__main__":
+    main()
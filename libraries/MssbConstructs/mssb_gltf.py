@@ -0,0 +1,58 @@
+import json
+import struct
+import numpy as np
+
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+
+class GlbBuilder:
+    """Collects arrays into one binary buffer, and writes them out with the gltf json as a .glb"""
+    def __init__(self) -> None:
+        self.binary = bytearray()
+        self.buffer_views = []
+        self.accessors = []
+
+    def add_accessor(self, array:np.ndarray, component_type:int, accessor_type:str, target:int, **extra) -> int:
+        # glb buffer views are 4 byte aligned
+        self.binary.extend(bytes(-len(self.binary) % 4))
+        self.buffer_views.append({"buffer": 0, "byteOffset": len(self.binary), "byteLength": array.nbytes, "target": target})
+        self.binary.extend(array.tobytes())
+        self.accessors.append({"bufferView": len(self.buffer_views) - 1, "componentType": component_type, "count": len(array), "type": accessor_type} | extra)
+        return len(self.accessors) - 1
+
+    def add_positions(self, positions:np.ndarray) -> int:
+        # gltf wants the bounds of positions
+        positions = positions.astype("<f4")
+        return self.add_accessor(positions, GLTF_FLOAT, "VEC3", GLTF_ARRAY_BUFFER,
+            min=positions.min(axis=0).tolist() if len(positions) else [0, 0, 0],
+            max=positions.max(axis=0).tolist() if len(positions) else [0, 0, 0])
+
+    def add_indices(self, triangles:np.ndarray) -> int:
+        return self.add_accessor(triangles.astype("<u4").reshape(-1), GLTF_UNSIGNED_INT, "SCALAR", GLTF_ELEMENT_ARRAY_BUFFER)
+
+    def write(self, outFileName:str, nodes:list[dict], meshes:list[dict]):
+        self.binary.extend(bytes(-len(self.binary) % 4))
+
+        gltf = {
+            "asset": {"version": "2.0"},
+            "scene": 0,
+            "scenes": [{"nodes": list(range(len(nodes)))}],
+            "nodes": nodes,
+            "meshes": meshes,
+            "buffers": [{"byteLength": len(self.binary)}],
+            "bufferViews": self.buffer_views,
+            "accessors": self.accessors,
+        }
+        # gltf doesn't allow empty arrays, e.g. a model with nothing drawn
+        gltf = {k: v for k, v in gltf.items() if v != []}
+        json_chunk = json.dumps(gltf).encode("utf-8")
+        json_chunk += b" " * (-len(json_chunk) % 4)
+
+        with open(outFileName, "wb") as f:
+            f.write(struct.pack("<III", 0x46546C67, 2, 12 + 8 + len(json_chunk) + 8 + len(self.binary)))
+            f.write(struct.pack("<II", len(json_chunk), 0x4E4F534A))
+            f.write(json_chunk)
+            f.write(struct.pack("<II", len(self.binary), 0x004E4942))
+            f.write(self.binary)
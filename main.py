@@ -1,12 +1,13 @@
-import json
 import dearpygui.dearpygui as dpg
 from dearpygui_ext import logger
-from libraries.MssbAssetSearcher.log_callback import MssbAssetLog
-from libraries.MssbAssetSearcher.search import populate_outputs
+from libraries.MssbAssetSearcher.log_callback import (MssbAssetLog, LogSink, LOG_EVENTS)
+from libraries.MssbAssetSearcher.extraction_process import ExtractionProcess
 from libraries.MssbAssetSearcher.helper_filesystem import VERSION_PATHS, join
-import io
+from libraries.MssbAssetSearcher.asset_index import AssetIndex
+from libraries.MssbAssetSearcher.paged_source import (PagedSource, MappedFileSource, CompressedEntrySource, part_source)
+from libraries.MssbAssetSearcher.lzss import (BitBufferReadException, IllegalDecompressionSequenceException)
 import threading
-from os.path import exists
+from os.path import exists, getsize
 
 class SharedObject:
     def __init__(self, value=None) -> None:
@@ -26,29 +27,41 @@ class ButtonLock:
     def __exit__(self, *args):
         dpg.enable_item(self.tag)
 
-def print_args_to_string(*args, **kwargs):
-    with io.StringIO() as output:
-        print(*args, file=output, **kwargs)
-        return output.getvalue()
+class DpgLogSink(LogSink):
+    """Log events drained by the render loop, so only the main thread ever touches the widgets"""
+    def __init__(self, logger_window, tag_progbar, tag_label) -> None:
+        self.logger_window = logger_window
+        self.tag_progbar = tag_progbar
+        self.tag_label = tag_label
 
-stopExtractionObj = SharedObject()
+    def log(self, lines:list[str]):
+        super().log(lines)
+        # one logger entry per batch rather than per line
+        self.logger_window.log_info("".join(lines).rstrip("\n"))
+
+    def label(self, text:str):
+        dpg.set_value(self.tag_label, value=text or "")
+
+    def progress(self, value:float):
+        dpg.set_value(self.tag_progbar, value=value or 0)
+
+extractionProcessObj = SharedObject()
 def extraction_progbar(sender, app_data, user_data):
-    global stopExtractionObj
+    global extractionProcessObj
 
     def _extract():
         with ButtonLock(sender):
-            
-            stopExtractionObj.value = False
 
-            (tag_progbar, tag_label, tag_window, callable_action, name, skip_if_extracted) = user_data
+            (tag_window, process_type, name, skip_if_extracted) = user_data
             dpg.show_item(tag_window)
             dpg.set_item_label(tag_window, name)
 
-            l = MssbAssetLog()
-            l.progress_bar_callback = lambda val: dpg.set_value(tag_progbar, value=val)
-            l.label_callback = lambda *args, **kwargs: dpg.set_value(tag_label, value=print_args_to_string(*args, **kwargs))
-
-            callable_action(l, skip_if_extracted, stopExtractionObj)
+            # the work happens in another process, this thread just waits on it and passes its events to LOG_EVENTS,
+            # which the render loop draws
+            process = extractionProcessObj.value = process_type(skip_if_extracted)
+            process.start()
+            process.supervise(MssbAssetLog())
+            extractionProcessObj.value = None
 
             dpg.hide_item(tag_window)
         update_visibility_on_assets()
@@ -56,80 +69,249 @@ def extraction_progbar(sender, app_data, user_data):
     threading.Thread(target=_extract, args=(), daemon=True).start()
 
 def stopExtraction(sender, app_data, user_data):
-    global stopExtractionObj
-    stopExtractionObj.value = True
-
-def open_hex_view(path):
-    from construct_editor.wx_widgets import WxHexEditor
-    import wx
-    def _open_hex_view():
+    global extractionProcessObj
+    if extractionProcessObj.value is not None:
+        extractionProcessObj.value.cancel()
+
+HEX_BYTES_PER_ROW = 16
+HEX_VISIBLE_ROWS = 32
+
+class HexView:
+    """Hex dump that only ever reads and draws the rows on screen"""
+    def __init__(self, title:str, source:PagedSource) -> None:
+        self.source = source
+        self.first_row = 0
+        row_count = (source.size + HEX_BYTES_PER_ROW - 1) // HEX_BYTES_PER_ROW
+        self.max_first_row = max(row_count - HEX_VISIBLE_ROWS, 0)
+
+        with dpg.window(label=title, width=640, height=600, on_close=self.__close) as self.window:
+            dpg.add_input_text(hint="go to offset (hex)", on_enter=True, callback=self.__on_go_to)
+            with dpg.group(horizontal=True):
+                with dpg.group():
+                    self.rows = [dpg.add_text("") for _ in range(HEX_VISIBLE_ROWS)]
+                # vertical sliders have their max at the top, so it's flipped to put the first row there
+                self.scrollbar = dpg.add_slider_int(
+                    vertical=True,
+                    min_value=0,
+                    max_value=self.max_first_row,
+                    default_value=self.max_first_row,
+                    height=HEX_VISIBLE_ROWS * 16,
+                    format="",
+                    callback=lambda sender, app_data: self.scroll_to(self.max_first_row - app_data)
+                )
+
+        with dpg.handler_registry() as self.wheel_handler:
+            dpg.add_mouse_wheel_handler(callback=self.__on_wheel)
+
+        self.render()
+
+    def scroll_to(self, first_row:int):
+        self.first_row = min(max(first_row, 0), self.max_first_row)
+        dpg.set_value(self.scrollbar, self.max_first_row - self.first_row)
+        self.render()
+
+    def __on_wheel(self, sender, app_data):
+        if dpg.is_item_hovered(self.window):
+            self.scroll_to(self.first_row - app_data * 3)
+
+    def __on_go_to(self, sender, app_data):
+        try:
+            self.scroll_to(int(app_data, 16) // HEX_BYTES_PER_ROW)
+        except ValueError:
+            pass
 
-        if not exists(path):
+    def render(self):
+        first_offset = self.first_row * HEX_BYTES_PER_ROW
+        try:
+            data = self.source.read(first_offset, HEX_VISIBLE_ROWS * HEX_BYTES_PER_ROW)
+        except (BitBufferReadException, IllegalDecompressionSequenceException):
+            dpg.set_value(self.rows[0], "couldn't decompress this far")
             return
-        
-        with open(path, "rb") as f:
-            b = f.read()
 
-        app = wx.App(False)
-        frame = wx.Frame(None, title=path, size=(500, 500))
-        
-        editor_panel = WxHexEditor(frame, binary=b)
-        frame.Show(True)
-        app.MainLoop()
-    _open_hex_view()
-    # threading.Thread(target=_open_hex_view, args=(), daemon=True).start()
+        for i, row in enumerate(self.rows):
+            chunk = data[i * HEX_BYTES_PER_ROW : (i + 1) * HEX_BYTES_PER_ROW]
+            if not chunk:
+                dpg.set_value(row, "")
+                continue
+            text = "".join(chr(x) if 0x20 <= x < 0x7f else "." for x in chunk)
+            dpg.set_value(row, f"{first_offset + i * HEX_BYTES_PER_ROW:08x}  {chunk.hex(' '):<{HEX_BYTES_PER_ROW * 3 - 1}}  {text}")
+
+    def __close(self):
+        dpg.delete_item(self.wheel_handler)
+        dpg.delete_item(self.window)
+        self.source.close()
+
+def open_hex_view(path, asset:dict=None, part:dict=None):
+    if part is not None and exists(path):
+        source = part_source(path, part)
+        path = f"{path} part {part['offset']:x}"
+    elif exists(path) and getsize(path) > 0:
+        source = MappedFileSource(path)
+    elif asset is not None and asset["original_size"] > 0 and exists(asset["Input"]):
+        # not extracted, read it straight out of the archive instead
+        source = CompressedEntrySource.from_dict(asset)
+    else:
+        return
+
+    HexView(path, source)
+
+def strike(text):
+    return f"~~{text}~~"
+
+class AssetTree:
+    """Asset hierarchy that only builds a folder's children once the folder is opened"""
+    def __init__(self, parent_tag, index:AssetIndex) -> None:
+        self.parent_tag = parent_tag
+        self.index = index
+        # version -> tree node, index signature, category -> (tree node, signature)
+        self.versions:dict[str, dict] = {}
+        # unopened node -> what to fill it with when it opens
+        self.pending:dict[int, callable] = {}
+
+        with dpg.item_handler_registry() as self.handler:
+            dpg.add_item_toggled_open_handler(callback=self.__on_toggled_open)
+
+    def __on_toggled_open(self, sender, app_data, user_data):
+        fill = self.pending.pop(app_data, None)
+        if fill:
+            # get rid of the placeholder
+            dpg.delete_item(app_data, children_only=True)
+            fill(app_data)
+
+    def __add_lazy_node(self, label, parent, fill, before=0):
+        node = dpg.add_tree_node(label=label, parent=parent, before=before)
+        # placeholder, so the node can be opened before it has any real children
+        dpg.add_text("...", parent=node)
+        dpg.bind_item_handler_registry(node, self.handler)
+        self.pending[node] = fill
+        return node
+
+    def __delete_node(self, node):
+        self.pending.pop(node, None)
+        dpg.delete_item(node)
+
+    def refresh(self):
+        MssbAssetLog()("Populating assets...")
+        for v in VERSION_PATHS.values():
+            known = self.versions.get(v.version)
+
+            # the index is synced with the found files before this
+            manifest_signature = self.index.signature(v.version)
+            if manifest_signature is None:
+                if known:
+                    self.__delete_node(known["node"])
+                    del self.versions[v.version]
+                continue
+
+            if known is None:
+                # keep the versions in the same order as VERSION_PATHS, no matter when they got extracted
+                version_order = list(VERSION_PATHS)
+                later_versions = [self.versions[x]["node"] for x in version_order[version_order.index(v.version) + 1:] if x in self.versions]
+                known = self.versions[v.version] = {"signature": manifest_signature, "categories": {}}
+                known["node"] = self.__add_lazy_node(v.version, self.parent_tag, lambda node, v=v: self.__fill_version(node, v), later_versions[0] if later_versions else 0)
+            elif known["signature"] != manifest_signature:
+                known["signature"] = manifest_signature
+                # never opened, it'll read the new manifest when it does
+                if known["node"] not in self.pending:
+                    self.__fill_version(known["node"], v)
+
+    def __fill_version(self, node, v):
+        MssbAssetLog()(f"Attempting to read extracted files for {v.version}...")
+        # only the categories, their entries are read from the index when they're opened
+        category_signatures = self.index.category_signatures(v.version)
+
+        categories = self.versions[v.version]["categories"]
+        for folder_name in list(categories):
+            if folder_name not in category_signatures:
+                self.__delete_node(categories.pop(folder_name)[0])
+
+        # iterate over asset found types
+        for folder_name, signature in category_signatures.items():
+            old_node, old_signature = categories.get(folder_name, (None, None))
+            if old_signature == signature:
+                continue
+
+            # create folder view for asset type (Referenced Uncompressed, Compressed, etc...)
+            fill = lambda category_node, v=v, folder_name=folder_name: self.__fill_category(category_node, v, folder_name)
+            new_node = self.__add_lazy_node(folder_name, node, fill, old_node if old_node else 0)
+            if old_node:
+                self.__delete_node(old_node)
+            categories[folder_name] = (new_node, signature)
+
+    def __fill_category(self, node, v, folder_name):
+        # sorted by appearence offset, so maybe similar files appear as neighbors?
+        for asset in self.index.entries(v.version, folder_name):
+            with dpg.tree_node(label=asset["Output"], parent=node):
+                file_name = asset["Output"]
+                asset_folder_path = join(v.output_folder, folder_name, file_name, file_name)
+
+                # older manifests don't say what was written, but only entries with a size ever are
+                if not asset.get("Extracted", asset["original_size"] > 0):
+                    file_name = strike(file_name)
+
+                dpg.add_menu_item(
+                    label=file_name,
+                    user_data=(asset_folder_path, asset),
+                    callback=lambda sender, app_data, user_data: open_hex_view(*user_data)
+                )
+
+                # only there if the parts were indexed during extraction
+                for part in asset.get("Parts", []):
+                    dpg.add_menu_item(
+                        label=f'  part {part["offset"]:08x} (0x{part["size"]:x} bytes)',
+                        user_data=(asset_folder_path, asset, part),
+                        callback=lambda sender, app_data, user_data: open_hex_view(*user_data)
+                    )
+
+ANY_FILTER = "Any"
+SEARCH_RESULT_LIMIT = 200
+SEARCH_COMPRESSIONS = {
+    ANY_FILTER: None,
+    "0b04": (0x0b, 0x04),
+    "0e05": (0x0e, 0x05),
+    "Uncompressed": (0, 0),
+}
+
+asset_index = AssetIndex()
+def update_asset_search(*args):
+    category = dpg.get_value("asset_search_category")
+    min_size = dpg.get_value("asset_search_min_size")
+    max_size = dpg.get_value("asset_search_max_size")
+
+    results = asset_index.search(
+        dpg.get_value("asset_search_text"),
+        dpg.get_value("asset_search_mode"),
+        category=None if category == ANY_FILTER else category,
+        min_size=min_size if min_size > 0 else None,
+        max_size=max_size if max_size > 0 else None,
+        compression=SEARCH_COMPRESSIONS[dpg.get_value("asset_search_compression")],
+        limit=SEARCH_RESULT_LIMIT,
+    )
+
+    dpg.delete_item("asset_search_results", children_only=True)
+    for record in results:
+        label = f'{record["version"]} {record["category"]}/{record["Output"]}'
+        if record["known_name"] and record["known_name"] != record["Output"]:
+            label += f' ({record["known_name"]})'
+        if not record.get("Extracted", record["original_size"] > 0):
+            label = strike(label)
+
+        dpg.add_selectable(
+            label=label,
+            parent="asset_search_results",
+            user_data=(record["path"], record),
+            callback=lambda sender, app_data, user_data: open_hex_view(*user_data)
+        )
 
+asset_tree:AssetTree = None
 def populate_asset_viewer():
-    MssbAssetLog("Populating assets...")
-    parent_tag = "asset_view"
+    # brings the index up to date first, the tree is built from it
+    changed = asset_index.refresh()
+    asset_tree.refresh()
 
-    def strike(text):
-        return f"~~{text}~~"
-
-    # get rid of children
-
-    children = dpg.get_item_children(parent_tag)
-    if children:
-        MssbAssetLog("Found old asset list, deleting...")
-
-        tree_child_container_id = 1
-        for asset in children[tree_child_container_id]:
-            dpg.delete_item(asset)
-
-    for v in VERSION_PATHS.values():
-        if not v.extracted():
-            MssbAssetLog(f"Didn't find assets for {v.version} version, skipping")
-            continue
-
-        MssbAssetLog(f"Attempting to read extracted files for {v.version}...")
-        with open(v.found_files_path, "r") as f:
-            this_found_files = json.load(f)
-            this_found_files:dict[str, list[dict]]
-        
-        # create folder tree items (US, JP, EU, ...)
-        with dpg.tree_node(parent=parent_tag, label=v.version):
-
-            # iterate over asset found types 
-            for folder_name, assets in this_found_files.items():
-                # sort by assets by appearence offset, so maybe similar files appear as neighbors?
-                assets.sort(key=lambda x: x["offset"])
-
-                # create folder view for asset type (Referenced Uncompressed, Compressed, etc...)
-                with dpg.tree_node(label=folder_name):
-                    for asset in assets:
-                        with dpg.tree_node(label=asset["Output"]):
-                            
-                            file_name = asset["Output"]
-                            asset_folder_path = join(v.output_folder, folder_name, file_name, file_name)                           
-
-                            if not exists(asset_folder_path):
-                                file_name = strike(file_name)
-
-                            dpg.add_menu_item(
-                                label=file_name,
-                                user_data=asset_folder_path,
-                                callback=lambda sender, app_data, user_data: open_hex_view(user_data)
-                            )
+    if changed:
+        dpg.configure_item("asset_search_category", items=[ANY_FILTER] + asset_index.categories())
+        update_asset_search()
 
 def should_show_asset_buttons():
     all_extracted = [x.extracted() for x in VERSION_PATHS.values() if x.valid()]
@@ -151,34 +333,45 @@ def update_visibility_on_assets():
     populate_asset_viewer()
 
 def main():
+    global asset_tree
     dpg.create_context()
 
     my_logger_window = logger.mvLogger()
     dpg.set_item_pos(my_logger_window.window_id, (100,0))
     
-    MssbAssetLog.LOG_CALLBACK = lambda *args, **kwargs: my_logger_window.log_info(print_args_to_string(*args, **kwargs))
-
     with dpg.window(width=250, show=False, no_close=True, no_collapse=True) as progress_bar_tag:
         tag_progbar_bar = dpg.add_progress_bar()
         tag_progbar_label = dpg.add_text()
         tag_cancel_button = dpg.add_button(label="Cancel", callback=stopExtraction)
 
+    LOG_EVENTS.pump_manually(DpgLogSink(my_logger_window, tag_progbar_bar, tag_progbar_label))
+
     with dpg.window(label="Asset View", tag="asset_view_window", show=False, no_close=True, width=280, height=400):
         dpg.add_button()
+        with dpg.collapsing_header(label="Search"):
+            dpg.add_input_text(tag="asset_search_text", hint="name, or 0x offset", callback=update_asset_search)
+            dpg.add_radio_button(AssetIndex.MODES, tag="asset_search_mode", default_value=AssetIndex.MODES[0], horizontal=True, callback=update_asset_search)
+            dpg.add_combo([ANY_FILTER], tag="asset_search_category", label="Category", default_value=ANY_FILTER, callback=update_asset_search)
+            dpg.add_combo(list(SEARCH_COMPRESSIONS), tag="asset_search_compression", label="Compression", default_value=ANY_FILTER, callback=update_asset_search)
+            dpg.add_input_int(tag="asset_search_min_size", label="Min size", min_value=0, min_clamped=True, callback=update_asset_search)
+            dpg.add_input_int(tag="asset_search_max_size", label="Max size", min_value=0, min_clamped=True, callback=update_asset_search)
+            with dpg.child_window(tag="asset_search_results", height=200):
+                pass
         with dpg.group(tag="asset_view"):
             pass
+    asset_tree = AssetTree("asset_view", asset_index)
 
     with dpg.window(label="main window", no_close=True, width=200, height=150):
 
         tag_all_assets = dpg.add_button(
             label="Extract All Assets", 
-            user_data=(tag_progbar_bar, tag_progbar_label, progress_bar_tag, populate_outputs, "Extraction Search", True), 
+            user_data=(progress_bar_tag, ExtractionProcess, "Extraction Search", True), 
             callback=extraction_progbar
         )
 
         tag_new_assets = dpg.add_button(
             label="Extract Only New Assets", 
-            user_data=(tag_progbar_bar, tag_progbar_label, progress_bar_tag, populate_outputs, "Extraction Search", False), 
+            user_data=(progress_bar_tag, ExtractionProcess, "Extraction Search", False), 
             callback=extraction_progbar
         )
 
@@ -198,7 +391,10 @@ def main():
     dpg.create_viewport(title='Mssb Asset Searcher', width=800, height=600)
     dpg.setup_dearpygui()
     dpg.show_viewport()
-    dpg.start_dearpygui()
+    # our own loop rather than start_dearpygui, so log events are drawn between frames
+    while dpg.is_dearpygui_running():
+        LOG_EVENTS.pump()
+        dpg.render_dearpygui_frame()
     dpg.destroy_context()
 
 
@@ -0,0 +1,84 @@
+import struct
+import numpy as np
+from libraries.MssbConstructs.mssb_collision_bvh import (CollisionBVH, closest_points_on_triangles, ray_triangle_distances)
+from libraries.MssbConstructs.mssb_construct_collision import COLLISION_VERTEX_DTYPE
+
+RNG = np.random.default_rng(35)
+BOXES = np.array([[[0, 0, 0], [10, 5, 10]], [[10, 0, 0], [20, 8, 10]]], np.float32)
+
+def collection(positions:np.ndarray, flags:np.ndarray, is_triangle_strip:bool) -> bytes:
+    vertices = np.zeros(len(positions), COLLISION_VERTEX_DTYPE)
+    vertices["position"] = positions
+    vertices["collisionFlags"] = flags
+    raw_vert_count = len(positions) - 2 if is_triangle_strip else len(positions) // 3
+    return struct.pack(">BBH", 0, int(is_triangle_strip), raw_vert_count) + vertices.tobytes()
+
+def make_collision() -> bytes:
+    # two boxes, each with a list of random triangles inside it and a strip along its floor
+    header_size = 8 + 4 * len(BOXES)
+    body = BOXES.astype(">f4").tobytes()
+    pointers = []
+    for box in BOXES:
+        pointers.append(header_size + len(body))
+        triangles = RNG.uniform(box[0], box[1], (30 * 3, 3))
+        body += collection(triangles, RNG.integers(0, 4, len(triangles)), False)
+        strip = np.array([[box[0][0] + (i // 2) * 2, 0.5, box[0][2] + (i % 2) * 10] for i in range(6)])
+        body += collection(strip, np.full(len(strip), 1), True)
+        body += bytes(4)
+    return struct.pack(">HHI", len(BOXES), 0, header_size) + struct.pack(f">{len(BOXES)}I", *pointers) + body
+
+def brute_ray_cast(bvh:CollisionBVH, origins:np.ndarray, directions:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    distances = []
+    for origin, direction in zip(origins, directions):
+        count = len(bvh.a)
+        d = ray_triangle_distances(np.tile(origin, (count, 1)), np.tile(direction, (count, 1)), bvh.a, bvh.b, bvh.c)
+        distances.append(d.min())
+    return np.array(distances)
+
+def brute_nearest(bvh:CollisionBVH, points:np.ndarray) -> np.ndarray:
+    distances = []
+    for point in points:
+        closest = closest_points_on_triangles(np.tile(point, (len(bvh.a), 1)), bvh.a, bvh.b, bvh.c)
+        distances.append(np.linalg.norm(closest - point, axis=1).min())
+    return np.array(distances)
+
+def make_queries(count:int) -> np.ndarray:
+    points = RNG.uniform([-2, -2, -2], [22, 10, 12], (count, 3))
+    # the last one is outside every box
+    points[-1] = [30, 20, 30]
+    return points
+
+def test_queries_match_brute_force():
+    bvh = CollisionBVH.from_bytes(make_collision(), 0)
+    points = make_queries(64)
+
+    expected_boxes = np.full(len(points), -1)
+    for i, point in enumerate(points):
+        for box_index, box in enumerate(BOXES):
+            if np.all(point >= box[0]) and np.all(point <= box[1]):
+                expected_boxes[i] = box_index
+                break
+    assert (bvh.boxes_containing(points) == expected_boxes).all()
+    assert expected_boxes[-1] == -1
+
+    directions = RNG.normal(size=points.shape)
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    directions[-1] = [-1, -1, -1]
+    rays = bvh.ray_cast(points, directions)
+    expected = brute_ray_cast(bvh, points, directions)
+    assert (rays["hit"] == np.isfinite(expected)).all()
+    assert np.allclose(rays["distance"][rays["hit"]], expected[rays["hit"]])
+    hit_triangles = rays["triangle"][rays["hit"]]
+    assert np.allclose(rays["point"][rays["hit"]], points[rays["hit"]] + directions[rays["hit"]] * expected[rays["hit"], None])
+    assert (rays["collisionFlags"][rays["hit"]] == bvh.mesh.triangle_flags[hit_triangles]).all()
+
+    below = bvh.triangle_below(points)
+    expected = brute_ray_cast(bvh, points, np.tile([0.0, -1.0, 0.0], (len(points), 1)))
+    assert (below["hit"] == np.isfinite(expected)).all()
+    assert np.allclose(below["distance"][below["hit"]], expected[below["hit"]])
+
+    nearest = bvh.nearest_surface(points)
+    expected = brute_nearest(bvh, points)
+    assert nearest["hit"].all()
+    assert np.allclose(nearest["distance"], expected)
+    assert np.allclose(np.linalg.norm(nearest["point"] - points, axis=1), expected)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from libraries.MssbConstructs.mssb_construct import parse_struct_at
+from libraries.MssbConstructs.mssb_construct_collision import collisionHeader
+from libraries.MssbConstructs.mssb_construct_geo import (QUANTIZE_FLOAT_DTYPE_DICT, QUANTIZE_COLOR_DECODER_DICT, geoHeader, geoHeaderColorArray)
+from test_collision_bvh import make_collision
+from test_geo_arrays import make_geo
+
+def plain(x):
+    # containers to dicts without the _io and other private keys, arrays to lists, so two parses can be compared
+    if isinstance(x, dict):
+        return {k: plain(v) for k, v in x.items() if not k.startswith("_")}
+    if isinstance(x, (list, tuple)):
+        return [plain(v) for v in x]
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    return x
+
+@pytest.mark.parametrize("header", [geoHeader, geoHeaderColorArray])
+@pytest.mark.parametrize("color_quantize", sorted(QUANTIZE_COLOR_DECODER_DICT))
+def test_geo(header, color_quantize):
+    for float_quantize in QUANTIZE_FLOAT_DTYPE_DICT:
+        b = make_geo(float_quantize, color_quantize)
+        assert plain(parse_struct_at(b, 0, header, compiled=False)) == plain(parse_struct_at(b, 0, header, compiled=True))
+
+def test_collision():
+    # at an offset, so base pointers from Tell are checked too
+    b = bytes(0x10) + make_collision()
+    interpreted = plain(parse_struct_at(b, 0x10, collisionHeader, compiled=False))
+    assert len(interpreted["pBoundingBoxes"]["valueAtPointer"]) == 2
+    assert interpreted == plain(parse_struct_at(b, 0x10, collisionHeader, compiled=True))
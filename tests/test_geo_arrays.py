@@ -0,0 +1,55 @@
+import struct
+import numpy as np
+import pytest
+from libraries.MssbConstructs.mssb_construct_geo import (QUANTIZE_FLOAT_DTYPE_DICT, QUANTIZE_COLOR_DECODER_DICT, GEO_VERSION_NUMBER,
+    check_geo_arrays, read_geo_arrays)
+
+BASE = 0x40
+SHIFT = 3
+
+def float_values(rng:np.random.Generator, quantize:int, count:int) -> bytes:
+    dtype = QUANTIZE_FLOAT_DTYPE_DICT[quantize]
+    if dtype.kind == "f":
+        values = rng.uniform(-100, 100, count)
+    else:
+        info = np.iinfo(dtype)
+        values = rng.integers(info.min, info.max, count, endpoint=True)
+    return values.astype(dtype).tobytes()
+
+def make_geo(float_quantize:int, color_quantize:int) -> bytes:
+    # one display object, positions/uvs/normals each use a different float type, all shifted
+    rng = np.random.default_rng(float_quantize * 6 + color_quantize)
+    position_quantize, texture_quantize, normal_quantize = [(float_quantize + i) % len(QUANTIZE_FLOAT_DTYPE_DICT) for i in range(3)]
+
+    b = bytearray(0x300)
+    struct.pack_into(">IIIII", b, 0, GEO_VERSION_NUMBER, 0, 0, 1, 0x20)
+    struct.pack_into(">II", b, 0x20, BASE, 0x30)
+    b[0x30:0x36] = b"model\0"
+
+    struct.pack_into(">IIIIIBB", b, BASE, 0x40, 0x50, 0x60, 0x80, 0xA0, 1, 0xff)
+    struct.pack_into(">6f", b, BASE + 0x1c, -1, 1, -2, 2, -3, 3)
+    struct.pack_into(">IHBB", b, BASE + 0x40, 0x100, 4, (position_quantize << 4) | SHIFT, 3)
+    struct.pack_into(">IHBB", b, BASE + 0x50, 0x200, 3, color_quantize << 4, 4)
+    struct.pack_into(">IHBBI", b, BASE + 0x60, 0x180, 4, (texture_quantize << 4) | SHIFT, 2, 0x70)
+    b[BASE + 0x70 : BASE + 0x74] = b"tex\0"
+    struct.pack_into(">IHBBf", b, BASE + 0x80, 0x1c0, 4, (normal_quantize << 4) | SHIFT, 3, 0.5)
+    struct.pack_into(">IIH", b, BASE + 0xA0, 0, 0xC0, 0)
+
+    for offset, quantize, count in ((0x100, position_quantize, 12), (0x180, texture_quantize, 8), (0x1c0, normal_quantize, 12)):
+        values = float_values(rng, quantize, count)
+        b[BASE + offset : BASE + offset + len(values)] = values
+    colors = rng.integers(0, 256, 3 * QUANTIZE_COLOR_DECODER_DICT[color_quantize].byte_size, dtype=np.uint8).tobytes()
+    b[BASE + 0x200 : BASE + 0x200 + len(colors)] = colors
+    return bytes(b)
+
+@pytest.mark.parametrize("float_quantize", sorted(QUANTIZE_FLOAT_DTYPE_DICT))
+@pytest.mark.parametrize("color_quantize", sorted(QUANTIZE_COLOR_DECODER_DICT))
+def test_fast_path_matches_construct(float_quantize, color_quantize):
+    b = make_geo(float_quantize, color_quantize)
+    assert check_geo_arrays(b)
+
+def test_shift_divides_values():
+    b = make_geo(3, 0)
+    positions = read_geo_arrays(b)[0]["positions"]
+    raw = np.frombuffer(b, ">i2", 12, BASE + 0x100).astype(np.float32).reshape(4, 3)
+    assert np.allclose(positions, raw / (1 << SHIFT))
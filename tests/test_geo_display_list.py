@@ -0,0 +1,71 @@
+import struct
+import numpy as np
+from libraries.MssbConstructs.mssb_geo_display_list import GX_DIRECT, GX_INDEX8, GX_DRAW_TRIANGLES
+from libraries.MssbConstructs.mssb_geo_model import LazyDisplayObject
+
+BASE = 0x40
+PRIMITIVE_BANK = 0x240
+
+def vcd(**attributes) -> int:
+    # bit positions from displayObjectStateVCD, posMatrixIndex is the lowest two bits
+    shifts = {"posMatrixIndex": 0, "position": 2, "normal": 4, "color0": 6, "color1": 8, "texCoord0": 10}
+    return sum(value << shifts[name] for name, value in attributes.items())
+
+def make_display_object() -> tuple[bytes, dict]:
+    b = bytearray(0x400)
+    struct.pack_into(">IIIII", b, BASE, 0x40, 0x50, 0x60, 0x80, 0xA0)
+    # positions are i2 >> 2 with 3 components, colors 8888, uvs f4 with 2 components, normals i1 >> 6
+    struct.pack_into(">IHBB", b, BASE + 0x40, 0x100, 4, (3 << 4) | 2, 3)
+    struct.pack_into(">IHBB", b, BASE + 0x50, 0x200, 2, 5 << 4, 4)
+    struct.pack_into(">IHBBI", b, BASE + 0x60, 0x180, 4, 1 << 4, 2, 0)
+    struct.pack_into(">IHBBf", b, BASE + 0x80, 0x1c0, 4, (5 << 4) | 6, 3, 0.5)
+    struct.pack_into(">12h", b, BASE + 0x100, *range(-6, 6))
+    struct.pack_into(">8f", b, BASE + 0x180, *[x / 3 for x in range(8)])
+    struct.pack_into(">12b", b, BASE + 0x1c0, *range(-64, 64, 11))
+    b[BASE + 0x200 : BASE + 0x208] = bytes([255, 0, 128, 255, 10, 20, 30, 40])
+
+    # the first state has indexed positions/normals and direct colors/uvs
+    direct_colors = [bytes([0, 64, 128, 255]), bytes([255, 255, 0, 0]), bytes([1, 2, 3, 4])]
+    direct_uvs = [(0.25, 0.5), (1.0, -1.0), (2.0, 3.0)]
+    list_1 = bytes([GX_DRAW_TRIANGLES, 0, 3])
+    for i in range(3):
+        list_1 += bytes([i, 3 - i]) + direct_colors[i] + struct.pack(">2f", *direct_uvs[i])
+
+    # the second has direct positions, indexed colors, and no normals or uvs at all
+    direct_positions = [(4, 8, 12), (-4, 0, 4), (100, -100, 2)]
+    list_2 = bytes([GX_DRAW_TRIANGLES, 0, 3])
+    for i in range(3):
+        list_2 += struct.pack(">3h", *direct_positions[i]) + bytes([i % 2])
+
+    struct.pack_into(">IIH", b, BASE + 0xA0, PRIMITIVE_BANK, 0xC0, 2)
+    struct.pack_into(">B3xIII", b, BASE + 0xC0, 2, vcd(position=GX_INDEX8, normal=GX_INDEX8, color0=GX_DIRECT, texCoord0=GX_DIRECT), 0, len(list_1))
+    struct.pack_into(">B3xIII", b, BASE + 0xD0, 2, vcd(position=GX_DIRECT, color0=GX_INDEX8), 0x40, len(list_2))
+    b[BASE + PRIMITIVE_BANK : BASE + PRIMITIVE_BANK + len(list_1)] = list_1
+    b[BASE + PRIMITIVE_BANK + 0x40 : BASE + PRIMITIVE_BANK + 0x40 + len(list_2)] = list_2
+
+    expected = {
+        "direct_colors": np.array([list(x) for x in direct_colors], np.float32) / 255,
+        "direct_uvs": np.array(direct_uvs, np.float32),
+        "direct_positions": np.array(direct_positions, np.float32) / 4,
+    }
+    return bytes(b), expected
+
+def test_direct_and_missing_attributes():
+    b, expected = make_display_object()
+    d = LazyDisplayObject(b, BASE)
+    mesh = d.mesh
+
+    assert len(mesh.triangles) == 2
+    first, second = mesh.triangles
+
+    # indexed values from the arrays, direct ones out of the vertices
+    assert np.allclose(mesh.positions[first], d.positions[[0, 1, 2]])
+    assert np.allclose(mesh.normals[first], d.normals[[3, 2, 1]])
+    assert np.allclose(mesh.colors[first], expected["direct_colors"])
+    assert np.allclose(mesh.texture_coords[first], expected["direct_uvs"])
+
+    # the second state's direct positions are there, and the attributes it doesn't have are filled in
+    assert np.allclose(mesh.positions[second], expected["direct_positions"])
+    assert np.allclose(mesh.colors[second], d.colors[[0, 1, 0]])
+    assert np.allclose(mesh.normals[second], 0)
+    assert np.allclose(mesh.texture_coords[second], 0)
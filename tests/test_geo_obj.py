@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+import numpy as np
+from libraries.MssbConstructs.mssb_geo_display_list import GeoMesh
+from libraries.MssbConstructs.mssb_geo_model import write_geo_obj
+
+def make_descriptor(name:str, with_uvs:bool, with_normals:bool) -> SimpleNamespace:
+    positions = np.arange(9, dtype=np.float32).reshape(3, 3)
+    mesh = GeoMesh(
+        positions,
+        np.ones((3, 3), np.float32) if with_normals else None,
+        None,
+        np.zeros((3, 2), np.float32) if with_uvs else None,
+        np.array([[0, 1, 2]], np.uint32),
+        np.array([-1]),
+    )
+    return SimpleNamespace(name=name, display_object=SimpleNamespace(mesh=mesh))
+
+def test_mixed_attributes_index_their_own_arrays(tmp_path):
+    # the first mesh has no uvs or normals, so the second one's vt/vn start at 1 while its v start at 4
+    geo = SimpleNamespace(descriptors=[
+        make_descriptor("plain", False, False),
+        make_descriptor("textured", True, True),
+    ])
+    path = tmp_path / "mixed.obj"
+    write_geo_obj(geo, str(path))
+
+    lines = path.read_text().splitlines()
+    faces = [x for x in lines if x.startswith("f ")]
+    assert faces == ["f 3 2 1", "f 6/3/3 5/2/2 4/1/1"]
+
+    counts = {kind: sum(1 for x in lines if x.split()[0] == kind) for kind in ("v", "vt", "vn")}
+    for face in faces:
+        for corner in face.split()[1:]:
+            for kind, index in zip(("v", "vt", "vn"), corner.split("/")):
+                assert index == "" or 1 <= int(index) <= counts[kind]
@@ -0,0 +1,152 @@
+import json
+import random
+import struct
+from libraries.MssbAssetSearcher.helper_filesystem import (FilePaths, ensure_dir, join, REFERENCED_OUTPUT, REL_OUTPUT, ADGC_OUTPUT)
+from libraries.MssbAssetSearcher.log_callback import (LogEventBus, MssbAssetLog, NullSink)
+from libraries.MssbAssetSearcher.lzss import (compress, decompress)
+from libraries.MssbAssetSearcher.repack import (entry_to_bytes, find_replacements, repack_version)
+from libraries.MssbAssetSearcher.search import DataEntry
+
+LOOKBACK = 0x0b
+REPETITION = 0x04
+COMPRESSED = 4
+ADGC_MAGIC = b"AdGCForm"
+
+RNG = random.Random(26)
+
+def patterned(size:int, seed:int) -> bytes:
+    # compresses well, unlike random bytes
+    return bytes((i // 7 + seed) & 0xff for i in range(size))
+
+def compressed_dict(name:str, input_path:str, offset:int, raw:bytes, payload:bytes) -> dict:
+    return {
+        "Input": input_path, "Output": name, "lookback_bit": LOOKBACK, "repetition_bit": REPETITION,
+        "original_size": len(raw), "offset": offset, "compressed_size": len(payload), "compression_flag": COMPRESSED,
+    }
+
+def adgc_form(raw:bytes) -> bytes:
+    return struct.pack("<II", len(raw), 0) + ADGC_MAGIC + raw
+
+def write_file(path:str, b:bytes):
+    ensure_dir(path.rpartition("/")[0])
+    with open(path, "wb") as f:
+        f.write(b)
+
+def decode(b:bytes, entry:dict) -> bytes:
+    if entry["compression_flag"] == COMPRESSED:
+        return decompress(b, entry["offset"], entry["original_size"], entry["lookback_bit"], entry["repetition_bit"])
+    return b[entry["offset"] : entry["offset"] + entry["original_size"]]
+
+def test_repack_version(tmp_path):
+    version_path = FilePaths("TEST", str(tmp_path / "data"), str(tmp_path / "outputs"))
+
+    # data file: two compressed table entries, bytes nothing points at, then two AdGCForms in one sector
+    raw_a, raw_b = patterned(0x600, 1), patterned(0x700, 2)
+    payload_a, payload_b = compress(raw_a, LOOKBACK, REPETITION), compress(raw_b, LOOKBACK, REPETITION)
+    filler = RNG.randbytes(0x800)
+    form_1, form_2 = patterned(0x40, 3), patterned(0x30, 4)
+    data = bytearray(0x2000)
+    data[0 : len(payload_a)] = payload_a
+    data[0x800 : 0x800 + len(payload_b)] = payload_b
+    data[0x1000 : 0x1800] = filler
+    adgc = adgc_form(form_1) + adgc_form(form_2)
+    data[0x1800 : 0x1800 + len(adgc)] = adgc
+    data = bytes(data)
+
+    entry_a = compressed_dict("a.dat", version_path.data_path, 0, raw_a, payload_a)
+    entry_b = compressed_dict("b.dat", version_path.data_path, 0x800, raw_b, payload_b)
+    adgc_dicts = [
+        {"Input": version_path.data_path, "Output": f"AdGCForm {offset:08x}.dat", "lookback_bit": 0, "repetition_bit": 0,
+            "original_size": len(raw), "offset": offset, "compressed_size": len(raw), "compression_flag": 0}
+        for offset, raw in ((0x1800 + 16, form_1), (0x1800 + 16 + len(form_1) + 16, form_2))
+    ]
+
+    # code file: a rel that gets replaced, and one that holds b's table entry
+    raw_rel_1 = patterned(0x300, 5)
+    raw_rel_2 = patterned(0x100, 6) + entry_to_bytes(DataEntry.from_dict(entry_b)) + patterned(0x100, 7)
+    payload_rel_1, payload_rel_2 = compress(raw_rel_1, LOOKBACK, REPETITION), compress(raw_rel_2, LOOKBACK, REPETITION)
+    code = bytearray(0x1000)
+    code[0 : len(payload_rel_1)] = payload_rel_1
+    code[0x800 : 0x800 + len(payload_rel_2)] = payload_rel_2
+    code = bytes(code)
+    rel_1 = compressed_dict("rel1.dat", version_path.code_path, 0, raw_rel_1, payload_rel_1)
+    rel_2 = compressed_dict("rel2.dat", version_path.code_path, 0x800, raw_rel_2, payload_rel_2)
+
+    # main.dol: the tables for everything else
+    table_offsets = {"a.dat": 0x20, "rel1.dat": 0x30, "rel2.dat": 0x40}
+    main = bytearray(RNG.randbytes(0x100))
+    for d in (entry_a, rel_1, rel_2):
+        offset = table_offsets[d["Output"]]
+        main[offset : offset + DataEntry.SIZE] = entry_to_bytes(DataEntry.from_dict(d))
+    main = bytes(main)
+
+    write_file(version_path.data_path, data)
+    write_file(version_path.code_path, code)
+    write_file(version_path.main_path, main)
+    found_files = {REFERENCED_OUTPUT: [entry_a, entry_b], REL_OUTPUT: [rel_1, rel_2], ADGC_OUTPUT: adgc_dicts}
+    ensure_dir(version_path.output_folder)
+    with open(version_path.found_files_path, "w") as f:
+        json.dump(found_files, f)
+
+    # a shrinks and fits, b grows past its sector, rel1 is replaced with one that has none of the tables, the first AdGCForm shrinks
+    new_a = patterned(0x200, 8)
+    new_b = RNG.randbytes(0x1000)
+    new_rel_1 = RNG.randbytes(0x200)
+    new_form_1 = patterned(0x20, 9)
+    mod_folder = tmp_path / "mod"
+    for category, name, raw in ((REFERENCED_OUTPUT, "a.dat", new_a), (REFERENCED_OUTPUT, "b.dat", new_b),
+            (REL_OUTPUT, "rel1.dat", new_rel_1), (ADGC_OUTPUT, adgc_dicts[0]["Output"], new_form_1)):
+        write_file(join(str(mod_folder), category, name, name), raw)
+
+    output_folder = str(tmp_path / "repacked")
+    log_callback = MssbAssetLog(events=LogEventBus(NullSink()))
+    repack_version(version_path, find_replacements(str(mod_folder), found_files), log_callback, output_folder, max_workers=2)
+
+    with open(join(output_folder, "ZZZZ.dat"), "rb") as f:
+        new_data = f.read()
+    with open(join(output_folder, "aaaa.dat"), "rb") as f:
+        new_code = f.read()
+    with open(join(output_folder, "main.dol"), "rb") as f:
+        new_main = f.read()
+    with open(join(output_folder, "FoundFiles.json"), "r") as f:
+        new_found = {category: {d["Output"]: d for d in dicts} for category, dicts in json.load(f).items()}
+
+    new_entry_a = new_found[REFERENCED_OUTPUT]["a.dat"]
+    new_entry_b = new_found[REFERENCED_OUTPUT]["b.dat"]
+    assert new_entry_a["offset"] == 0
+    assert new_entry_b["offset"] == len(data)
+    assert decode(new_data, new_entry_a) == new_a
+    assert decode(new_data, new_entry_b) == new_b
+
+    # the replaced rel is there even though there was nothing in it to patch
+    new_rel_1_entry = new_found[REL_OUTPUT]["rel1.dat"]
+    new_rel_2_entry = new_found[REL_OUTPUT]["rel2.dat"]
+    assert decode(new_code, new_rel_1_entry) == new_rel_1
+    patched_rel_2 = decode(new_code, new_rel_2_entry)
+    assert len(patched_rel_2) == len(raw_rel_2)
+    rel_table_entry = DataEntry(patched_rel_2, 0x100)
+    assert (rel_table_entry.disk_location, rel_table_entry.original_size, rel_table_entry.compressed_size) == (
+        new_entry_b["offset"], new_entry_b["original_size"], new_entry_b["compressed_size"])
+
+    # the first AdGCForm is rewritten in its own bytes, the second one is untouched
+    new_form_entry = new_found[ADGC_OUTPUT][adgc_dicts[0]["Output"]]
+    assert decode(new_data, new_form_entry) == new_form_1
+    assert struct.unpack_from("<I", new_data, new_form_entry["offset"] - 16)[0] == len(new_form_1)
+    second_form = 0x1800 + len(adgc_form(form_1))
+    assert new_data[second_form : second_form + len(adgc_form(form_2))] == adgc_form(form_2)
+
+    # bytes nothing changed are the same
+    assert new_data[0x800 : 0x1800] == data[0x800 : 0x1800]
+    assert new_data[second_form : len(data)] == data[second_form:]
+    written = set()
+    for offset in table_offsets.values():
+        written.update(range(offset, offset + DataEntry.SIZE))
+    assert all(new_main[i] == main[i] for i in range(len(main)) if i not in written)
+
+    # and main.dol's table entries point at the new places
+    for name, offset in table_offsets.items():
+        category = REFERENCED_OUTPUT if name == "a.dat" else REL_OUTPUT
+        table_entry = DataEntry(new_main, offset)
+        new_entry = new_found[category][name]
+        assert (table_entry.disk_location, table_entry.original_size, table_entry.compressed_size) == (
+            new_entry["offset"], new_entry["original_size"], new_entry["compressed_size"])